@@ -1,12 +1,12 @@
-"""Generic Alembic migration template.
-This file is placed here so `alembic revision --autogenerate` can
-find the template when generating new revisions.
-"""
+## Generic Alembic migration template.
+## This file is placed here so `alembic revision --autogenerate` can
+## find the template when generating new revisions.
 <%!
 from alembic import util
 import datetime
 %>
-"""
+"""${message}
+
 Revision ID: ${up_revision}
 Revises: ${down_revision | comma,n}
 Create Date: ${create_date}
@@ -0,0 +1,336 @@
+"""Base schema
+
+Creates the tables as the models defined them before migrations were
+used. Databases bootstrapped with ``create_all`` already have the tables,
+so existing tables are skipped; the columns, indexes, enum types and
+values the models gained since are added, which ``create_all`` never did
+for existing tables.
+
+Revision ID: 465fda8ccc1d
+Revises: 4c5fb92fa59a
+Create Date: 2026-10-18 08:41:00.054544+00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '465fda8ccc1d'
+down_revision = '4c5fb92fa59a'
+branch_labels = None
+depends_on = None
+
+
+# Every enum type and its values (stored by member name)
+ENUMS = {
+    "userrole": ("SUPER_ADMIN", "ADMIN", "USER"),
+    "userstatus": ("ACTIVE", "SUSPENDED", "BANNED", "PENDING"),
+    "plantype": ("DATA_BASED", "TIME_BASED"),
+    "transactiontype": ("CREDIT", "DEBIT", "PURCHASE"),
+    "transactionstatus": ("PENDING", "COMPLETED", "FAILED"),
+    "paymentmethod": ("MPESA", "CARD", "WALLET", "VOUCHER"),
+    "voucherstatus": ("ACTIVE", "USED", "EXPIRED", "DISABLED"),
+}
+
+
+# Columns the models gained after the first create_all deployments. Columns
+# with a default fill existing rows with it; like the models' defaults, it
+# isn't kept as a server default.
+ADDED_COLUMNS = {
+    "plans": [
+        ("plan_type", "plantype NOT NULL", "'TIME_BASED'"),
+        ("currency", "VARCHAR(3)", "'KES'"),
+        ("validity_hours", "INTEGER", None),
+        ("download_speed_limit", "INTEGER", None),
+        ("upload_speed_limit", "INTEGER", None),
+        ("mikrotik_profile", "VARCHAR(100)", None),
+        ("is_featured", "BOOLEAN", "false"),
+        ("sort_order", "INTEGER", "0"),
+    ],
+    "user_plans": [
+        ("data_used_mb", "INTEGER", "0"),
+        ("data_remaining_mb", "INTEGER", None),
+        ("transaction_id", "INTEGER REFERENCES transactions (id) ON DELETE SET NULL", None),
+    ],
+    "transactions": [
+        ("provider_ref", "VARCHAR(255)", None),
+        ("provider_receipt", "VARCHAR(100)", None),
+        ("plan_id", "INTEGER REFERENCES plans (id) ON DELETE SET NULL", None),
+        ("description", "VARCHAR(255)", None),
+        ("completed_at", "TIMESTAMP WITH TIME ZONE", None),
+    ],
+    "sessions": [
+        ("session_id", "VARCHAR(64)", None),
+        ("username", "VARCHAR(100)", None),
+        ("nas_ip_address", "VARCHAR(45)", None),
+        ("user_plan_id", "INTEGER REFERENCES user_plans (id) ON DELETE SET NULL", None),
+        ("upload_bytes", "BIGINT", "0"),
+        ("download_bytes", "BIGINT", "0"),
+        ("session_duration", "INTEGER", "0"),
+        ("termination_cause", "VARCHAR(50)", None),
+    ],
+}
+
+
+def _enum(name):
+    return sa.Enum(*ENUMS[name], name=name)
+
+
+def _add_columns(table):
+    op.execute(f"ALTER TABLE {table} " + ", ".join(
+        f"ADD COLUMN IF NOT EXISTS {column} {ddl}" + (f" DEFAULT {default}" if default else "")
+        for column, ddl, default in ADDED_COLUMNS[table]
+    ))
+    for column, _, default in ADDED_COLUMNS[table]:
+        if default:
+            op.execute(f"ALTER TABLE {table} ALTER COLUMN {column} DROP DEFAULT")
+
+
+def upgrade():
+    bind = op.get_bind()
+    existing = set(sa.inspect(bind).get_table_names())
+
+    def create_table(name, *columns):
+        if name not in existing:
+            op.create_table(name, *columns)
+
+    if "users" in existing:
+        # Types and values added to the models after create_all made the types
+        for name, values in ENUMS.items():
+            _enum(name).create(bind, checkfirst=True)
+            for value in values:
+                op.execute(f"ALTER TYPE {name} ADD VALUE IF NOT EXISTS '{value}'")
+
+        # Columns added to the models after create_all made the tables
+        for table in ADDED_COLUMNS:
+            if table in existing:
+                _add_columns(table)
+        if "sessions" in existing:
+            op.execute("ALTER TABLE sessions ALTER COLUMN bytes_used TYPE BIGINT")
+
+    create_table('plans',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=150), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('price', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('duration_days', sa.Integer(), nullable=True),
+    sa.Column('data_mb', sa.Integer(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('plan_type', _enum('plantype'), nullable=False),
+    sa.Column('currency', sa.String(length=3), nullable=True),
+    sa.Column('validity_hours', sa.Integer(), nullable=True),
+    sa.Column('download_speed_limit', sa.Integer(), nullable=True),
+    sa.Column('upload_speed_limit', sa.Integer(), nullable=True),
+    sa.Column('mikrotik_profile', sa.String(length=100), nullable=True),
+    sa.Column('is_featured', sa.Boolean(), nullable=True),
+    sa.Column('sort_order', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_plans_id'), 'plans', ['id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_plans_name'), 'plans', ['name'], unique=True, if_not_exists=True)
+    create_table('rollup_session_marks',
+    sa.Column('session_id', sa.Integer(), nullable=False),
+    sa.Column('upload_bytes', sa.BigInteger(), nullable=False),
+    sa.Column('download_bytes', sa.BigInteger(), nullable=False),
+    sa.Column('session_seconds', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('session_id')
+    )
+    create_table('rollup_watermarks',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('value', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+    create_table('usage_daily',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('plan_id', sa.Integer(), nullable=False),
+    sa.Column('nas_ip_address', sa.String(length=45), nullable=False),
+    sa.Column('upload_bytes', sa.BigInteger(), nullable=False),
+    sa.Column('download_bytes', sa.BigInteger(), nullable=False),
+    sa.Column('session_seconds', sa.BigInteger(), nullable=False),
+    sa.Column('sessions', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('purchases', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'plan_id', 'nas_ip_address')
+    )
+    create_table('usage_hourly',
+    sa.Column('bucket', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('plan_id', sa.Integer(), nullable=False),
+    sa.Column('nas_ip_address', sa.String(length=45), nullable=False),
+    sa.Column('upload_bytes', sa.BigInteger(), nullable=False),
+    sa.Column('download_bytes', sa.BigInteger(), nullable=False),
+    sa.Column('session_seconds', sa.BigInteger(), nullable=False),
+    sa.Column('sessions', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('purchases', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('bucket', 'user_id', 'plan_id', 'nas_ip_address')
+    )
+    op.create_index('ix_usage_hourly_user_bucket', 'usage_hourly', ['user_id', 'bucket'], unique=False, if_not_exists=True)
+    create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(length=255), nullable=False),
+    sa.Column('phone_number', sa.String(length=20), nullable=True),
+    sa.Column('username', sa.String(length=100), nullable=False),
+    sa.Column('hashed_password', sa.String(length=255), nullable=False),
+    sa.Column('full_name', sa.String(length=255), nullable=True),
+    sa.Column('role', _enum('userrole'), nullable=False),
+    sa.Column('status', _enum('userstatus'), nullable=False),
+    sa.Column('wallet_balance', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('data_balance_mb', sa.Integer(), nullable=True),
+    sa.Column('is_email_verified', sa.Boolean(), nullable=True),
+    sa.Column('is_phone_verified', sa.Boolean(), nullable=True),
+    sa.Column('two_factor_enabled', sa.Boolean(), nullable=True),
+    sa.Column('two_factor_secret', sa.String(length=255), nullable=True),
+    sa.Column('mac_address', sa.String(length=17), nullable=True),
+    sa.Column('last_login', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_users_created', 'users', ['created_at', 'id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True, if_not_exists=True)
+    op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_users_mac_address'), 'users', ['mac_address'], unique=True, if_not_exists=True)
+    op.create_index(op.f('ix_users_phone_number'), 'users', ['phone_number'], unique=True, if_not_exists=True)
+    op.create_index(op.f('ix_users_username'), 'users', ['username'], unique=True, if_not_exists=True)
+    create_table('transactions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('amount', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('currency', sa.String(length=10), nullable=True),
+    sa.Column('type', _enum('transactiontype'), nullable=False),
+    sa.Column('status', _enum('transactionstatus'), nullable=True),
+    sa.Column('payment_method', _enum('paymentmethod'), nullable=True),
+    sa.Column('reference', sa.String(length=255), nullable=True),
+    sa.Column('provider_ref', sa.String(length=255), nullable=True),
+    sa.Column('provider_receipt', sa.String(length=100), nullable=True),
+    sa.Column('plan_id', sa.Integer(), nullable=True),
+    sa.Column('description', sa.String(length=255), nullable=True),
+    sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['plan_id'], ['plans.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_transactions_completed_at'), 'transactions', ['completed_at'], unique=False, if_not_exists=True)
+    op.create_index('ix_transactions_created', 'transactions', ['created_at', 'id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_transactions_id'), 'transactions', ['id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_transactions_provider_ref'), 'transactions', ['provider_ref'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_transactions_reference'), 'transactions', ['reference'], unique=False, if_not_exists=True)
+    op.create_index('ix_transactions_user_created', 'transactions', ['user_id', 'created_at', 'id'], unique=False, if_not_exists=True)
+    create_table('vouchers',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('code', sa.String(length=50), nullable=False),
+    sa.Column('plan_id', sa.Integer(), nullable=False),
+    sa.Column('status', _enum('voucherstatus'), nullable=True),
+    sa.Column('used_by_user_id', sa.Integer(), nullable=True),
+    sa.Column('used_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_by_user_id', sa.Integer(), nullable=True),
+    sa.Column('batch_id', sa.String(length=100), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['created_by_user_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['plan_id'], ['plans.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['used_by_user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_vouchers_batch_id'), 'vouchers', ['batch_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_vouchers_code'), 'vouchers', ['code'], unique=True, if_not_exists=True)
+    op.create_index(op.f('ix_vouchers_id'), 'vouchers', ['id'], unique=False, if_not_exists=True)
+    create_table('user_plans',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('plan_id', sa.Integer(), nullable=False),
+    sa.Column('start_date', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('end_date', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('active', sa.Boolean(), nullable=True),
+    sa.Column('data_used_mb', sa.Integer(), nullable=True),
+    sa.Column('data_remaining_mb', sa.Integer(), nullable=True),
+    sa.Column('transaction_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['plan_id'], ['plans.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['transaction_id'], ['transactions.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_user_plans_id'), 'user_plans', ['id'], unique=False, if_not_exists=True)
+    create_table('sessions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('mac_address', sa.String(length=17), nullable=True),
+    sa.Column('ip_address', sa.String(length=45), nullable=True),
+    sa.Column('started_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('ended_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('active', sa.Boolean(), nullable=True),
+    sa.Column('bytes_used', sa.BigInteger(), nullable=True),
+    sa.Column('session_id', sa.String(length=64), nullable=True),
+    sa.Column('username', sa.String(length=100), nullable=True),
+    sa.Column('nas_ip_address', sa.String(length=45), nullable=True),
+    sa.Column('user_plan_id', sa.Integer(), nullable=True),
+    sa.Column('upload_bytes', sa.BigInteger(), nullable=True),
+    sa.Column('download_bytes', sa.BigInteger(), nullable=True),
+    sa.Column('session_duration', sa.Integer(), nullable=True),
+    sa.Column('termination_cause', sa.String(length=50), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_plan_id'], ['user_plans.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_sessions_ended_at'), 'sessions', ['ended_at'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_sessions_id'), 'sessions', ['id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_sessions_mac_address'), 'sessions', ['mac_address'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_sessions_nas_ip_address'), 'sessions', ['nas_ip_address'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_sessions_session_id'), 'sessions', ['session_id'], unique=False, if_not_exists=True)
+    op.create_index('ix_sessions_started', 'sessions', ['started_at', 'id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_sessions_user_plan_id'), 'sessions', ['user_plan_id'], unique=False, if_not_exists=True)
+    op.create_index('ix_sessions_user_started', 'sessions', ['user_id', 'started_at', 'id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_sessions_username'), 'sessions', ['username'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_sessions_username'), table_name='sessions')
+    op.drop_index('ix_sessions_user_started', table_name='sessions')
+    op.drop_index(op.f('ix_sessions_user_plan_id'), table_name='sessions')
+    op.drop_index('ix_sessions_started', table_name='sessions')
+    op.drop_index(op.f('ix_sessions_session_id'), table_name='sessions')
+    op.drop_index(op.f('ix_sessions_nas_ip_address'), table_name='sessions')
+    op.drop_index(op.f('ix_sessions_mac_address'), table_name='sessions')
+    op.drop_index(op.f('ix_sessions_id'), table_name='sessions')
+    op.drop_index(op.f('ix_sessions_ended_at'), table_name='sessions')
+    op.drop_table('sessions')
+    op.drop_index(op.f('ix_user_plans_id'), table_name='user_plans')
+    op.drop_table('user_plans')
+    op.drop_index(op.f('ix_vouchers_id'), table_name='vouchers')
+    op.drop_index(op.f('ix_vouchers_code'), table_name='vouchers')
+    op.drop_index(op.f('ix_vouchers_batch_id'), table_name='vouchers')
+    op.drop_table('vouchers')
+    op.drop_index('ix_transactions_user_created', table_name='transactions')
+    op.drop_index(op.f('ix_transactions_reference'), table_name='transactions')
+    op.drop_index(op.f('ix_transactions_provider_ref'), table_name='transactions')
+    op.drop_index(op.f('ix_transactions_id'), table_name='transactions')
+    op.drop_index('ix_transactions_created', table_name='transactions')
+    op.drop_index(op.f('ix_transactions_completed_at'), table_name='transactions')
+    op.drop_table('transactions')
+    op.drop_index(op.f('ix_users_username'), table_name='users')
+    op.drop_index(op.f('ix_users_phone_number'), table_name='users')
+    op.drop_index(op.f('ix_users_mac_address'), table_name='users')
+    op.drop_index(op.f('ix_users_id'), table_name='users')
+    op.drop_index(op.f('ix_users_email'), table_name='users')
+    op.drop_index('ix_users_created', table_name='users')
+    op.drop_table('users')
+    op.drop_index('ix_usage_hourly_user_bucket', table_name='usage_hourly')
+    op.drop_table('usage_hourly')
+    op.drop_table('usage_daily')
+    op.drop_table('rollup_watermarks')
+    op.drop_table('rollup_session_marks')
+    op.drop_index(op.f('ix_plans_name'), table_name='plans')
+    op.drop_index(op.f('ix_plans_id'), table_name='plans')
+    op.drop_table('plans')
+    for name in ENUMS:
+        op.execute(f"DROP TYPE IF EXISTS {name}")
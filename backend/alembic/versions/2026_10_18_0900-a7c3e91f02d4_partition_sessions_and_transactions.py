@@ -0,0 +1,187 @@
+"""Partition sessions and transactions by month
+
+Turns ``sessions`` (by ``started_at``) and ``transactions`` (by
+``created_at``) into range-partitioned tables with one partition per
+calendar month (UTC), named ``<table>_pYYYY_MM``.
+
+Existing rows are not copied: the old table is attached as the partition
+``<table>_legacy`` covering everything before the first monthly partition,
+and its indexes and foreign keys are adopted by the partitioned table.
+Only the primary key, which must now include the partition key, is
+rebuilt. An empty old table is simply dropped.
+
+The primary keys become ``(id, <partition key>)``. Postgres can't enforce
+a foreign key to ``transactions.id`` alone any more, so
+``user_plans.transaction_id`` becomes a plain column.
+
+Later partitions are created (and, with a retention set, dropped) by the
+``maintain_partitions`` job; this revision creates the next few months.
+
+Revision ID: a7c3e91f02d4
+Revises: 465fda8ccc1d
+Create Date: 2026-10-18 09:00:00.000000+00:00
+"""
+from datetime import date, datetime, timezone
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e91f02d4'
+down_revision = '465fda8ccc1d'
+branch_labels = None
+depends_on = None
+
+
+# table -> partition key
+PARTITIONED = {
+    "sessions": "started_at",
+    "transactions": "created_at",
+}
+
+# Monthly partitions created ahead of the current month
+MONTHS_AHEAD = 3
+
+# Constraints and indexes of the unpartitioned tables, restored on downgrade
+FOREIGN_KEYS = {
+    "sessions": [
+        ("user_id", "users", "CASCADE"),
+        ("user_plan_id", "user_plans", "SET NULL"),
+    ],
+    "transactions": [
+        ("user_id", "users", "SET NULL"),
+        ("plan_id", "plans", "SET NULL"),
+    ],
+}
+INDEXES = {
+    "sessions": [
+        ("ix_sessions_ended_at", ["ended_at"]),
+        ("ix_sessions_id", ["id"]),
+        ("ix_sessions_mac_address", ["mac_address"]),
+        ("ix_sessions_nas_ip_address", ["nas_ip_address"]),
+        ("ix_sessions_session_id", ["session_id"]),
+        ("ix_sessions_started", ["started_at", "id"]),
+        ("ix_sessions_user_plan_id", ["user_plan_id"]),
+        ("ix_sessions_user_started", ["user_id", "started_at", "id"]),
+        ("ix_sessions_username", ["username"]),
+    ],
+    "transactions": [
+        ("ix_transactions_completed_at", ["completed_at"]),
+        ("ix_transactions_created", ["created_at", "id"]),
+        ("ix_transactions_id", ["id"]),
+        ("ix_transactions_provider_ref", ["provider_ref"]),
+        ("ix_transactions_reference", ["reference"]),
+        ("ix_transactions_user_created", ["user_id", "created_at", "id"]),
+    ],
+}
+
+
+def _month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def _next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _bound(month):
+    return f"'{month.isoformat()} 00:00:00+00'"
+
+
+def _create_month(table, month):
+    op.execute(
+        f"CREATE TABLE IF NOT EXISTS {table}_p{month:%Y_%m} PARTITION OF {table} "
+        f"FOR VALUES FROM ({_bound(month)}) TO ({_bound(_next_month(month))})"
+    )
+
+
+def _partition(bind, table, key):
+    is_partitioned = bind.execute(
+        sa.text("SELECT relkind = 'p' FROM pg_class WHERE oid = CAST(:t AS regclass)"), {"t": table}
+    ).scalar()
+    if is_partitioned:
+        return
+    legacy = f"{table}_legacy"
+
+    op.execute(f"UPDATE {table} SET {key} = coalesce(created_at, now()) WHERE {key} IS NULL")
+    op.execute(f"ALTER TABLE {table} ALTER COLUMN {key} SET NOT NULL")
+    newest = bind.execute(sa.text(f"SELECT max({key}) FROM {table}")).scalar()
+    has_rows = newest is not None
+    now = datetime.now(timezone.utc)
+    # The legacy partition ends after the month of its newest row (or the current one)
+    first_month = _next_month(_month_start(max(newest, now).astimezone(timezone.utc))) if has_rows else _month_start(now)
+
+    # Free the names the partitioned table takes over
+    op.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+    op.execute(f"ALTER TABLE {legacy} DROP CONSTRAINT {table}_pkey")
+    indexes = bind.execute(
+        sa.text("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :t"),
+        {"t": legacy}
+    ).scalars().all()
+    for index in indexes:
+        if index == f"ix_{table}_id":
+            # Covered by the new primary key
+            op.execute(f"DROP INDEX {index}")
+        else:
+            op.execute(f"ALTER INDEX {index} RENAME TO {index.replace(f'ix_{table}_', f'ix_{legacy}_', 1)}")
+
+    op.execute(f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE ({key})")
+    sequence = bind.execute(sa.text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": legacy}).scalar()
+    if sequence:
+        # Dropping the legacy partition must not take the id sequence with it
+        op.execute(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id")
+
+    if has_rows:
+        op.execute(f"ALTER TABLE {table} ATTACH PARTITION {legacy} FOR VALUES FROM (MINVALUE) TO ({_bound(first_month)})")
+    else:
+        op.execute(f"DROP TABLE {legacy}")
+
+    last_month = _month_start(now)
+    for _ in range(MONTHS_AHEAD):
+        last_month = _next_month(last_month)
+    month = first_month
+    while month <= last_month:
+        _create_month(table, month)
+        month = _next_month(month)
+
+    # Matching legacy indexes and foreign keys are attached rather than rebuilt
+    op.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id, {key})")
+    for column, referred, ondelete in FOREIGN_KEYS[table]:
+        op.execute(
+            f"ALTER TABLE {table} ADD CONSTRAINT {table}_{column}_fkey FOREIGN KEY ({column}) "
+            f"REFERENCES {referred} (id) ON DELETE {ondelete}"
+        )
+    for name, columns in INDEXES[table]:
+        if name != f"ix_{table}_id":
+            op.create_index(name, table, columns)
+
+
+def upgrade():
+    bind = op.get_bind()
+    for fk in sa.inspect(bind).get_foreign_keys("user_plans"):
+        if fk["referred_table"] == "transactions":
+            op.drop_constraint(fk["name"], "user_plans", type_="foreignkey")
+    for table, key in PARTITIONED.items():
+        _partition(bind, table, key)
+
+
+def downgrade():
+    for table in PARTITIONED:
+        plain = f"{table}_unpartitioned"
+        op.execute(f"CREATE TABLE {plain} (LIKE {table} INCLUDING DEFAULTS)")
+        op.execute(f"INSERT INTO {plain} SELECT * FROM {table}")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {plain}.id")
+        op.execute(f"DROP TABLE {table} CASCADE")
+        op.execute(f"ALTER TABLE {plain} RENAME TO {table}")
+        op.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id)")
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN {PARTITIONED[table]} DROP NOT NULL")
+        for column, referred, ondelete in FOREIGN_KEYS[table]:
+            op.execute(
+                f"ALTER TABLE {table} ADD CONSTRAINT {table}_{column}_fkey FOREIGN KEY ({column}) "
+                f"REFERENCES {referred} (id) ON DELETE {ondelete}"
+            )
+        for name, columns in INDEXES[table]:
+            op.create_index(name, table, columns)
+    op.create_foreign_key(
+        "user_plans_transaction_id_fkey", "user_plans", "transactions",
+        ["transaction_id"], ["id"], ondelete="SET NULL"
+    )
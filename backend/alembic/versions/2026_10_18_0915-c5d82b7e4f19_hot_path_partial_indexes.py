@@ -0,0 +1,45 @@
+"""Partial indexes for hot lookups
+
+Active plans, active sessions and pending payments are a small, fixed-size
+slice of tables that keep growing. Indexing only that slice keeps these
+indexes small enough to stay cached however much history accumulates.
+Enum predicates compare the stored member names.
+
+Revision ID: c5d82b7e4f19
+Revises: a7c3e91f02d4
+Create Date: 2026-10-18 09:15:00.000000+00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c5d82b7e4f19'
+down_revision = 'a7c3e91f02d4'
+branch_labels = None
+depends_on = None
+
+
+# name, table, columns, predicate
+INDEXES = [
+    # Entitlement checks and plan expiry
+    ("ix_user_plans_user_active", "user_plans", ["user_id", "end_date"], "active"),
+    ("ix_user_plans_end_active", "user_plans", ["end_date"], "active"),
+    # RADIUS accounting, the router reconciler and per-user session checks
+    ("ix_sessions_session_id_active", "sessions", ["session_id"], "active"),
+    ("ix_sessions_nas_active", "sessions", ["nas_ip_address"], "active"),
+    ("ix_sessions_user_active", "sessions", ["user_id"], "active"),
+    # Payment settlement and reconciliation
+    ("ix_transactions_reference_pending", "transactions", ["reference"], "status = 'PENDING'"),
+    ("ix_transactions_provider_ref_pending", "transactions", ["provider_ref"], "status = 'PENDING'"),
+    ("ix_transactions_created_pending", "transactions", ["created_at"], "status = 'PENDING'"),
+]
+
+
+def upgrade():
+    for name, table, columns, predicate in INDEXES:
+        op.create_index(name, table, columns, postgresql_where=sa.text(predicate), if_not_exists=True)
+
+
+def downgrade():
+    for name, table, columns, predicate in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
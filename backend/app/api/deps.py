@@ -1,20 +1,17 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 from typing import Optional
-from ..database import get_db
 from ..core.security import decode_token
-from ..models.user import User, UserRole, UserStatus
-from ..schemas.auth import TokenData
+from ..models.user import UserRole, UserStatus
+from ..schemas.auth import CurrentUser, TokenData
+from ..services.user_cache import user_cache
 
 security = HTTPBearer()
 
 
 async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: AsyncSession = Depends(get_db)
-) -> User:
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> CurrentUser:
     """Get current authenticated user"""
     token = credentials.credentials
     
@@ -37,9 +34,8 @@ async def get_current_user(
             detail="Could not validate credentials"
         )
     
-    # Fetch user from database
-    result = await db.execute(select(User).where(User.id == token_data.user_id))
-    user = result.scalar_one_or_none()
+    # Served from the user cache; the database is only hit on a miss
+    user = await user_cache.get(token_data.user_id)
     
     if user is None:
         raise HTTPException(
@@ -57,8 +53,8 @@ async def get_current_user(
 
 
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: CurrentUser = Depends(get_current_user)
+) -> CurrentUser:
     """Ensure user is active"""
     if current_user.status != UserStatus.ACTIVE:
         raise HTTPException(
@@ -69,8 +65,8 @@ async def get_current_active_user(
 
 
 async def get_current_admin_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: CurrentUser = Depends(get_current_user)
+) -> CurrentUser:
     """Ensure user is admin or super admin"""
     if current_user.role not in [UserRole.ADMIN, UserRole.SUPER_ADMIN]:
         raise HTTPException(
@@ -81,8 +77,8 @@ async def get_current_admin_user(
 
 
 async def get_current_super_admin(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: CurrentUser = Depends(get_current_user)
+) -> CurrentUser:
     """Ensure user is super admin"""
     if current_user.role != UserRole.SUPER_ADMIN:
         raise HTTPException(
@@ -94,7 +90,7 @@ async def get_current_super_admin(
 
 def check_user_permission(required_role: UserRole):
     """Dependency factory for role-based access control"""
-    async def permission_checker(current_user: User = Depends(get_current_user)) -> User:
+    async def permission_checker(current_user: CurrentUser = Depends(get_current_user)) -> CurrentUser:
         role_hierarchy = {
             UserRole.USER: 1,
             UserRole.ADMIN: 2,
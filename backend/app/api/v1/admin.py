@@ -0,0 +1,179 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from datetime import date, datetime
+from typing import List, Optional
+
+from ...core.redis import published_stats
+from ...core.scheduler import scheduler
+from ...database import get_db
+from ...models.session import Session
+from ...models.transaction import Transaction, TransactionStatus
+from ...schemas.auth import CurrentUser
+from ...schemas.pagination import Page
+from ...schemas.report import UsageReportRow
+from ...schemas.session import SessionResponse
+from ...schemas.transaction import TransactionResponse
+from ...api.deps import get_current_admin_user
+from ...services.exports import MEDIA_TYPES, exporter, sessions_query, transactions_query
+from ...services.live_stats import live_stats
+from ...services.rollups import usage_report, user_usage_report
+from ...services.session_reconciler import session_reconciler
+from ...utils.pagination import page_size, paginate
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+
+@router.get("/stats")
+async def get_dashboard_stats(
+    current_user: CurrentUser = Depends(get_current_admin_user)
+):
+    """Live dashboard counters, served from Redis without touching the database (Admin only)"""
+    return await live_stats.snapshot()
+
+
+@router.get("/jobs")
+async def get_job_stats(
+    current_user: CurrentUser = Depends(get_current_admin_user)
+):
+    """Scheduled job runtimes, failures and overruns, as last run by any worker (Admin only)"""
+    return await scheduler.shared_stats()
+
+
+@router.get("/sessions/reconciliation")
+async def get_session_reconciliation_stats(
+    current_user: CurrentUser = Depends(get_current_admin_user)
+):
+    """Router/database session reconciliation counters from the last run on any worker (Admin only)"""
+    return await published_stats("session_reconciliation") or session_reconciler.stats
+
+
+def _check_range(start: date, end: date):
+    if end < start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end must not be before start"
+        )
+
+
+@router.get("/reports/usage", response_model=List[UsageReportRow])
+async def get_usage_report(
+    start: date,
+    end: date,
+    group_by: str = Query("day", pattern="^(day|plan|nas)$"),
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_admin_user)
+):
+    """Usage and revenue by day, plan or NAS, from the daily rollup (Admin only)"""
+    _check_range(start, end)
+    return await usage_report(db, start, end, group_by)
+
+
+@router.get("/reports/users/{user_id}/usage", response_model=List[UsageReportRow])
+async def get_user_usage_report(
+    user_id: int,
+    start: date,
+    end: date,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_admin_user)
+):
+    """One user's daily usage and spend, from the hourly rollup (Admin only)"""
+    _check_range(start, end)
+    return await user_usage_report(db, user_id, start, end)
+
+
+@router.get("/sessions", response_model=Page[SessionResponse])
+async def list_sessions(
+    cursor: Optional[str] = None,
+    limit: int = Depends(page_size),
+    user_id: Optional[int] = None,
+    nas_ip_address: Optional[str] = None,
+    active: Optional[bool] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_admin_user)
+):
+    """List sessions, newest first (Admin only)"""
+    query = select(Session)
+    if user_id is not None:
+        query = query.where(Session.user_id == user_id)
+    if nas_ip_address is not None:
+        query = query.where(Session.nas_ip_address == nas_ip_address)
+    if active is not None:
+        query = query.where(Session.is_active == active)
+
+    sessions, next_cursor = await paginate(db, query, (Session.started_at, Session.id), cursor, limit)
+    return {"items": sessions, "next_cursor": next_cursor}
+
+
+@router.get("/transactions", response_model=Page[TransactionResponse])
+async def list_transactions(
+    cursor: Optional[str] = None,
+    limit: int = Depends(page_size),
+    user_id: Optional[int] = None,
+    transaction_status: Optional[TransactionStatus] = Query(None, alias="status"),
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_admin_user)
+):
+    """List transactions, newest first (Admin only)"""
+    query = select(Transaction)
+    if user_id is not None:
+        query = query.where(Transaction.user_id == user_id)
+    if transaction_status is not None:
+        query = query.where(Transaction.status == transaction_status)
+
+    transactions, next_cursor = await paginate(
+        db, query, (Transaction.created_at, Transaction.id), cursor, limit
+    )
+    return {"items": transactions, "next_cursor": next_cursor}
+
+
+def _export_response(name: str, stmt, fmt: str, compress: bool) -> StreamingResponse:
+    if exporter.busy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many exports in progress, try again shortly",
+            headers={"Retry-After": "30"}
+        )
+    filename = f"{name}-{datetime.utcnow():%Y%m%d%H%M%S}.{fmt}"
+    if compress:
+        filename += ".gz"
+    return StreamingResponse(
+        exporter.stream(stmt, fmt, compress),
+        media_type="application/gzip" if compress else MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/exports/transactions")
+async def export_transactions(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    fmt: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    current_user: CurrentUser = Depends(get_current_admin_user)
+):
+    """Stream transactions created in [start, end) as CSV or NDJSON (Admin only)"""
+    if start and end and end < start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end must not be before start"
+        )
+    return _export_response("transactions", transactions_query(start, end), fmt, gzip)
+
+
+@router.get("/exports/sessions")
+async def export_sessions(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    fmt: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    current_user: CurrentUser = Depends(get_current_admin_user)
+):
+    """Stream sessions started in [start, end) as CSV or NDJSON (Admin only)"""
+    if start and end and end < start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end must not be before start"
+        )
+    return _export_response("sessions", sessions_query(start, end), fmt, gzip)
@@ -6,8 +6,7 @@ from ...database import get_db
 from ...models.user import User, UserRole, UserStatus
 from ...schemas.auth import UserRegister, UserLogin, Token, RefreshToken
 from ...core.security import (
-    verify_password,
-    get_password_hash,
+    password_hasher,
     create_access_token,
     create_refresh_token,
     decode_token,
@@ -60,7 +59,7 @@ async def register(
     new_user = User(
         email=user_data.email,
         username=user_data.username,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=await password_hasher.hash(user_data.password),
         phone_number=user_data.phone_number,
         full_name=user_data.full_name,
         role=UserRole.USER,
@@ -97,7 +96,14 @@ async def login(
     )
     user = result.scalar_one_or_none()
     
-    if not user or not verify_password(credentials.password, user.hashed_password):
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password"
+        )
+    
+    valid, new_hash = await password_hasher.verify_and_update(credentials.password, user.hashed_password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password"
@@ -110,8 +116,10 @@ async def login(
             detail=f"Account is {user.status.value}"
         )
     
-    # Update last login
+    # Update last login, upgrading the hash if the bcrypt parameters changed
     user.last_login = datetime.utcnow()
+    if new_hash:
+        user.hashed_password = new_hash
     await db.commit()
     
     # Generate tokens
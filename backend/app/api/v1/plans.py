@@ -1,66 +1,82 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_
-from typing import List
-from datetime import datetime, timedelta
+from typing import List, Optional
+from datetime import datetime
 from decimal import Decimal
 
 from ...database import get_db
 from ...models.user import User
 from ...models.plan import Plan, UserPlan
 from ...models.transaction import Transaction, TransactionType, TransactionStatus, PaymentMethod
+from ...schemas.auth import CurrentUser
 from ...schemas.plan import PlanResponse, PlanCreate, PlanUpdate, PlanPurchase, VoucherRedeem
 from ...api.deps import get_current_user, get_current_admin_user
 from ...core.security import generate_transaction_ref
-from ...services.mikrotik import mikrotik_service
+from ...services.mikrotik import mikrotik_fleet
 from ...services.payment import mpesa_service
+from ...services.settlement import activate_user_plan
+from ...services.plan_catalog import plan_catalog, Rendered, SORT_KEYS
+from ...services.voucher_redemption import redeem_voucher
+from ...utils.pagination import decode_cursor, encode_cursor
 
 router = APIRouter(prefix="/plans", tags=["Plans"])
 
 
+def _catalog_response(request: Request, rendered: Rendered, next_cursor: Optional[str] = None) -> Response:
+    """Serve a pre-serialized catalog body, or 304 if the client's copy is current"""
+    body, etag = rendered
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(","))):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @router.get("/", response_model=List[PlanResponse])
 async def get_all_plans(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     active_only: bool = True,
-    db: AsyncSession = Depends(get_db)
+    cursor: Optional[str] = None
 ):
-    """Get all available plans"""
-    query = select(Plan)
-    
-    if active_only:
-        query = query.where(Plan.is_active == True)
-    
-    query = query.order_by(Plan.sort_order, Plan.price).offset(skip).limit(limit)
-    
-    result = await db.execute(query)
-    plans = result.scalars().all()
-    return plans
+    """Get all available plans.
+
+    The body stays a plain list; ``X-Next-Cursor`` carries the cursor of
+    the next page. ``skip`` is kept for existing clients.
+    """
+    snapshot = await plan_catalog.snapshot()
+    after = decode_cursor(cursor, SORT_KEYS) if cursor else None
+    rendered, last = snapshot.page(active_only, max(skip, 0), max(limit, 0), after)
+    return _catalog_response(request, rendered, encode_cursor(last) if last else None)
 
 
 @router.get("/{plan_id}", response_model=PlanResponse)
 async def get_plan(
     plan_id: int,
-    db: AsyncSession = Depends(get_db)
+    request: Request
 ):
     """Get specific plan details"""
-    result = await db.execute(select(Plan).where(Plan.id == plan_id))
-    plan = result.scalar_one_or_none()
+    snapshot = await plan_catalog.snapshot()
+    rendered = snapshot.plan(plan_id)
     
-    if not plan:
+    if not rendered:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Plan not found"
         )
     
-    return plan
+    return _catalog_response(request, rendered)
 
 
 @router.post("/", response_model=PlanResponse, status_code=status.HTTP_201_CREATED)
 async def create_plan(
     plan_data: PlanCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: CurrentUser = Depends(get_current_admin_user)
 ):
     """Create a new plan (Admin only)"""
     
@@ -83,11 +99,13 @@ async def create_plan(
         if new_plan.download_speed_limit and new_plan.upload_speed_limit:
             rate_limit = f"{new_plan.download_speed_limit}k/{new_plan.upload_speed_limit}k"
         
-        mikrotik_service.create_user_profile(
+        await mikrotik_fleet.create_user_profile(
             name=new_plan.mikrotik_profile,
             rate_limit=rate_limit
         )
     
+    await plan_catalog.invalidate()
+    
     return new_plan
 
 
@@ -96,7 +114,7 @@ async def update_plan(
     plan_id: int,
     plan_data: PlanUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: CurrentUser = Depends(get_current_admin_user)
 ):
     """Update plan (Admin only)"""
     
@@ -117,6 +135,8 @@ async def update_plan(
     await db.commit()
     await db.refresh(plan)
     
+    await plan_catalog.invalidate()
+    
     return plan
 
 
@@ -124,10 +144,13 @@ async def update_plan(
 async def purchase_plan(
     purchase_data: PlanPurchase,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """Purchase a plan"""
     
+    # The cached principal only carries auth fields; the wallet needs the row
+    user = await db.get(User, current_user.id)
+    
     # Get plan details
     result = await db.execute(select(Plan).where(Plan.id == purchase_data.plan_id))
     plan = result.scalar_one_or_none()
@@ -144,7 +167,7 @@ async def purchase_plan(
     # Create transaction record
     transaction = Transaction(
         transaction_ref=transaction_ref,
-        user_id=current_user.id,
+        user_id=user.id,
         transaction_type=TransactionType.PURCHASE,
         payment_method=PaymentMethod(purchase_data.payment_method),
         status=TransactionStatus.PENDING,
@@ -160,7 +183,7 @@ async def purchase_plan(
     # Process payment based on method
     if purchase_data.payment_method == "wallet":
         # Pay from wallet
-        if current_user.wallet_balance < plan.price:
+        if user.wallet_balance < plan.price:
             transaction.status = TransactionStatus.FAILED
             await db.commit()
             raise HTTPException(
@@ -169,14 +192,12 @@ async def purchase_plan(
             )
         
         # Deduct from wallet
-        current_user.wallet_balance -= plan.price
+        user.wallet_balance -= plan.price
         transaction.status = TransactionStatus.COMPLETED
         transaction.completed_at = datetime.utcnow()
         
-        # Create user plan
-        await _activate_user_plan(db, current_user, plan, transaction.id)
-        
-        await db.commit()
+        # Create user plan; commits the payment with it
+        await activate_user_plan(db, user, plan, transaction.id)
         
         return {
             "success": True,
@@ -192,7 +213,7 @@ async def purchase_plan(
                 detail="Phone number required for M-Pesa payment"
             )
         
-        result = mpesa_service.stk_push(
+        result = await mpesa_service.stk_push(
             phone_number=purchase_data.phone_number,
             amount=int(plan.price),
             account_reference=transaction_ref,
@@ -224,50 +245,35 @@ async def purchase_plan(
         )
 
 
-async def _activate_user_plan(
-    db: AsyncSession,
-    user: User,
-    plan: Plan,
-    transaction_id: int
+@router.post("/redeem-voucher", status_code=status.HTTP_201_CREATED)
+async def redeem_voucher_code(
+    voucher_data: VoucherRedeem,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    """Helper to activate user plan"""
-    
-    # Calculate expiry
-    expires_at = None
-    if plan.validity_days:
-        expires_at = datetime.utcnow() + timedelta(days=plan.validity_days)
-    elif plan.validity_hours:
-        expires_at = datetime.utcnow() + timedelta(hours=plan.validity_hours)
+    """Redeem a voucher code for its plan"""
     
-    # Create user plan
-    user_plan = UserPlan(
-        user_id=user.id,
-        plan_id=plan.id,
-        is_active=True,
-        activated_at=datetime.utcnow(),
-        expires_at=expires_at,
-        data_remaining_mb=plan.data_limit_mb,
-        transaction_id=transaction_id
-    )
+    user = await db.get(User, current_user.id)
+    user_plan = await redeem_voucher(db, user, voucher_data.voucher_code)
     
-    db.add(user_plan)
-    
-    # Add user to MikroTik
-    if plan.mikrotik_profile:
-        mikrotik_service.add_hotspot_user(
-            username=user.username,
-            password=user.username,  # You might want to generate a separate hotspot password
-            profile=plan.mikrotik_profile,
-            mac_address=user.mac_address
+    if not user_plan:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid, used or expired voucher code"
         )
     
-    return user_plan
+    return {
+        "success": True,
+        "message": "Voucher redeemed successfully",
+        "user_plan_id": user_plan.id,
+        "expires_at": user_plan.expires_at
+    }
 
 
 @router.get("/my-plans/active")
 async def get_my_active_plans(
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """Get current user's active plans"""
     
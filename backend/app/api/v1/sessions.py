@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import Optional
+
+from ...database import get_db
+from ...models.session import Session
+from ...schemas.auth import CurrentUser
+from ...schemas.pagination import Page
+from ...schemas.session import SessionResponse
+from ...api.deps import get_current_user
+from ...utils.pagination import page_size, paginate
+
+router = APIRouter(prefix="/sessions", tags=["Sessions"])
+
+
+@router.get("/", response_model=Page[SessionResponse])
+async def list_my_sessions(
+    cursor: Optional[str] = None,
+    limit: int = Depends(page_size),
+    active: Optional[bool] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """Get current user's sessions, newest first"""
+    query = select(Session).where(Session.user_id == current_user.id)
+    if active is not None:
+        query = query.where(Session.is_active == active)
+
+    sessions, next_cursor = await paginate(db, query, (Session.started_at, Session.id), cursor, limit)
+    return {"items": sessions, "next_cursor": next_cursor}
@@ -0,0 +1,83 @@
+from fastapi import APIRouter, Depends, Query, Request, status
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import Any, Dict, Optional
+import logging
+
+from ...core.config import settings
+from ...core.redis import published_stats
+from ...database import get_db
+from ...models.transaction import Transaction, TransactionStatus
+from ...schemas.auth import CurrentUser
+from ...schemas.pagination import Page
+from ...schemas.transaction import TransactionResponse
+from ...api.deps import get_current_user, get_current_admin_user
+from ...services.settlement import settlement_queue, payment_reconciler
+from ...utils.pagination import page_size, paginate
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/transactions", tags=["Transactions"])
+
+
+@router.get("/", response_model=Page[TransactionResponse])
+async def list_my_transactions(
+    cursor: Optional[str] = None,
+    limit: int = Depends(page_size),
+    transaction_status: Optional[TransactionStatus] = Query(None, alias="status"),
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """Get current user's transactions, newest first"""
+    query = select(Transaction).where(Transaction.user_id == current_user.id)
+    if transaction_status is not None:
+        query = query.where(Transaction.status == transaction_status)
+
+    transactions, next_cursor = await paginate(
+        db, query, (Transaction.created_at, Transaction.id), cursor, limit
+    )
+    return {"items": transactions, "next_cursor": next_cursor}
+
+
+@router.post("/mpesa/callback")
+async def mpesa_callback(payload: Dict[str, Any], request: Request):
+    """Receive M-Pesa STK push results.
+
+    Acknowledges immediately; settlement happens in batches off the
+    request path.
+    """
+    allowed_ips = settings.MPESA_CALLBACK_ALLOWED_IPS
+    if allowed_ips and (request.client is None or request.client.host not in allowed_ips):
+        logger.warning(f"Rejected M-Pesa callback from {request.client.host if request.client else 'unknown'}")
+        return JSONResponse(
+            status_code=status.HTTP_403_FORBIDDEN,
+            content={"ResultCode": 1, "ResultDesc": "Rejected"}
+        )
+
+    callback = (payload.get("Body") or {}).get("stkCallback")
+    if not isinstance(callback, dict) or not callback.get("CheckoutRequestID"):
+        # Nothing we can settle; acknowledge so the provider stops retrying
+        logger.warning("Ignored malformed M-Pesa callback")
+        return {"ResultCode": 0, "ResultDesc": "Accepted"}
+
+    if not settlement_queue.submit(callback):
+        # Ask the provider to retry later
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"ResultCode": 1, "ResultDesc": "Busy"}
+        )
+
+    return {"ResultCode": 0, "ResultDesc": "Accepted"}
+
+
+@router.get("/reconciliation/stats")
+async def get_reconciliation_stats(
+    current_user: CurrentUser = Depends(get_current_admin_user)
+):
+    """Payment reconciliation throughput and lag, and this worker's settlement backlog (Admin only)"""
+    return {
+        # Reconciliation runs on whichever worker the scheduler picked
+        **(await published_stats("payment_reconciliation") or payment_reconciler.stats),
+        "settlement_queue_depth": settlement_queue.queue.qsize(),
+    }
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import Optional
+
+from ...database import get_db
+from ...models.user import User, UserRole, UserStatus
+from ...schemas.auth import CurrentUser
+from ...schemas.pagination import Page
+from ...schemas.user import UserResponse
+from ...api.deps import get_current_admin_user
+from ...utils.pagination import page_size, paginate
+
+router = APIRouter(prefix="/users", tags=["Users"])
+
+
+@router.get("/", response_model=Page[UserResponse])
+async def list_users(
+    cursor: Optional[str] = None,
+    limit: int = Depends(page_size),
+    user_status: Optional[UserStatus] = Query(None, alias="status"),
+    role: Optional[UserRole] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_admin_user)
+):
+    """List users, newest first (Admin only)"""
+    query = select(User)
+    if user_status is not None:
+        query = query.where(User.status == user_status)
+    if role is not None:
+        query = query.where(User.role == role)
+
+    users, next_cursor = await paginate(db, query, (User.created_at, User.id), cursor, limit)
+    return {"items": users, "next_cursor": next_cursor}
@@ -0,0 +1,77 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+
+from ...database import get_db, AsyncSessionLocal
+from ...models.plan import Plan
+from ...models.voucher import Voucher
+from ...schemas.auth import CurrentUser
+from ...schemas.voucher import VoucherBatchCreate, VoucherBatchStatus
+from ...api.deps import get_current_admin_user
+from ...services.voucher_batch import voucher_batch_generator
+
+router = APIRouter(prefix="/vouchers", tags=["Vouchers"])
+
+
+@router.post("/batches", response_model=VoucherBatchStatus, status_code=status.HTTP_202_ACCEPTED)
+async def create_voucher_batch(
+    batch_data: VoucherBatchCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_admin_user)
+):
+    """Start generating a batch of vouchers (Admin only)"""
+    plan = await db.get(Plan, batch_data.plan_id)
+    if not plan:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Plan not found"
+        )
+    
+    job = voucher_batch_generator.submit(
+        plan_id=plan.id,
+        quantity=batch_data.quantity,
+        expires_at=batch_data.expires_at,
+        created_by_user_id=current_user.id
+    )
+    return job
+
+
+@router.get("/batches/{batch_id}", response_model=VoucherBatchStatus)
+async def get_voucher_batch(
+    batch_id: str,
+    current_user: CurrentUser = Depends(get_current_admin_user)
+):
+    """Get batch generation progress (Admin only)"""
+    job = await voucher_batch_generator.get(batch_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Voucher batch not found"
+        )
+    return job
+
+
+@router.get("/batches/{batch_id}/codes")
+async def download_voucher_batch(
+    batch_id: str,
+    current_user: CurrentUser = Depends(get_current_admin_user)
+):
+    """Download a batch's codes as CSV for printing (Admin only)"""
+    async def rows():
+        yield "code\n"
+        async with AsyncSessionLocal() as db:
+            codes = await db.stream_scalars(
+                select(Voucher.code)
+                .where(Voucher.batch_id == batch_id)
+                .order_by(Voucher.id)
+                .execution_options(yield_per=5000)
+            )
+            async for partition in codes.partitions():
+                yield "".join(f"{code}\n" for code in partition)
+    
+    return StreamingResponse(
+        rows(),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="vouchers-{batch_id}.csv"'}
+    )
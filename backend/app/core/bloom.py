@@ -0,0 +1,67 @@
+import hashlib
+import logging
+import math
+from typing import Iterable, List, Optional
+from .redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Bloom filter stored in a Redis bitmap, or in process memory without Redis.
+
+    ``might_contain`` never returns False for an added item, so a negative
+    answer can safely short-circuit a database lookup. Lookups cost one
+    BITFIELD round trip in Redis.
+    """
+
+    def __init__(self, name: str, capacity: int, error_rate: float = 0.001):
+        self.key = f"bloom:{name}"
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits: Optional[bytearray] = None
+
+    def _offsets(self, item: str) -> List[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def _local(self) -> bytearray:
+        if self._bits is None:
+            self._bits = bytearray((self.size + 7) // 8)
+        return self._bits
+
+    async def add_many(self, items: Iterable[str]):
+        """Add items, in bulk"""
+        offsets = [offset for item in items for offset in self._offsets(item)]
+        if not offsets:
+            return
+
+        redis = get_redis()
+        if redis is not None:
+            # Bounded command size; one round trip per chunk
+            for start in range(0, len(offsets), 10000):
+                args = []
+                for offset in offsets[start:start + 10000]:
+                    args.extend(("SET", "u1", offset, 1))
+                await redis.execute_command("BITFIELD", self.key, *args)
+            return
+
+        bits = self._local()
+        for offset in offsets:
+            bits[offset >> 3] |= 1 << (offset & 7)
+
+    async def might_contain(self, item: str) -> bool:
+        """False means ``item`` was definitely never added"""
+        offsets = self._offsets(item)
+
+        redis = get_redis()
+        if redis is not None:
+            args = []
+            for offset in offsets:
+                args.extend(("GET", "u1", offset))
+            return all(await redis.execute_command("BITFIELD", self.key, *args))
+
+        bits = self._local()
+        return all(bits[offset >> 3] & (1 << (offset & 7)) for offset in offsets)
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List
+from typing import Any, Dict, List
 from functools import lru_cache
 
 
@@ -15,17 +15,29 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    AUTH_CACHE_TTL: int = 300  # seconds an authenticated user stays cached in Redis
+    AUTH_CACHE_LOCAL_TTL: int = 30  # seconds in the per-process cache
+    AUTH_CACHE_MAX_ENTRIES: int = 10000  # per-process cache size
+    PASSWORD_BCRYPT_ROUNDS: int = 12  # existing hashes are upgraded on next login
+    PASSWORD_HASH_WORKERS: int = 4  # threads dedicated to bcrypt
+    PASSWORD_HASH_QUEUE_SIZE: int = 64  # hashes waiting for a worker before logins get 503
     
     # Database
     DATABASE_URL: str
     DATABASE_POOL_SIZE: int = 20
     DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_MIGRATE_ON_STARTUP: bool = True  # apply pending Alembic migrations when the app starts
     
     # RADIUS
     RADIUS_SECRET: str
     RADIUS_AUTH_PORT: int = 1812
     RADIUS_ACCT_PORT: int = 1813
     RADIUS_HOST: str = "0.0.0.0"
+    RADIUS_ACCT_ENABLED: bool = False  # run the in-process accounting server
+    RADIUS_ACCT_FLUSH_INTERVAL: int = 5  # seconds between batched writes
+    RADIUS_ACCT_REDIS_COUNTERS: bool = True  # keep usage counters in Redis when available
+    RADIUS_ACCT_FLUSH_BATCH_SIZE: int = 1000  # sessions written per statement
+    RADIUS_ACCT_COUNTER_TTL: int = 86400  # seconds idle usage counters are kept in Redis
     
     # MikroTik
     MIKROTIK_HOST: str
@@ -33,9 +45,21 @@ class Settings(BaseSettings):
     MIKROTIK_PASSWORD: str
     MIKROTIK_PORT: int = 8728
     MIKROTIK_USE_SSL: bool = True
+    MIKROTIK_POOL_SIZE: int = 4  # connections per router
+    MIKROTIK_POOL_TIMEOUT: int = 10  # seconds to wait for a free connection
+    MIKROTIK_HEALTH_CHECK_INTERVAL: int = 30  # seconds idle before re-checking
+    MIKROTIK_SOCKET_TIMEOUT: int = 15  # seconds
+    MIKROTIK_EXECUTOR_WORKERS: int = 16  # threads for blocking RouterOS calls, shared by all routers
+    MIKROTIK_CALL_TIMEOUT: int = 20  # seconds per call, including queueing
+    # Hotspot router fleet as a JSON list, e.g.
+    # [{"nas_ip": "10.0.0.1", "host": "10.0.0.1", "username": "api", "password": "..."}]
+    # Missing fields fall back to the MIKROTIK_* values above. When empty,
+    # MIKROTIK_HOST is the only router.
+    MIKROTIK_ROUTERS: List[Dict[str, Any]] = []
     
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
+    REDIS_SOCKET_TIMEOUT: float = 0.5  # seconds; keeps hot paths fast when Redis stalls
     
     # M-Pesa (Safaricom - Kenya)
     MPESA_CONSUMER_KEY: str = ""
@@ -44,6 +68,20 @@ class Settings(BaseSettings):
     MPESA_PASSKEY: str = ""
     MPESA_CALLBACK_URL: str = ""
     MPESA_ENVIRONMENT: str = "sandbox"  # or "production"
+    MPESA_TIMEOUT: int = 30  # seconds
+    MPESA_MAX_CONNECTIONS: int = 50  # pooled keep-alive connections
+    MPESA_TOKEN_REFRESH_MARGIN: int = 60  # refresh the OAuth token this many seconds early
+    MPESA_TOKEN_RETRY_BACKOFF: int = 10  # seconds without token requests after a failed one
+    MPESA_CALLBACK_ALLOWED_IPS: List[str] = []  # empty allows any source
+    MPESA_SETTLEMENT_BATCH_SIZE: int = 200
+    MPESA_SETTLEMENT_MAX_WAIT: float = 0.5  # seconds to fill a batch
+    MPESA_SETTLEMENT_QUEUE_SIZE: int = 10000
+    MPESA_RECONCILE_INTERVAL: int = 60  # seconds between reconciliation runs
+    MPESA_RECONCILE_MIN_AGE: int = 120  # seconds before a pending payment is queried
+    MPESA_RECONCILE_MAX_AGE: int = 86400  # seconds before an unresolved payment is left for manual review
+    MPESA_RECONCILE_BATCH_SIZE: int = 100
+    MPESA_RECONCILE_CONCURRENCY: int = 5
+    MPESA_RECONCILE_RATE: float = 5.0  # status queries per second
     
     # Email
     SMTP_HOST: str = "smtp.gmail.com"
@@ -58,11 +96,66 @@ class Settings(BaseSettings):
     CORS_ORIGINS: str = "http://localhost:5173"
     
     # Rate Limiting
-    RATE_LIMIT_PER_MINUTE: int = 60
+    RATE_LIMIT_PER_MINUTE: int = 60  # 0 disables rate limiting
+    # Per-route limits (requests per minute) overriding RATE_LIMIT_PER_MINUTE
+    RATE_LIMIT_ROUTES: Dict[str, int] = {
+        "/api/v1/auth/login": 10,
+        "/api/v1/auth/register": 5,
+        "/api/v1/plans/purchase": 5,
+        "/api/v1/plans/redeem-voucher": 10,
+    }
+    RATE_LIMIT_EXEMPT_PATHS: List[str] = ["/health", "/ready", "/api/v1/transactions/mpesa/callback"]
+    RATE_LIMIT_REDIS_RETRY_INTERVAL: int = 5  # seconds on local counters after a Redis error
+    
+    # Pagination
+    PAGE_SIZE_DEFAULT: int = 50
+    PAGE_SIZE_MAX: int = 200
+    
+    # Partitioning (sessions and transactions are partitioned by month)
+    PARTITION_MONTHS_AHEAD: int = 3  # monthly partitions kept created ahead of the current one
+    PARTITION_MAINTENANCE_INTERVAL: int = 3600  # seconds between partition maintenance runs
+    PARTITION_LOCK_TIMEOUT: int = 5000  # ms partition DDL waits for a table lock before retrying next run
+    SESSION_RETENTION_MONTHS: int = 0  # months of session partitions kept; 0 keeps everything
+    TRANSACTION_RETENTION_MONTHS: int = 0  # months of transaction partitions kept; 0 keeps everything
+    
+    # Exports
+    EXPORT_BATCH_SIZE: int = 5000  # rows fetched from the server-side cursor per chunk
+    EXPORT_MAX_CONCURRENT: int = 2  # exports running at once; each holds a database connection
+    
+    # Plan catalog
+    PLAN_CATALOG_MAX_AGE: int = 300  # seconds before a snapshot is rebuilt regardless of invalidations
+    
+    # Vouchers
+    VOUCHER_CODE_LENGTH: int = 12
+    VOUCHER_BATCH_MAX_SIZE: int = 100000
+    VOUCHER_BATCH_CHUNK_SIZE: int = 10000  # codes per COPY and commit
+    VOUCHER_FILTER_CAPACITY: int = 2000000  # issued codes before the false-positive rate degrades
+    VOUCHER_FILTER_ERROR_RATE: float = 0.001
+    VOUCHER_FILTER_SYNC_INTERVAL: int = 10  # seconds between syncs from the vouchers table
     
     # Session Management
     SESSION_CHECK_INTERVAL: int = 300  # seconds
     INACTIVE_SESSION_TIMEOUT: int = 600  # seconds
+    PLAN_EXPIRY_CHUNK_SIZE: int = 1000  # plans deactivated per transaction
+    SESSION_RECONCILE_INTERVAL: int = 60  # seconds between router/database session reconciliations
+    SESSION_RECONCILE_GRACE: int = 60  # seconds a new session may be missing from its router before it is closed
+    
+    # Reporting rollups
+    ROLLUP_INTERVAL: int = 300  # seconds between incremental rollup runs
+    ROLLUP_OVERLAP: int = 600  # seconds re-read behind the watermark to catch late commits
+    ROLLUP_BATCH_SIZE: int = 5000  # sessions folded in per transaction
+    ROLLUP_MARK_RETENTION_DAYS: int = 2  # days a closed session's counters are remembered
+    REPORT_TIMEZONE: str = "Africa/Nairobi"  # day boundaries of daily rollups and dashboard stats
+    LIVE_STATS_CORRECTION_INTERVAL: int = 60  # seconds between recomputing dashboard counters from the database
+    
+    # Scheduler
+    SCHEDULER_ENABLED: bool = True  # run periodic maintenance jobs in this process
+    SCHEDULER_JITTER: float = 0.1  # fraction of each interval randomized across workers
+    
+    # Metrics
+    METRICS_ENABLED: bool = True  # record Prometheus metrics and serve /metrics
+    METRICS_ALLOWED_IPS: List[str] = ["127.0.0.1", "::1"]  # scrapers allowed without a token
+    METRICS_TOKEN: str = ""  # bearer token that also allows scrapes; empty disables it
     
     # File Upload
     MAX_UPLOAD_SIZE: int = 5 * 1024 * 1024  # 5MB
@@ -0,0 +1,172 @@
+import secrets
+from typing import Dict, Optional, Sequence, Tuple
+import prometheus_client as prometheus
+from prometheus_client.core import GaugeMetricFamily
+from .config import settings
+
+enabled = settings.METRICS_ENABLED
+
+CONTENT_TYPE = prometheus.CONTENT_TYPE_LATEST
+
+# Anything else is reported as OTHER so clients can't invent label values
+HTTP_METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+
+
+class _NoopMetric:
+    """Stands in for every metric when metrics are disabled"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+
+_NOOP = _NoopMetric()
+
+
+def _histogram(name: str, documentation: str, labels: Sequence[str], buckets: Sequence[float]):
+    if not enabled:
+        return _NOOP
+    return prometheus.Histogram(name, documentation, labels, buckets=buckets)
+
+
+def _counter(name: str, documentation: str, labels: Sequence[str]):
+    if not enabled:
+        return _NOOP
+    return prometheus.Counter(name, documentation, labels)
+
+
+# Every label below takes values from a fixed set: route templates (never raw
+# paths), status codes, service method names, configured routers and job names.
+HTTP_REQUEST_DURATION = _histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+MIKROTIK_CALL_DURATION = _histogram(
+    "mikrotik_call_duration_seconds",
+    "RouterOS API call latency, including time queued for a worker thread",
+    ["router", "operation"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+MIKROTIK_CALL_ERRORS = _counter(
+    "mikrotik_call_errors_total",
+    "RouterOS API calls that timed out, raised or reported failure",
+    ["router", "operation", "reason"]
+)
+MPESA_REQUEST_DURATION = _histogram(
+    "mpesa_request_duration_seconds",
+    "Safaricom API request latency",
+    ["endpoint"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+MPESA_REQUEST_ERRORS = _counter(
+    "mpesa_request_errors_total",
+    "Safaricom API requests that failed or returned an error status",
+    ["endpoint", "reason"]
+)
+JOB_DURATION = _histogram(
+    "scheduler_job_duration_seconds",
+    "Scheduled job run time",
+    ["job"],
+    buckets=(0.01, 0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600)
+)
+JOB_FAILURES = _counter(
+    "scheduler_job_failures_total",
+    "Scheduled job runs that raised",
+    ["job"]
+)
+
+
+class _PoolCollector:
+    """Reads connection pool usage at scrape time, so requests pay nothing for it"""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def collect(self):
+        pool = self.engine.sync_engine.pool
+        gauges = (
+            ("db_pool_size", "Connections the pool keeps open", pool.size()),
+            ("db_pool_checked_out", "Connections currently in use", pool.checkedout()),
+            # QueuePool counts overflow from -pool_size
+            ("db_pool_overflow", "Connections open beyond the pool size", max(0, pool.overflow())),
+        )
+        for name, documentation, value in gauges:
+            yield GaugeMetricFamily(name, documentation, value=value)
+
+
+def instrument_pool(engine):
+    """Export checked-out and overflow connections of ``engine``'s pool"""
+    # NullPool (tests) keeps no connections to report
+    if enabled and hasattr(engine.sync_engine.pool, "checkedout"):
+        prometheus.REGISTRY.register(_PoolCollector(engine))
+
+
+def scrape_allowed(client_host: Optional[str], authorization: Optional[str]) -> bool:
+    """Whether a scrape comes from an allowed IP or carries the metrics token"""
+    if client_host is not None and client_host in settings.METRICS_ALLOWED_IPS:
+        return True
+    token = settings.METRICS_TOKEN
+    if not token or not authorization or authorization[:7].lower() != "bearer ":
+        return False
+    return secrets.compare_digest(authorization[7:].encode(), token.encode())
+
+
+def render() -> bytes:
+    """Current metrics in the Prometheus text format"""
+    return prometheus.generate_latest()
+
+
+# (method, route, status) -> labelled histogram, so requests skip the label lookup
+_request_children: Dict[Tuple[str, str, int], object] = {}
+
+
+def _route_template(scope) -> str:
+    """Full path template of the matched route, or "unmatched".
+
+    Routes of included routers may only know their path within the router,
+    so the prefix they were included under is recovered from the request
+    path: it's whatever precedes the part the route's pattern matches.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        return "unmatched"
+    path_regex = getattr(route, "path_regex", None)
+    path = scope["path"]
+    root_path = scope.get("root_path", "")
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    if path_regex is None or path_regex.match(path):
+        return template
+    start = path.find("/", 1)
+    while start != -1:
+        if path_regex.match(path[start:]):
+            return path[:start] + template
+        start = path.find("/", start + 1)
+    return template
+
+
+def observe_request(scope, status_code: int, elapsed: float):
+    """Record a request's latency by route template.
+
+    The route is read from the scope after routing, so unmatched paths
+    share one label value.
+    """
+    if not enabled:
+        return
+    method = scope["method"]
+    if method not in HTTP_METHODS:
+        method = "OTHER"
+    key = (method, _route_template(scope), status_code)
+    child = _request_children.get(key)
+    if child is None:
+        child = HTTP_REQUEST_DURATION.labels(*key[:2], str(status_code))
+        _request_children[key] = child
+    child.observe(elapsed)
@@ -0,0 +1,121 @@
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+from .config import settings
+from .redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Sliding window counter: the previous window's count is weighted by how
+# much of it still overlaps the sliding window. Runs atomically in Redis.
+SLIDING_WINDOW_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local limit = tonumber(ARGV[1])
+local weight = tonumber(ARGV[2])
+local ttl = tonumber(ARGV[3])
+if previous * weight + current >= limit then
+  return {0, current, previous}
+end
+current = redis.call('INCR', KEYS[1])
+if current == 1 then
+  redis.call('EXPIRE', KEYS[1], ttl)
+end
+return {1, current, previous}
+"""
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: int
+
+
+class SlidingWindowRateLimiter:
+    """Distributed sliding-window rate limiter.
+
+    Counters live in Redis so limits hold across workers and nodes, at one
+    EVALSHA round trip per request. While Redis is unreachable the limiter
+    falls back to per-process counters and retries Redis after
+    ``redis_retry_interval`` seconds.
+    """
+
+    def __init__(
+        self,
+        window: int = 60,
+        redis_retry_interval: float = 5.0,
+        local_max_keys: int = 100_000
+    ):
+        self.window = window
+        self.redis_retry_interval = redis_retry_interval
+        self.local_max_keys = local_max_keys
+        self._script = None
+        self._script_client = None
+        self._redis_down_until = 0.0
+        # key -> [window id, current count, previous count]
+        self._local: "OrderedDict[str, list]" = OrderedDict()
+
+    def _result(self, allowed: bool, limit: int, previous: int, current: int, weight: float, elapsed: float) -> RateLimitResult:
+        estimated = previous * weight + current
+        remaining = max(0, int(limit - estimated))
+        retry_after = 0
+        if not allowed:
+            retry_after = max(1, math.ceil(self.window - elapsed))
+        return RateLimitResult(allowed, limit, remaining, retry_after)
+
+    async def hit(self, key: str, limit: int) -> RateLimitResult:
+        """Count one request against ``key`` and report whether it is allowed"""
+        now = time.time()
+        window_id = int(now // self.window)
+        elapsed = now - window_id * self.window
+        weight = 1.0 - elapsed / self.window
+
+        redis = get_redis()
+        if redis is not None and time.monotonic() >= self._redis_down_until:
+            try:
+                return await self._hit_redis(redis, key, limit, window_id, weight, elapsed)
+            except Exception as e:
+                logger.warning(f"Rate limiter falling back to local counters: {e}")
+                self._redis_down_until = time.monotonic() + self.redis_retry_interval
+
+        return self._hit_local(key, limit, window_id, weight, elapsed)
+
+    async def _hit_redis(self, redis, key: str, limit: int, window_id: int, weight: float, elapsed: float) -> RateLimitResult:
+        if self._script is None or self._script_client is not redis:
+            self._script = redis.register_script(SLIDING_WINDOW_SCRIPT)
+            self._script_client = redis
+
+        # Hash tag keeps both windows in one cluster slot
+        keys = [f"rl:{{{key}}}:{window_id}", f"rl:{{{key}}}:{window_id - 1}"]
+        allowed, current, previous = await self._script(
+            keys=keys, args=[limit, weight, self.window * 2]
+        )
+        return self._result(bool(allowed), limit, previous, current, weight, elapsed)
+
+    def _hit_local(self, key: str, limit: int, window_id: int, weight: float, elapsed: float) -> RateLimitResult:
+        entry = self._local.get(key)
+        if entry is None:
+            entry = [window_id, 0, 0]
+            self._local[key] = entry
+            if len(self._local) > self.local_max_keys:
+                self._local.popitem(last=False)
+        else:
+            self._local.move_to_end(key)
+
+        if entry[0] != window_id:
+            entry[2] = entry[1] if entry[0] == window_id - 1 else 0
+            entry[0], entry[1] = window_id, 0
+
+        allowed = entry[2] * weight + entry[1] < limit
+        if allowed:
+            entry[1] += 1
+        return self._result(allowed, limit, entry[2], entry[1], weight, elapsed)
+
+
+# Singleton instance
+rate_limiter = SlidingWindowRateLimiter(
+    redis_retry_interval=settings.RATE_LIMIT_REDIS_RETRY_INTERVAL
+)
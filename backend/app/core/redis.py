@@ -0,0 +1,94 @@
+import asyncio
+import json
+import logging
+from typing import Any, Callable, Dict, Optional
+from redis.asyncio import Redis
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+_client = None
+
+
+def get_redis():
+    """Shared Redis client, or None when Redis is not configured"""
+    global _client
+    if _client is None and settings.REDIS_URL:
+        _client = Redis.from_url(
+            settings.REDIS_URL,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        )
+    return _client
+
+
+async def close_redis():
+    """Close the shared Redis client"""
+    global _client
+    if _client is not None:
+        try:
+            await _client.aclose()
+        except Exception as e:
+            logger.warning(f"Error closing Redis client: {e}")
+        _client = None
+
+
+def _stats_key(name: str) -> str:
+    return f"stats:published:{name}"
+
+
+async def publish_stats(name: str, stats: Dict[str, Any], ttl: int = 86400):
+    """Share ``stats`` with the other workers, e.g. after a job run on the leader"""
+    redis = get_redis()
+    if redis is None:
+        return
+    try:
+        await redis.set(_stats_key(name), json.dumps(stats, default=str), ex=ttl)
+    except Exception as e:
+        logger.warning(f"Failed to publish {name} stats: {e}")
+
+
+async def published_stats(name: str) -> Optional[Dict[str, Any]]:
+    """Stats last published under ``name`` by any worker; None without Redis or if never published"""
+    redis = get_redis()
+    if redis is None:
+        return None
+    try:
+        value = await redis.get(_stats_key(name))
+    except Exception as e:
+        logger.warning(f"Failed to read {name} stats: {e}")
+        return None
+    return json.loads(value) if value is not None else None
+
+
+async def listen(
+    channel: str,
+    handler: Callable[[bytes], None],
+    on_reconnect: Optional[Callable[[], None]] = None
+):
+    """Deliver pub/sub messages on ``channel`` to ``handler`` until cancelled.
+
+    ``on_reconnect`` runs after the subscription drops, since messages
+    published while disconnected are lost.
+    """
+    while True:
+        pubsub = get_redis().pubsub()
+        try:
+            await pubsub.subscribe(channel)
+            while True:
+                # Explicit timeout; the client's socket timeout is tuned for commands
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is not None:
+                    handler(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Redis subscription to {channel} failed: {e}")
+            if on_reconnect:
+                on_reconnect()
+            await asyncio.sleep(5)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
@@ -0,0 +1,307 @@
+import asyncio
+import logging
+import random
+import time
+import uuid
+import zlib
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from sqlalchemy import text
+from .config import settings
+from ..database import engine
+from .metrics import JOB_DURATION, JOB_FAILURES
+from .redis import get_redis, publish_stats, published_stats
+
+logger = logging.getLogger(__name__)
+
+# Take the lock if it is free, or renew it if this worker already holds it.
+# Returns 1 while the caller holds the lock.
+ACQUIRE_SCRIPT = """
+local holder = redis.call('GET', KEYS[1])
+if holder == ARGV[1] then
+  redis.call('PEXPIRE', KEYS[1], ARGV[2])
+  return 1
+end
+if not holder then
+  redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+  return 1
+end
+return 0
+"""
+
+# Release the lock only if this worker still holds it
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+@dataclass
+class ScheduledJob:
+    """A periodic job and its run statistics"""
+    name: str
+    func: Callable[[], Awaitable[Any]]
+    interval: float
+    jitter: float
+    runs: int = 0
+    failures: int = 0
+    overruns: int = 0
+    skipped: int = 0  # runs left to the worker holding the lock
+    running: bool = False
+    leader: bool = False
+    last_started_at: Optional[datetime] = None
+    last_duration: float = 0.0
+    max_duration: float = 0.0
+    total_duration: float = 0.0
+    last_result: Any = None
+    last_error: Optional[str] = None
+    next_run_at: Optional[datetime] = None
+
+    @property
+    def lock_key(self) -> str:
+        return f"scheduler:lock:{self.name}"
+
+    @property
+    def advisory_lock_id(self) -> int:
+        """Postgres advisory lock id held for the duration of a run"""
+        return zlib.crc32(self.lock_key.encode())
+
+    @property
+    def lock_ttl(self) -> int:
+        """Redis lock TTL in ms; outlives a missed run, so a short stall doesn't hand the job over"""
+        return int(self.interval * (2 + self.jitter) * 1000)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "interval": self.interval,
+            "runs": self.runs,
+            "failures": self.failures,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "running": self.running,
+            "leader": self.leader,
+            "last_started_at": self.last_started_at.isoformat() if self.last_started_at else None,
+            "last_duration": round(self.last_duration, 3),
+            "max_duration": round(self.max_duration, 3),
+            "avg_duration": round(self.total_duration / self.runs, 3) if self.runs else 0.0,
+            "last_result": self.last_result if isinstance(self.last_result, (int, float, str)) else None,
+            "last_error": self.last_error,
+            "next_run_at": self.next_run_at.isoformat() if self.next_run_at else None,
+        }
+
+
+class Scheduler:
+    """In-process scheduler for periodic maintenance jobs.
+
+    Every worker runs the same schedule, but a job only runs on the worker
+    holding its Redis lock (SET NX PX). The holder renews the lock on each
+    run and keeps renewing it while the job runs, so a job sticks to one
+    worker until that worker stops or dies; if renewal finds another
+    holder the run is cancelled. Without Redis, or while it is
+    unreachable, every worker is a candidate.
+
+    Either way a run also holds a Postgres advisory lock for its whole
+    duration, so two runs of a job never overlap: jobs like rollups and
+    the reconcilers are not safe to run concurrently. Intervals are
+    jittered so workers started together don't query the database in
+    lockstep.
+    """
+
+    def __init__(self, jitter: float = settings.SCHEDULER_JITTER):
+        self.jitter = jitter
+        self.worker_id = uuid.uuid4().hex
+        self._jobs: Dict[str, ScheduledJob] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def add(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        interval: float,
+        jitter: Optional[float] = None
+    ) -> ScheduledJob:
+        """Register a job; call before ``start``"""
+        job = ScheduledJob(
+            name=name,
+            func=func,
+            interval=interval,
+            jitter=self.jitter if jitter is None else jitter
+        )
+        self._jobs[name] = job
+        return job
+
+    @property
+    def jobs(self) -> List[ScheduledJob]:
+        return list(self._jobs.values())
+
+    def _delay(self, job: ScheduledJob) -> float:
+        return job.interval * random.uniform(1 - job.jitter, 1 + job.jitter)
+
+    async def _acquire(self, job: ScheduledJob) -> Optional[bool]:
+        """Take or renew the Redis lock; None when Redis can't decide"""
+        redis = get_redis()
+        if redis is None:
+            return None
+        try:
+            return bool(await redis.eval(ACQUIRE_SCRIPT, 1, job.lock_key, self.worker_id, job.lock_ttl))
+        except Exception as e:
+            logger.warning(f"Scheduler lock for {job.name} unavailable, using a database lock: {e}")
+            return None
+
+    async def _heartbeat(self, job: ScheduledJob, task: asyncio.Task):
+        """Keep renewing the Redis lock while ``task`` runs; cancel it if the lock is lost"""
+        while True:
+            await asyncio.sleep(job.lock_ttl / 3000)
+            held = await self._acquire(job)
+            if held is False:
+                logger.error(f"Scheduled job {job.name} lost its lock to another worker, cancelling the run")
+                task.cancel()
+                return
+
+    @asynccontextmanager
+    async def _exclusive(self, job: ScheduledJob) -> AsyncIterator[bool]:
+        """Yield whether this worker may run ``job`` now, holding its locks meanwhile"""
+        if await self._acquire(job) is False:
+            yield False
+            return
+
+        # Session-level advisory lock on its own connection, for the whole run
+        async with engine.connect() as conn:
+            held = bool(await conn.scalar(
+                text("SELECT pg_try_advisory_lock(:id)"), {"id": job.advisory_lock_id}
+            ))
+            if not held:
+                logger.warning(f"Scheduled job {job.name} is still running on another worker, skipping")
+            try:
+                yield held
+            finally:
+                if held:
+                    try:
+                        await conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": job.advisory_lock_id})
+                    except Exception as e:
+                        # Closing the connection for good releases the lock instead
+                        logger.warning(f"Failed to release database lock for {job.name}: {e}")
+                        await conn.invalidate()
+
+    async def _release(self, job: ScheduledJob):
+        redis = get_redis()
+        if redis is None or not job.leader:
+            return
+        try:
+            await redis.eval(RELEASE_SCRIPT, 1, job.lock_key, self.worker_id)
+        except Exception as e:
+            logger.warning(f"Failed to release scheduler lock for {job.name}: {e}")
+
+    async def run(self, job: ScheduledJob):
+        """Run ``job`` once if this worker holds its lock"""
+        async with self._exclusive(job) as leader:
+            job.leader = leader
+            if not leader:
+                job.skipped += 1
+                return
+            await self._run_locked(job)
+        # The leader's numbers are the ones worth showing on every worker
+        await publish_stats(f"job:{job.name}", {**job.stats(), "worker_id": self.worker_id})
+
+    async def _run_locked(self, job: ScheduledJob):
+        job.running = True
+        job.last_started_at = datetime.utcnow()
+        started = time.monotonic()
+        task = asyncio.create_task(job.func())
+        heartbeat = asyncio.create_task(self._heartbeat(job, task)) if get_redis() is not None else None
+        try:
+            job.last_result = await task
+            job.last_error = None
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(e)
+            JOB_FAILURES.labels(job.name).inc()
+            logger.error(f"Scheduled job {job.name} failed: {e}")
+        except asyncio.CancelledError:
+            if not task.cancelled() or asyncio.current_task().cancelling():
+                # The scheduler itself is being stopped
+                task.cancel()
+                raise
+            job.failures += 1
+            job.last_error = "lock lost"
+            JOB_FAILURES.labels(job.name).inc()
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+            elapsed = time.monotonic() - started
+            job.running = False
+            job.runs += 1
+            job.last_duration = elapsed
+            job.total_duration += elapsed
+            job.max_duration = max(job.max_duration, elapsed)
+            JOB_DURATION.labels(job.name).observe(elapsed)
+            if elapsed > job.interval:
+                job.overruns += 1
+                logger.warning(
+                    f"Scheduled job {job.name} took {elapsed:.1f}s, longer than its {job.interval}s interval"
+                )
+
+    async def _loop(self, job: ScheduledJob):
+        # Spread first runs across workers and jobs
+        delay = random.uniform(0, job.interval * job.jitter)
+        while True:
+            job.next_run_at = datetime.utcnow() + timedelta(seconds=delay)
+            await asyncio.sleep(delay)
+            started = time.monotonic()
+            try:
+                await self.run(job)
+            except Exception as e:
+                # e.g. the database lock couldn't be taken; try again next time
+                job.failures += 1
+                job.last_error = str(e)
+                JOB_FAILURES.labels(job.name).inc()
+                logger.error(f"Scheduled job {job.name} could not run: {e}")
+            # Fixed cadence; a job that overran starts again straight away
+            delay = max(0.0, self._delay(job) - (time.monotonic() - started))
+
+    async def start(self):
+        if self._tasks:
+            return
+        for job in self._jobs.values():
+            self._tasks.append(asyncio.create_task(self._loop(job)))
+        logger.info(f"Scheduler started with {len(self._jobs)} jobs")
+
+    async def stop(self):
+        """Cancel the job loops and hand the locks over to other workers"""
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for job in self._jobs.values():
+            await self._release(job)
+            job.leader = False
+
+    def stats(self) -> Dict[str, Any]:
+        """Job statistics as seen by this worker"""
+        return {
+            "worker_id": self.worker_id,
+            "running": bool(self._tasks),
+            "jobs": [job.stats() for job in self._jobs.values()],
+        }
+
+    async def shared_stats(self) -> Dict[str, Any]:
+        """Job statistics from the worker that last ran each job, or this one's without Redis"""
+        jobs = []
+        for job in self._jobs.values():
+            published = await published_stats(f"job:{job.name}")
+            jobs.append(published or {**job.stats(), "worker_id": self.worker_id})
+        return {
+            "worker_id": self.worker_id,
+            "running": bool(self._tasks),
+            "jobs": jobs,
+        }
+
+
+# Singleton instance
+scheduler = Scheduler()
@@ -1,5 +1,7 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
@@ -8,7 +10,11 @@ import secrets
 import string
 
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.PASSWORD_BCRYPT_ROUNDS
+)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -21,6 +27,65 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+class PasswordHasher:
+    """Runs bcrypt on a dedicated thread pool with admission control.
+
+    bcrypt releases the GIL, so hashing on worker threads keeps the event
+    loop free. At most ``workers + queue_size`` hashes are admitted at a
+    time; beyond that callers get an immediate 503 instead of queueing
+    behind a login storm.
+    """
+
+    def __init__(
+        self,
+        workers: int = settings.PASSWORD_HASH_WORKERS,
+        queue_size: int = settings.PASSWORD_HASH_QUEUE_SIZE
+    ):
+        self.capacity = workers + queue_size
+        self._in_flight = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+
+    async def _run(self, func, *args):
+        if self._in_flight >= self.capacity:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication is busy, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        loop = asyncio.get_running_loop()
+        self._in_flight += 1
+        future = self._executor.submit(func, *args)
+        # Released when the hash finishes, not when the caller stops waiting:
+        # a cancelled request (client gone) leaves bcrypt running on its thread
+        future.add_done_callback(lambda _: self._release(loop))
+        return await asyncio.wrap_future(future)
+
+    def _release(self, loop: asyncio.AbstractEventLoop):
+        try:
+            loop.call_soon_threadsafe(self._done)
+        except RuntimeError:
+            # Event loop already closed at shutdown
+            pass
+
+    def _done(self):
+        self._in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        """Hash a password off the event loop"""
+        return await self._run(pwd_context.hash, password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password, returning a new hash if the stored one uses outdated parameters"""
+        return await self._run(pwd_context.verify_and_update, plain_password, hashed_password)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+# Singleton instance
+password_hasher = PasswordHasher()
+
+
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
     to_encode = data.copy()
@@ -57,16 +122,34 @@ def decode_token(token: str) -> Dict[str, Any]:
         )
 
 
-def generate_voucher_code(length: int = 12) -> str:
-    """Generate a random voucher code"""
-    characters = string.ascii_uppercase + string.digits
-    # Remove similar looking characters
-    characters = characters.replace('O', '').replace('0', '').replace('I', '').replace('1', '')
-    code = ''.join(secrets.choice(characters) for _ in range(length))
+# Voucher code characters, without similar looking ones (O/0, I/1).
+# Exactly 32 symbols, so 5 random bits map to a symbol without bias.
+VOUCHER_ALPHABET = ''.join(
+    c for c in string.ascii_uppercase + string.digits if c not in 'O0I1'
+).encode()
+_VOUCHER_TRANSLATION = bytes(VOUCHER_ALPHABET[b & 31] for b in range(256))
+
+
+def _format_voucher_code(code: str) -> str:
     # Format as XXXX-XXXX-XXXX
     return '-'.join([code[i:i+4] for i in range(0, len(code), 4)])
 
 
+def generate_voucher_code(length: int = 12) -> str:
+    """Generate a random voucher code"""
+    return generate_voucher_codes(1, length)[0]
+
+
+def generate_voucher_codes(count: int, length: int = 12) -> List[str]:
+    """Generate many random voucher codes at once"""
+    # One byte per symbol, masked to 5 bits, translated in a single pass
+    raw = secrets.token_bytes(count * length).translate(_VOUCHER_TRANSLATION).decode()
+    return [
+        _format_voucher_code(raw[i:i + length])
+        for i in range(0, count * length, length)
+    ]
+
+
 def generate_transaction_ref() -> str:
     """Generate unique transaction reference"""
     timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
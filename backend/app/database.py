@@ -2,6 +2,7 @@ from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sess
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.pool import NullPool
 from .core.config import settings
+from pathlib import Path
 import logging
 
 logger = logging.getLogger(__name__)
@@ -43,15 +44,32 @@ async def get_db():
             await session.close()
 
 
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def _upgrade(connection):
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(str(BACKEND_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND_DIR / "alembic"))
+    config.attributes["connection"] = connection
+    command.upgrade(config, "head")
+
+
 # Initialize database
 async def init_db():
+    """Apply pending migrations.
+
+    The schema (partitioned tables included) comes from the Alembic
+    revisions rather than ``create_all``; workers starting together
+    serialize on an advisory lock in ``alembic/env.py``.
+    """
+    if not settings.DATABASE_MIGRATE_ON_STARTUP:
+        return
     async with engine.begin() as conn:
-        # Import all models here to ensure they're registered
-        from .models import user, plan, transaction, session, voucher
-        
-        # Create all tables
-        await conn.run_sync(Base.metadata.create_all)
-        logger.info("Database tables created successfully")
+        await conn.run_sync(_upgrade)
+        logger.info("Database migrations applied")
 
 
 # Close database connections
@@ -1,34 +1,39 @@
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.exceptions import RequestValidationError
 from contextlib import asynccontextmanager
 import logging
-import time
 
+from .core import metrics
 from .core.config import settings
+from .core.middleware import RequestIdLogFilter, RequestPipeline
+from .core.redis import get_redis, close_redis
+from .core.scheduler import scheduler
+from .core.security import password_hasher
 from .database import init_db, close_db
-from .api.v1 import auth, plans
+from .api.v1 import admin, auth, plans, sessions, transactions, users, vouchers
+from .services.radius import radius_accounting_server
+from .services.mikrotik import mikrotik_fleet
+from .services.payment import mpesa_service
+from .services.settlement import settlement_queue
+from .services.jobs import register_jobs
+from .services.user_cache import user_cache
+from .services.live_stats import live_stats
+from .services.plan_catalog import plan_catalog
+from .services.voucher_batch import voucher_batch_generator
+from .services.voucher_redemption import issued_vouchers
 from sqlalchemy import text
 from .database import engine
-import importlib
-import importlib.util
-
-# Dynamically import redis.asyncio at runtime to avoid static linter errors
-Redis = None
-if importlib.util.find_spec("redis.asyncio") is not None:
-    try:
-        _mod = importlib.import_module("redis.asyncio")
-        Redis = getattr(_mod, "Redis", None)
-    except Exception:
-        Redis = None
 
 # Configure logging
 logging.basicConfig(
     level=logging.INFO if not settings.DEBUG else logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    format='%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
 )
+for handler in logging.getLogger().handlers:
+    handler.addFilter(RequestIdLogFilter())
 logger = logging.getLogger(__name__)
 
 
@@ -42,6 +47,16 @@ async def lifespan(app: FastAPI):
     await init_db()
     logger.info("Database initialized")
 
+    if settings.RADIUS_ACCT_ENABLED:
+        await radius_accounting_server.start()
+    await user_cache.start()
+    await plan_catalog.start()
+    await issued_vouchers.start()
+    await settlement_queue.start()
+    if settings.SCHEDULER_ENABLED:
+        register_jobs(scheduler)
+        await scheduler.start()
+
     # Mark app as ready for readiness checks
     app.state.ready = True
 
@@ -51,6 +66,19 @@ async def lifespan(app: FastAPI):
     logger.info("Shutting down...")
     # mark not ready during shutdown
     app.state.ready = False
+    await scheduler.stop()
+    await voucher_batch_generator.stop()
+    await issued_vouchers.stop()
+    await settlement_queue.stop()
+    if settings.RADIUS_ACCT_ENABLED:
+        await radius_accounting_server.stop()
+    await user_cache.stop()
+    await live_stats.stop()
+    await plan_catalog.stop()
+    mikrotik_fleet.close()
+    await mpesa_service.close()
+    password_hasher.close()
+    await close_redis()
     await close_db()
     logger.info("Shutdown complete")
 
@@ -76,22 +104,8 @@ app.add_middleware(
 )
 
 
-# Request timing middleware
-@app.middleware("http")
-async def add_process_time_header(request: Request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
-    response.headers["X-Process-Time"] = str(process_time)
-    return response
-
-
-# Rate limiting middleware (basic)
-@app.middleware("http")
-async def rate_limit_middleware(request: Request, call_next):
-    # TODO: Implement Redis-based rate limiting
-    response = await call_next(request)
-    return response
+# Request IDs, rate limiting, timing and metrics (outside CORS, as before)
+app.add_middleware(RequestPipeline)
 
 
 # Exception handlers
@@ -129,9 +143,26 @@ async def health_check():
     }
 
 
+if metrics.enabled:
+    metrics.instrument_pool(engine)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def prometheus_metrics(request: Request):
+        client_host = request.client.host if request.client else None
+        if not metrics.scrape_allowed(client_host, request.headers.get("authorization")):
+            logger.warning(f"Rejected metrics scrape from {client_host or 'unknown'}")
+            return JSONResponse(status_code=status.HTTP_403_FORBIDDEN, content={"message": "Forbidden", "detail": "Not allowed to read metrics"})
+        return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 # API Routes
 app.include_router(auth.router, prefix=settings.API_V1_PREFIX)
 app.include_router(plans.router, prefix=settings.API_V1_PREFIX)
+app.include_router(sessions.router, prefix=settings.API_V1_PREFIX)
+app.include_router(transactions.router, prefix=settings.API_V1_PREFIX)
+app.include_router(users.router, prefix=settings.API_V1_PREFIX)
+app.include_router(vouchers.router, prefix=settings.API_V1_PREFIX)
+app.include_router(admin.router, prefix=settings.API_V1_PREFIX)
 
 
 @app.get("/ready")
@@ -149,11 +180,10 @@ async def readiness_probe():
             return Response(content='{"status":"db-unavailable"}', status_code=503, media_type="application/json")
 
         # Redis check (if redis lib available and REDIS_URL configured)
-        if Redis and settings.REDIS_URL:
+        redis = get_redis()
+        if redis is not None:
             try:
-                r = Redis.from_url(settings.REDIS_URL)
-                pong = await r.ping()
-                await r.close()
+                pong = await redis.ping()
                 if not pong:
                     raise RuntimeError("redis ping failed")
             except Exception:
@@ -164,13 +194,6 @@ async def readiness_probe():
     from fastapi import Response
     return Response(content='{"status":"initializing"}', status_code=503, media_type="application/json")
 
-# TODO: Add these routers
-# app.include_router(users.router, prefix=settings.API_V1_PREFIX)
-# app.include_router(transactions.router, prefix=settings.API_V1_PREFIX)
-# app.include_router(sessions.router, prefix=settings.API_V1_PREFIX)
-# app.include_router(admin.router, prefix=settings.API_V1_PREFIX)
-# app.include_router(vouchers.router, prefix=settings.API_V1_PREFIX)
-
 
 if __name__ == "__main__":
     import uvicorn
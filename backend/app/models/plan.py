@@ -1,6 +1,6 @@
 
-from sqlalchemy import Column, Integer, String, Numeric, DateTime, Boolean, ForeignKey, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, Boolean, ForeignKey, Index, Text, Enum as SQLEnum, text
+from sqlalchemy.orm import relationship, synonym
 from sqlalchemy.sql import func
 import enum
 from ..database import Base
@@ -23,9 +23,23 @@ class Plan(Base):
 	data_mb = Column(Integer, default=0)
 	is_active = Column(Boolean, default=True)
 
+	# Catalog fields used by the plan schemas
+	plan_type = Column(SQLEnum(PlanType), default=PlanType.TIME_BASED, nullable=False)
+	currency = Column(String(3), default="KES")
+	validity_hours = Column(Integer, nullable=True)
+	download_speed_limit = Column(Integer, nullable=True)  # kbps
+	upload_speed_limit = Column(Integer, nullable=True)  # kbps
+	mikrotik_profile = Column(String(100), nullable=True)
+	is_featured = Column(Boolean, default=False)
+	sort_order = Column(Integer, default=0)
+
 	created_at = Column(DateTime(timezone=True), server_default=func.now())
 	updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+	# Schema names for existing columns
+	validity_days = synonym("duration_days")
+	data_limit_mb = synonym("data_mb")
+
 	# Relationships
 	purchases = relationship("UserPlan", back_populates="plan", cascade="all, delete-orphan")
 
@@ -44,12 +58,30 @@ class UserPlan(Base):
 	end_date = Column(DateTime(timezone=True), nullable=True)
 	active = Column(Boolean, default=True)
 
+	# Data usage (NULL remaining means the plan is not data capped)
+	data_used_mb = Column(Integer, default=0)
+	data_remaining_mb = Column(Integer, nullable=True)
+
+	# transactions is partitioned, so this can't be a foreign key to its id alone
+	transaction_id = Column(Integer, nullable=True)
+
 	created_at = Column(DateTime(timezone=True), server_default=func.now())
 	updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+	# Names used by the session manager and plan endpoints
+	is_active = synonym("active")
+	activated_at = synonym("start_date")
+	expires_at = synonym("end_date")
+
 	# Relationships
 	user = relationship("User", back_populates="purchased_plans")
 	plan = relationship("Plan", back_populates="purchases")
 
+	# Active plans only: entitlement checks and expiry
+	__table_args__ = (
+		Index("ix_user_plans_user_active", "user_id", "end_date", postgresql_where=text("active")),
+		Index("ix_user_plans_end_active", "end_date", postgresql_where=text("active")),
+	)
+
 	def __repr__(self):
 		return f"<UserPlan user_id={self.user_id} plan_id={self.plan_id}>"
@@ -0,0 +1,63 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Numeric, Date, DateTime, Index
+from sqlalchemy.sql import func
+from ..database import Base
+
+
+class UsageHourly(Base):
+    """Usage and revenue per hour, user, plan and NAS.
+
+    Dimension columns are NOT NULL so they can form the primary key:
+    0 stands for no user or plan and '' for no NAS (revenue rows).
+    """
+    __tablename__ = "usage_hourly"
+
+    bucket = Column(DateTime(timezone=True), primary_key=True)  # start of the hour
+    user_id = Column(Integer, primary_key=True, default=0)
+    plan_id = Column(Integer, primary_key=True, default=0)
+    nas_ip_address = Column(String(45), primary_key=True, default="")
+
+    upload_bytes = Column(BigInteger, nullable=False, default=0)
+    download_bytes = Column(BigInteger, nullable=False, default=0)
+    session_seconds = Column(BigInteger, nullable=False, default=0)
+    sessions = Column(Integer, nullable=False, default=0)  # sessions first seen in this hour
+    revenue = Column(Numeric(12, 2), nullable=False, default=0)
+    purchases = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_usage_hourly_user_bucket", "user_id", "bucket"),
+    )
+
+
+class UsageDaily(Base):
+    """Usage and revenue per day (in REPORT_TIMEZONE), plan and NAS"""
+    __tablename__ = "usage_daily"
+
+    day = Column(Date, primary_key=True)
+    plan_id = Column(Integer, primary_key=True, default=0)
+    nas_ip_address = Column(String(45), primary_key=True, default="")
+
+    upload_bytes = Column(BigInteger, nullable=False, default=0)
+    download_bytes = Column(BigInteger, nullable=False, default=0)
+    session_seconds = Column(BigInteger, nullable=False, default=0)
+    sessions = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(12, 2), nullable=False, default=0)
+    purchases = Column(Integer, nullable=False, default=0)
+
+
+class RollupSessionMark(Base):
+    """Counters of a session already included in the rollups"""
+    __tablename__ = "rollup_session_marks"
+
+    session_id = Column(Integer, primary_key=True)  # sessions.id
+    upload_bytes = Column(BigInteger, nullable=False, default=0)
+    download_bytes = Column(BigInteger, nullable=False, default=0)
+    session_seconds = Column(BigInteger, nullable=False, default=0)
+
+
+class RollupWatermark(Base):
+    """How far each rollup has processed its source table"""
+    __tablename__ = "rollup_watermarks"
+
+    name = Column(String(50), primary_key=True)
+    value = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
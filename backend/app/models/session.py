@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, ForeignKey, Index, text
+from sqlalchemy.orm import relationship, synonym
 from sqlalchemy.sql import func
 from ..database import Base
 
@@ -7,19 +7,50 @@ from ..database import Base
 class Session(Base):
     __tablename__ = "sessions"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     mac_address = Column(String(17), nullable=True, index=True)
     ip_address = Column(String(45), nullable=True)
-    started_at = Column(DateTime(timezone=True), server_default=func.now())
-    ended_at = Column(DateTime(timezone=True), nullable=True)
+    # Partition key, so part of the table's primary key
+    started_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
+    ended_at = Column(DateTime(timezone=True), nullable=True, index=True)
     active = Column(Boolean, default=True)
-    bytes_used = Column(Integer, default=0)
+    bytes_used = Column(BigInteger, default=0)
+
+    # RADIUS accounting
+    session_id = Column(String(64), nullable=True, index=True)  # Acct-Session-Id
+    username = Column(String(100), nullable=True, index=True)
+    nas_ip_address = Column(String(45), nullable=True, index=True)
+    user_plan_id = Column(Integer, ForeignKey("user_plans.id", ondelete="SET NULL"), nullable=True, index=True)
+    upload_bytes = Column(BigInteger, default=0)
+    download_bytes = Column(BigInteger, default=0)
+    session_duration = Column(Integer, default=0)  # seconds
+    termination_cause = Column(String(50), nullable=True)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     user = relationship("User", back_populates="sessions")
 
+    __table_args__ = (
+        # Keyset pagination: a user's sessions and all sessions, newest first
+        Index("ix_sessions_user_started", "user_id", "started_at", "id"),
+        Index("ix_sessions_started", "started_at", "id"),
+        # Active sessions only
+        Index("ix_sessions_session_id_active", "session_id", postgresql_where=text("active")),
+        Index("ix_sessions_nas_active", "nas_ip_address", postgresql_where=text("active")),
+        Index("ix_sessions_user_active", "user_id", postgresql_where=text("active")),
+        # Monthly partitions are managed by migrations and the maintain_partitions job
+        {"postgresql_partition_by": "RANGE (started_at)"},
+    )
+    # Ids are unique on their own; rows are identified without the partition key
+    __mapper_args__ = {"primary_key": [id]}
+
+    # Names used by the session manager and RADIUS accounting
+    is_active = synonym("active")
+    stopped_at = synonym("ended_at")
+    framed_ip_address = synonym("ip_address")
+    total_bytes = synonym("bytes_used")
+
     def __repr__(self):
         return f"<Session {self.id} user={self.user_id} active={self.active}>"
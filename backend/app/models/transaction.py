@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Numeric, DateTime, Enum as SQLEnum, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, Enum as SQLEnum, ForeignKey, Index, text
+from sqlalchemy.orm import relationship, synonym
 from sqlalchemy.sql import func
 import enum
 from ..database import Base
@@ -8,6 +8,7 @@ from ..database import Base
 class TransactionType(str, enum.Enum):
     CREDIT = "credit"
     DEBIT = "debit"
+    PURCHASE = "purchase"
 
 
 class TransactionStatus(str, enum.Enum):
@@ -20,12 +21,13 @@ class PaymentMethod(str, enum.Enum):
     MPESA = "mpesa"
     CARD = "card"
     WALLET = "wallet"
+    VOUCHER = "voucher"
 
 
 class Transaction(Base):
     __tablename__ = "transactions"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
     amount = Column(Numeric(10, 2), nullable=False)
     currency = Column(String(10), default="KES")
@@ -34,10 +36,36 @@ class Transaction(Base):
     payment_method = Column(SQLEnum(PaymentMethod), nullable=True)
     reference = Column(String(255), nullable=True, index=True)
 
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Payment provider details
+    provider_ref = Column(String(255), nullable=True, index=True)  # e.g. M-Pesa CheckoutRequestID
+    provider_receipt = Column(String(100), nullable=True)  # e.g. M-Pesa receipt number
+    plan_id = Column(Integer, ForeignKey("plans.id", ondelete="SET NULL"), nullable=True)
+    description = Column(String(255), nullable=True)
+    completed_at = Column(DateTime(timezone=True), nullable=True, index=True)
+
+    # Partition key, so part of the table's primary key
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     user = relationship("User", back_populates="transactions")
 
+    __table_args__ = (
+        # Keyset pagination: a user's transactions and all transactions, newest first
+        Index("ix_transactions_user_created", "user_id", "created_at", "id"),
+        Index("ix_transactions_created", "created_at", "id"),
+        # Pending payments only (enums are stored by member name)
+        Index("ix_transactions_reference_pending", "reference", postgresql_where=text("status = 'PENDING'")),
+        Index("ix_transactions_provider_ref_pending", "provider_ref", postgresql_where=text("status = 'PENDING'")),
+        Index("ix_transactions_created_pending", "created_at", postgresql_where=text("status = 'PENDING'")),
+        # Monthly partitions are managed by migrations and the maintain_partitions job
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    # Ids are unique on their own; rows are identified without the partition key
+    __mapper_args__ = {"primary_key": [id]}
+
+    # Names used by the plan and payment endpoints
+    transaction_ref = synonym("reference")
+    transaction_type = synonym("type")
+
     def __repr__(self):
         return f"<Transaction {self.id} {self.amount} {self.status}>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum as SQLEnum, Numeric
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum as SQLEnum, Numeric, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -51,7 +51,12 @@ class User(Base):
     transactions = relationship("Transaction", back_populates="user", cascade="all, delete-orphan")
     sessions = relationship("Session", back_populates="user", cascade="all, delete-orphan")
     purchased_plans = relationship("UserPlan", back_populates="user", cascade="all, delete-orphan")
-    vouchers = relationship("Voucher", back_populates="created_by_user")
+    vouchers = relationship("Voucher", back_populates="created_by_user", foreign_keys="Voucher.created_by_user_id")
+    
+    # Keyset pagination of the user list, newest first
+    __table_args__ = (
+        Index("ix_users_created", "created_at", "id"),
+    )
     
     def __repr__(self):
         return f"<User {self.username}>"
\ No newline at end of file
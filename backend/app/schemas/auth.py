@@ -1,7 +1,7 @@
 from pydantic import BaseModel, EmailStr, Field, validator
 from typing import Optional
 from datetime import datetime
-from ..models.user import UserRole
+from ..models.user import UserRole, UserStatus
 
 
 class UserRegister(BaseModel):
@@ -35,6 +35,17 @@ class TokenData(BaseModel):
     role: Optional[UserRole] = None
 
 
+class CurrentUser(BaseModel):
+    """Authenticated principal resolved from an access token"""
+    id: int
+    username: str
+    role: UserRole
+    status: UserStatus
+
+    class Config:
+        from_attributes = True
+
+
 class PasswordChange(BaseModel):
     old_password: str
     new_password: str = Field(..., min_length=8)
@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from typing import Union
+from datetime import date
+from decimal import Decimal
+
+
+class UsageReportRow(BaseModel):
+    key: Union[date, int, str, None]  # day, plan id or NAS IP, per group_by
+    upload_bytes: int
+    download_bytes: int
+    session_seconds: int
+    sessions: int
+    revenue: Decimal
+    purchases: int
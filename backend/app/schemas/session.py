@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+
+class SessionResponse(BaseModel):
+    id: int
+    user_id: int
+    username: Optional[str] = None
+    mac_address: Optional[str] = None
+    ip_address: Optional[str] = None
+    nas_ip_address: Optional[str] = None
+    user_plan_id: Optional[int] = None
+    active: Optional[bool] = None
+    upload_bytes: Optional[int] = 0
+    download_bytes: Optional[int] = 0
+    session_duration: Optional[int] = 0
+    termination_cause: Optional[str] = None
+    started_at: datetime
+    ended_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,24 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+from decimal import Decimal
+from ..models.transaction import TransactionType, TransactionStatus, PaymentMethod
+
+
+class TransactionResponse(BaseModel):
+    id: int
+    user_id: Optional[int] = None
+    amount: Decimal
+    currency: Optional[str] = None
+    type: TransactionType
+    status: Optional[TransactionStatus] = None
+    payment_method: Optional[PaymentMethod] = None
+    reference: Optional[str] = None
+    provider_receipt: Optional[str] = None
+    plan_id: Optional[int] = None
+    description: Optional[str] = None
+    completed_at: Optional[datetime] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+from decimal import Decimal
+from ..models.user import UserRole, UserStatus
+
+
+class UserResponse(BaseModel):
+    id: int
+    email: str
+    username: str
+    phone_number: Optional[str] = None
+    full_name: Optional[str] = None
+    role: UserRole
+    status: UserStatus
+    wallet_balance: Optional[Decimal] = None
+    is_email_verified: Optional[bool] = None
+    is_phone_verified: Optional[bool] = None
+    last_login: Optional[datetime] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
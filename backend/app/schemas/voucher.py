@@ -0,0 +1,26 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+from ..core.config import settings
+
+
+class VoucherBatchCreate(BaseModel):
+    plan_id: int
+    quantity: int = Field(..., gt=0, le=settings.VOUCHER_BATCH_MAX_SIZE)
+    expires_at: Optional[datetime] = None
+
+
+class VoucherBatchStatus(BaseModel):
+    batch_id: str
+    plan_id: int
+    quantity: int
+    status: str
+    generated: int
+    collisions: int
+    progress: float
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,187 @@
+import asyncio
+import csv
+import io
+import json
+import logging
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, AsyncIterator, Callable, List, Optional, Sequence, Tuple
+from sqlalchemy import Select, String, select, type_coerce
+from ..core.config import settings
+from ..database import AsyncSessionLocal
+from ..models.session import Session
+from ..models.transaction import Transaction
+
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+TRANSACTION_COLUMNS = (
+    Transaction.id,
+    Transaction.reference,
+    Transaction.user_id,
+    Transaction.plan_id,
+    Transaction.type,
+    Transaction.status,
+    Transaction.payment_method,
+    Transaction.amount,
+    Transaction.currency,
+    Transaction.provider_ref,
+    Transaction.provider_receipt,
+    Transaction.description,
+    Transaction.created_at,
+    Transaction.completed_at,
+)
+
+SESSION_COLUMNS = (
+    Session.id,
+    Session.session_id,
+    Session.user_id,
+    Session.username,
+    Session.user_plan_id,
+    Session.nas_ip_address,
+    Session.ip_address,
+    Session.mac_address,
+    Session.active,
+    Session.upload_bytes,
+    Session.download_bytes,
+    Session.session_duration,
+    Session.termination_cause,
+    Session.started_at,
+    Session.ended_at,
+)
+
+
+def _prepare(stmt: Select, fmt: str) -> Tuple[Select, str, Callable[[Sequence[Sequence]], str]]:
+    """Statement to run, header and batch encoder, with conversions resolved once per export.
+
+    Enums are selected as their stored names and mapped to values with a
+    dict lookup, which is much cheaper than building enum members per row.
+    """
+    names = [column.name for column in stmt.selected_columns]
+    columns = []
+    converters: List[Tuple[int, Callable[[Any], Any]]] = []
+    for i, column in enumerate(stmt.selected_columns):
+        enum_class = getattr(column.type, "enum_class", None)
+        if enum_class is not None:
+            columns.append(type_coerce(column, String).label(column.name))
+            converters.append((i, {member.name: member.value for member in enum_class}.get))
+            continue
+        columns.append(column)
+        python_type = column.type.python_type
+        if issubclass(python_type, (datetime, date)):
+            converters.append((i, python_type.isoformat))
+        elif issubclass(python_type, Decimal) and fmt == "ndjson":
+            # csv already writes Decimal with str()
+            converters.append((i, str))
+
+    def plain(row: Sequence) -> List:
+        row = list(row)
+        for i, convert in converters:
+            if row[i] is not None:
+                row[i] = convert(row[i])
+        return row
+
+    if fmt == "csv":
+        def encode(rows: Sequence[Sequence]) -> str:
+            buffer = io.StringIO()
+            csv.writer(buffer, lineterminator="\n").writerows(map(plain, rows))
+            return buffer.getvalue()
+
+        header = ",".join(names) + "\n"
+    else:
+        dumps = json.JSONEncoder(separators=(",", ":")).encode
+
+        def encode(rows: Sequence[Sequence]) -> str:
+            return "".join(dumps(dict(zip(names, plain(row)))) + "\n" for row in rows)
+
+        header = ""
+    return stmt.with_only_columns(*columns), header, encode
+
+
+def transactions_query(start: Optional[datetime], end: Optional[datetime]) -> Select:
+    """Transactions created in [start, end), oldest first"""
+    conditions = []
+    if start is not None:
+        conditions.append(Transaction.created_at >= start)
+    if end is not None:
+        conditions.append(Transaction.created_at < end)
+    return (
+        select(*TRANSACTION_COLUMNS)
+        .where(*conditions)
+        .order_by(Transaction.created_at, Transaction.id)
+    )
+
+
+def sessions_query(start: Optional[datetime], end: Optional[datetime]) -> Select:
+    """Sessions started in [start, end), oldest first"""
+    conditions = []
+    if start is not None:
+        conditions.append(Session.started_at >= start)
+    if end is not None:
+        conditions.append(Session.started_at < end)
+    return (
+        select(*SESSION_COLUMNS)
+        .where(*conditions)
+        .order_by(Session.started_at, Session.id)
+    )
+
+
+class Exporter:
+    """Streams query results as CSV or NDJSON with flat memory use.
+
+    Rows come from a server-side cursor ``batch_size`` at a time and each
+    batch is encoded (and optionally gzipped) into one chunk. The response
+    pulls the next chunk only after the previous one was sent, so a slow
+    client pauses the cursor instead of rows piling up in the worker.
+    Every export holds a database connection for its whole duration, so
+    at most ``max_concurrent`` run at once.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = settings.EXPORT_BATCH_SIZE,
+        max_concurrent: int = settings.EXPORT_MAX_CONCURRENT
+    ):
+        self.batch_size = batch_size
+        self._slots = asyncio.Semaphore(max_concurrent)
+
+    @property
+    def busy(self) -> bool:
+        return self._slots.locked()
+
+    async def stream(self, stmt: Select, fmt: str = "csv", compress: bool = False) -> AsyncIterator[bytes]:
+        """Encoded chunks of ``stmt``'s rows"""
+        stmt, header, encode_rows = _prepare(stmt, fmt)
+        compressor = zlib.compressobj(wbits=31) if compress else None  # gzip container
+
+        def encode(text: str) -> bytes:
+            data = text.encode()
+            return compressor.compress(data) if compressor else data
+
+        exported = 0
+        async with self._slots:
+            chunk = encode(header)
+            if chunk:
+                yield chunk
+            async with AsyncSessionLocal() as db:
+                # Core execution; the ORM adds nothing for plain column rows
+                conn = await db.connection()
+                result = await conn.stream(stmt.execution_options(yield_per=self.batch_size))
+                async for partition in result.partitions():
+                    chunk = encode(encode_rows(partition))
+                    exported += len(partition)
+                    # Compressed output may lag a batch behind; don't send empty chunks
+                    if chunk:
+                        yield chunk
+            if compressor:
+                yield compressor.flush()
+        logger.info(f"Exported {exported} rows as {fmt}{'.gz' if compress else ''}")
+
+
+# Singleton instance
+exporter = Exporter()
@@ -0,0 +1,35 @@
+import logging
+from ..core.config import settings
+from ..core.scheduler import Scheduler
+from ..database import AsyncSessionLocal
+from .live_stats import live_stats
+from .partitions import partition_manager
+from .rollups import usage_rollup
+from .session_manager import SessionManager
+from .session_reconciler import session_reconciler
+from .settlement import payment_reconciler
+
+logger = logging.getLogger(__name__)
+
+
+async def expire_plans() -> int:
+    """Deactivate plans past their expiry and disconnect their sessions"""
+    async with AsyncSessionLocal() as db:
+        return await SessionManager.check_expired_plans(db)
+
+
+async def reap_idle_sessions() -> int:
+    """Close sessions that stopped sending accounting updates"""
+    async with AsyncSessionLocal() as db:
+        return await SessionManager.reap_idle_sessions(db)
+
+
+def register_jobs(scheduler: Scheduler):
+    """Register the periodic maintenance jobs"""
+    scheduler.add("expire_plans", expire_plans, settings.SESSION_CHECK_INTERVAL)
+    scheduler.add("reap_idle_sessions", reap_idle_sessions, settings.SESSION_CHECK_INTERVAL)
+    scheduler.add("reconcile_sessions", session_reconciler.run_once, settings.SESSION_RECONCILE_INTERVAL)
+    scheduler.add("correct_live_stats", live_stats.correct, settings.LIVE_STATS_CORRECTION_INTERVAL)
+    scheduler.add("rollup_usage", usage_rollup.run_once, settings.ROLLUP_INTERVAL)
+    scheduler.add("reconcile_payments", payment_reconciler.run_once, settings.MPESA_RECONCILE_INTERVAL)
+    scheduler.add("maintain_partitions", partition_manager.run_once, settings.PARTITION_MAINTENANCE_INTERVAL)
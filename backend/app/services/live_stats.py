@@ -0,0 +1,317 @@
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, time, timezone
+from decimal import Decimal
+from time import monotonic
+from typing import Dict, Iterable, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+from sqlalchemy import and_, event, func, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session as OrmSession
+from ..core.config import settings
+from ..core.redis import get_redis
+from ..database import AsyncSessionLocal
+from ..models.session import Session
+from ..models.transaction import Transaction, TransactionStatus, TransactionType
+
+logger = logging.getLogger(__name__)
+
+SESSIONS_KEY = "stats:sessions"  # hash of NAS IP -> active sessions
+PENDING_KEY = "stats:payments:pending"
+CORRECTED_AT_KEY = "stats:corrected_at"
+DAY_TTL = 3 * 86400
+
+
+def _day_key(day) -> str:
+    # Fields: revenue, purchases, plan:<id>:revenue, plan:<id>:purchases (revenue in cents)
+    return f"stats:day:{day.isoformat()}"
+
+
+def _cents(amount) -> int:
+    return int((Decimal(amount or 0) * 100).to_integral_value())
+
+
+class _Delta:
+    """Counter changes made by one database transaction"""
+
+    def __init__(self):
+        self.sessions: Counter = Counter()
+        self.pending = 0
+        self.purchases: Counter = Counter()
+        self.revenue: Counter = Counter()
+
+    def __bool__(self):
+        return bool(self.pending or self.purchases or any(self.sessions.values()))
+
+
+class LiveStats:
+    """Dashboard counters kept in Redis and updated as state changes.
+
+    Session and payment transitions add their deltas to the database
+    session with ``record`` (ORM changes are picked up automatically), and
+    the deltas are applied only once that transaction commits. Reads are
+    a single Redis round trip. ``correct`` recomputes the counters from
+    the database on a schedule, which bounds any drift from missed or
+    racing updates. Without Redis each worker serves its own last
+    correction, with its ``corrected_at``, and recomputes it in the
+    background once it is ``max_age`` old; the scheduled correction only
+    runs on one worker.
+    """
+
+    def __init__(
+        self,
+        tz: str = settings.REPORT_TIMEZONE,
+        max_age: float = settings.LIVE_STATS_CORRECTION_INTERVAL
+    ):
+        self.tz = ZoneInfo(tz)
+        self.max_age = max_age
+        self._snapshot: Optional[Dict] = None
+        self._snapshot_at = 0.0
+        self._correcting = asyncio.Lock()
+        self._refresh: Optional[asyncio.Task] = None
+        self._pending: Set[asyncio.Task] = set()
+
+    def _today(self):
+        return datetime.now(self.tz).date()
+
+    @staticmethod
+    def _delta(db) -> _Delta:
+        info = (db.sync_session if isinstance(db, AsyncSession) else db).info
+        return info.setdefault("live_stats", _Delta())
+
+    def record(
+        self,
+        db,
+        started: Iterable[Optional[str]] = (),
+        ended: Iterable[Optional[str]] = (),
+        pending: int = 0,
+        completed: Iterable[Tuple[Optional[int], Decimal]] = ()
+    ):
+        """Queue counter changes to apply when ``db`` commits.
+
+        ``started`` and ``ended`` hold the NAS IP of each session that became
+        active or inactive; ``completed`` holds (plan_id, amount) of each
+        completed purchase.
+        """
+        delta = self._delta(db)
+        delta.sessions.update(nas_ip or "" for nas_ip in started)
+        delta.sessions.subtract(nas_ip or "" for nas_ip in ended)
+        delta.pending += pending
+        for plan_id, amount in completed:
+            delta.purchases[plan_id or 0] += 1
+            delta.revenue[plan_id or 0] += _cents(amount)
+
+    async def apply(self, delta: _Delta):
+        redis = get_redis()
+        if redis is None or not delta:
+            return
+        day_key = _day_key(self._today())
+        pipe = redis.pipeline(transaction=False)
+        for nas_ip, change in delta.sessions.items():
+            if change:
+                pipe.hincrby(SESSIONS_KEY, nas_ip, change)
+        if delta.pending:
+            pipe.incrby(PENDING_KEY, delta.pending)
+        if delta.purchases:
+            for plan_id, count in delta.purchases.items():
+                pipe.hincrby(day_key, f"plan:{plan_id}:purchases", count)
+                pipe.hincrby(day_key, f"plan:{plan_id}:revenue", delta.revenue[plan_id])
+            pipe.hincrby(day_key, "purchases", sum(delta.purchases.values()))
+            pipe.hincrby(day_key, "revenue", sum(delta.revenue.values()))
+            pipe.expire(day_key, DAY_TTL)
+        try:
+            await pipe.execute()
+        except Exception as e:
+            # The next correction restores the counters
+            logger.warning(f"Live stats update failed: {e}")
+
+    def schedule(self, delta: _Delta):
+        """Apply from synchronous code running on the event loop"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(self.apply(delta))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    @staticmethod
+    def _build(sessions: Dict[str, int], pending: int, day, totals: Dict[str, int], corrected_at) -> Dict:
+        by_plan = {}
+        for field, value in totals.items():
+            if field.startswith("plan:"):
+                _, plan_id, metric = field.split(":")
+                by_plan.setdefault(int(plan_id), {"plan_id": int(plan_id), "purchases": 0, "revenue": Decimal(0)})
+                by_plan[int(plan_id)][metric] = int(value) if metric == "purchases" else Decimal(int(value)) / 100
+        return {
+            "active_sessions": sum(sessions.values()),
+            "online_by_nas": {nas_ip: count for nas_ip, count in sorted(sessions.items()) if count},
+            "pending_payments": pending,
+            "today": {
+                "date": day.isoformat(),
+                "revenue": Decimal(int(totals.get("revenue", 0))) / 100,
+                "purchases": int(totals.get("purchases", 0)),
+                "by_plan": sorted(by_plan.values(), key=lambda p: p["plan_id"]),
+            },
+            "corrected_at": corrected_at,
+        }
+
+    async def snapshot(self) -> Dict:
+        """Current dashboard counters"""
+        redis = get_redis()
+        if redis is not None:
+            day = self._today()
+            try:
+                pipe = redis.pipeline(transaction=False)
+                pipe.hgetall(SESSIONS_KEY)
+                pipe.get(PENDING_KEY)
+                pipe.hgetall(_day_key(day))
+                pipe.get(CORRECTED_AT_KEY)
+                sessions, pending, totals, corrected_at = await pipe.execute()
+                return self._build(
+                    {k.decode(): int(v) for k, v in sessions.items()},
+                    int(pending or 0),
+                    day,
+                    {k.decode(): int(v) for k, v in totals.items()},
+                    corrected_at.decode() if corrected_at else None
+                )
+            except Exception as e:
+                logger.warning(f"Live stats read failed, serving last correction: {e}")
+
+        return await self._local_snapshot()
+
+    async def _local_snapshot(self) -> Dict:
+        """This worker's last correction, refreshed once it is ``max_age`` old"""
+        if self._snapshot is None:
+            # Concurrent first requests share one correction
+            async with self._correcting:
+                if self._snapshot is None:
+                    await self.correct()
+        elif monotonic() - self._snapshot_at >= self.max_age and self._refresh is None:
+            self._refresh = asyncio.create_task(self._refresh_snapshot())
+        return self._snapshot
+
+    async def _refresh_snapshot(self):
+        try:
+            async with self._correcting:
+                if monotonic() - self._snapshot_at >= self.max_age:
+                    await self.correct()
+        except Exception as e:
+            logger.warning(f"Live stats refresh failed: {e}")
+        finally:
+            self._refresh = None
+
+    async def correct(self) -> int:
+        """Recompute the counters from the database; returns the active-session drift"""
+        day = self._today()
+        day_start = datetime.combine(day, time(), self.tz)
+
+        async with AsyncSessionLocal() as db:
+            nas_ip = func.coalesce(Session.nas_ip_address, "")
+            result = await db.execute(
+                select(nas_ip, func.count()).where(Session.is_active == True).group_by(nas_ip)
+            )
+            sessions = dict(result.all())
+            result = await db.execute(
+                select(func.count()).select_from(Transaction).where(Transaction.status == TransactionStatus.PENDING)
+            )
+            pending = result.scalar() or 0
+            plan_id = func.coalesce(Transaction.plan_id, 0)
+            result = await db.execute(
+                select(plan_id, func.count(), func.sum(Transaction.amount))
+                .where(
+                    and_(
+                        Transaction.status == TransactionStatus.COMPLETED,
+                        Transaction.type == TransactionType.PURCHASE,
+                        Transaction.completed_at >= day_start
+                    )
+                )
+                .group_by(plan_id)
+            )
+            totals: Dict[str, int] = {"purchases": 0, "revenue": 0}
+            for plan_id, count, amount in result.all():
+                totals[f"plan:{plan_id}:purchases"] = count
+                totals[f"plan:{plan_id}:revenue"] = _cents(amount)
+                totals["purchases"] += count
+                totals["revenue"] += _cents(amount)
+
+        corrected_at = datetime.now(timezone.utc).isoformat()
+        drift = 0
+        redis = get_redis()
+        if redis is not None:
+            try:
+                previous = await redis.hgetall(SESSIONS_KEY)
+                drift = sum(int(v) for v in previous.values()) - sum(sessions.values())
+                # Updates landing between the queries above and this write are
+                # overwritten; the next correction picks them up
+                pipe = redis.pipeline(transaction=True)
+                pipe.delete(SESSIONS_KEY, _day_key(day))
+                if sessions:
+                    pipe.hset(SESSIONS_KEY, mapping=sessions)
+                pipe.hset(_day_key(day), mapping=totals)
+                pipe.expire(_day_key(day), DAY_TTL)
+                pipe.set(PENDING_KEY, pending)
+                pipe.set(CORRECTED_AT_KEY, corrected_at)
+                await pipe.execute()
+            except Exception as e:
+                logger.warning(f"Live stats correction could not be stored: {e}")
+        if drift:
+            logger.info(f"Corrected active session counter by {-drift}")
+
+        self._snapshot = self._build(sessions, pending, day, totals, corrected_at)
+        self._snapshot_at = monotonic()
+        return drift
+
+    async def stop(self):
+        if self._refresh:
+            await asyncio.gather(self._refresh, return_exceptions=True)
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+
+# Singleton instance
+live_stats = LiveStats()
+
+
+def _was(state, name: str):
+    history = state.attrs[name].history
+    return history.deleted[0] if history.deleted else None
+
+
+@event.listens_for(OrmSession, "after_flush")
+def _collect_orm_changes(session, flush_context):
+    """Record session and payment transitions made through the ORM"""
+    for obj in session.new:
+        if isinstance(obj, Session) and obj.active:
+            live_stats.record(session, started=[obj.nas_ip_address])
+        elif isinstance(obj, Transaction):
+            if obj.status == TransactionStatus.PENDING:
+                live_stats.record(session, pending=1)
+            elif obj.status == TransactionStatus.COMPLETED and obj.type == TransactionType.PURCHASE:
+                live_stats.record(session, completed=[(obj.plan_id, obj.amount)])
+    for obj in session.dirty:
+        if isinstance(obj, Session):
+            state = inspect(obj)
+            if state.attrs.active.history.has_changes() and _was(state, "active") and not obj.active:
+                live_stats.record(session, ended=[obj.nas_ip_address])
+        elif isinstance(obj, Transaction):
+            state = inspect(obj)
+            if not state.attrs.status.history.has_changes():
+                continue
+            if _was(state, "status") == TransactionStatus.PENDING:
+                live_stats.record(session, pending=-1)
+            if obj.status == TransactionStatus.COMPLETED and obj.type == TransactionType.PURCHASE:
+                live_stats.record(session, completed=[(obj.plan_id, obj.amount)])
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _apply_recorded(session):
+    delta = session.info.pop("live_stats", None)
+    if delta:
+        live_stats.schedule(delta)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _discard_recorded(session):
+    session.info.pop("live_stats", None)
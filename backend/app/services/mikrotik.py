@@ -1,46 +1,173 @@
 import routeros_api
+from routeros_api.exceptions import RouterOsApiConnectionError, FatalRouterOsApiError
+import asyncio
+import functools
 import logging
-from typing import Dict, List, Optional
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from ..core.config import settings
+from ..core.metrics import MIKROTIK_CALL_DURATION, MIKROTIK_CALL_ERRORS
 
 logger = logging.getLogger(__name__)
 
+# Errors after which a connection can no longer be trusted
+CONNECTION_ERRORS = (RouterOsApiConnectionError, FatalRouterOsApiError, OSError)
+
+# Only what session reconciliation compares; keeps large active lists cheap
+ACTIVE_SESSION_FIELDS = '.id,user,mac-address,address,bytes-in,bytes-out,uptime'
+
+
+class RouterOSConnectionPool:
+    """Thread-safe pool of long-lived, logged-in RouterOS API connections.
+
+    Connections are opened lazily up to ``size``, health-checked when they
+    have been idle longer than ``health_check_interval`` and transparently
+    re-established after a connection error.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        username: str,
+        password: str,
+        port: int,
+        use_ssl: bool,
+        size: int = settings.MIKROTIK_POOL_SIZE,
+        timeout: float = settings.MIKROTIK_POOL_TIMEOUT,
+        health_check_interval: float = settings.MIKROTIK_HEALTH_CHECK_INTERVAL,
+        socket_timeout: float = settings.MIKROTIK_SOCKET_TIMEOUT
+    ):
+        self.host = host
+        self.username = username
+        self.password = password
+        self.port = port
+        self.use_ssl = use_ssl
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.socket_timeout = socket_timeout
+        self._idle = deque()  # (RouterOsApiPool, last used at)
+        self._created = 0
+        self._cond = threading.Condition()
+
+    def _open(self):
+        conn = routeros_api.RouterOsApiPool(
+            host=self.host,
+            username=self.username,
+            password=self.password,
+            port=self.port,
+            use_ssl=self.use_ssl,
+            ssl_verify=False,
+            plaintext_login=True
+        )
+        conn.socket_timeout = self.socket_timeout
+        conn.get_api()
+        logger.info(f"Opened MikroTik connection to {self.host}")
+        return conn
+
+    def _is_healthy(self, conn) -> bool:
+        try:
+            conn.get_api().get_resource('/system/identity').get()
+            return True
+        except Exception as e:
+            logger.warning(f"Stale MikroTik connection to {self.host}: {e}")
+            return False
+
+    def _acquire(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._created < self.size:
+                    self._created += 1
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No MikroTik connection to {self.host} available")
+                self._cond.wait(remaining)
+
+        if conn is None:
+            try:
+                return self._open()
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                raise
+
+        if time.monotonic() - last_used > self.health_check_interval and not self._is_healthy(conn):
+            # get_api() logs in again on a disconnected RouterOsApiPool
+            conn.disconnect()
+        return conn
+
+    def _release(self, conn, broken: bool = False):
+        if broken:
+            conn.disconnect()
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a logged-in API object for the duration of the block"""
+        conn = self._acquire()
+        broken = False
+        try:
+            yield conn.get_api()
+        except CONNECTION_ERRORS:
+            broken = True
+            raise
+        finally:
+            self._release(conn, broken)
+
+    def close(self):
+        """Close all idle connections"""
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                conn.disconnect()
+                self._created -= 1
+
 
 class MikroTikService:
     """Service for MikroTik RouterOS integration"""
     
-    def __init__(self):
-        self.host = settings.MIKROTIK_HOST
-        self.username = settings.MIKROTIK_USERNAME
-        self.password = settings.MIKROTIK_PASSWORD
-        self.port = settings.MIKROTIK_PORT
-        self.use_ssl = settings.MIKROTIK_USE_SSL
-        self.connection = None
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        port: Optional[int] = None,
+        use_ssl: Optional[bool] = None
+    ):
+        self.host = host or settings.MIKROTIK_HOST
+        self.username = username or settings.MIKROTIK_USERNAME
+        self.password = password or settings.MIKROTIK_PASSWORD
+        self.port = port or settings.MIKROTIK_PORT
+        self.use_ssl = settings.MIKROTIK_USE_SSL if use_ssl is None else use_ssl
+        self.pool = RouterOSConnectionPool(
+            host=self.host,
+            username=self.username,
+            password=self.password,
+            port=self.port,
+            use_ssl=self.use_ssl
+        )
     
-    def connect(self):
-        """Establish connection to MikroTik"""
-        try:
-            self.connection = routeros_api.RouterOsApiPool(
-                host=self.host,
-                username=self.username,
-                password=self.password,
-                port=self.port,
-                use_ssl=self.use_ssl,
-                ssl_verify=False,
-                plaintext_login=True
-            )
-            api = self.connection.get_api()
-            logger.info("Successfully connected to MikroTik")
-            return api
-        except Exception as e:
-            logger.error(f"Failed to connect to MikroTik: {e}")
-            raise
+    def connection(self):
+        """Borrow a pooled connection to MikroTik"""
+        return self.pool.connection()
     
     def disconnect(self):
-        """Close MikroTik connection"""
-        if self.connection:
-            self.connection.disconnect()
-            logger.info("Disconnected from MikroTik")
+        """Close pooled MikroTik connections"""
+        self.pool.close()
+        logger.info("Disconnected from MikroTik")
     
     def add_hotspot_user(
         self,
@@ -52,34 +179,32 @@ class MikroTikService:
         limit_bytes_total: Optional[int] = None
     ) -> bool:
         """Add user to MikroTik Hotspot"""
-        api = self.connect()
         try:
-            hotspot_user = api.get_resource('/ip/hotspot/user')
+            with self.connection() as api:
+                hotspot_user = api.get_resource('/ip/hotspot/user')
             
-            user_data = {
-                'name': username,
-                'password': password,
-                'profile': profile,
-            }
+                user_data = {
+                    'name': username,
+                    'password': password,
+                    'profile': profile,
+                }
             
-            if mac_address:
-                user_data['mac-address'] = mac_address
+                if mac_address:
+                    user_data['mac-address'] = mac_address
             
-            if limit_uptime:
-                user_data['limit-uptime'] = limit_uptime
+                if limit_uptime:
+                    user_data['limit-uptime'] = limit_uptime
             
-            if limit_bytes_total:
-                user_data['limit-bytes-total'] = str(limit_bytes_total)
+                if limit_bytes_total:
+                    user_data['limit-bytes-total'] = str(limit_bytes_total)
             
-            hotspot_user.add(**user_data)
-            logger.info(f"Added hotspot user: {username}")
-            return True
+                hotspot_user.add(**user_data)
+                logger.info(f"Added hotspot user: {username}")
+                return True
             
         except Exception as e:
             logger.error(f"Failed to add hotspot user: {e}")
             return False
-        finally:
-            self.disconnect()
     
     def update_hotspot_user(
         self,
@@ -90,89 +215,91 @@ class MikroTikService:
         disabled: Optional[bool] = None
     ) -> bool:
         """Update existing hotspot user"""
-        api = self.connect()
         try:
-            hotspot_user = api.get_resource('/ip/hotspot/user')
-            users = hotspot_user.get(name=username)
-            
-            if not users:
-                logger.warning(f"User {username} not found")
-                return False
-            
-            user_id = users[0]['id']
-            update_data = {}
-            
-            if profile:
-                update_data['profile'] = profile
-            if limit_uptime:
-                update_data['limit-uptime'] = limit_uptime
-            if limit_bytes_total:
-                update_data['limit-bytes-total'] = str(limit_bytes_total)
-            if disabled is not None:
-                update_data['disabled'] = 'yes' if disabled else 'no'
-            
-            hotspot_user.set(id=user_id, **update_data)
-            logger.info(f"Updated hotspot user: {username}")
-            return True
+            with self.connection() as api:
+                hotspot_user = api.get_resource('/ip/hotspot/user')
+                users = hotspot_user.get(name=username)
+            
+                if not users:
+                    logger.warning(f"User {username} not found")
+                    return False
+            
+                user_id = users[0]['id']
+                update_data = {}
+            
+                if profile:
+                    update_data['profile'] = profile
+                if limit_uptime:
+                    update_data['limit-uptime'] = limit_uptime
+                if limit_bytes_total:
+                    update_data['limit-bytes-total'] = str(limit_bytes_total)
+                if disabled is not None:
+                    update_data['disabled'] = 'yes' if disabled else 'no'
+            
+                hotspot_user.set(id=user_id, **update_data)
+                logger.info(f"Updated hotspot user: {username}")
+                return True
             
         except Exception as e:
             logger.error(f"Failed to update hotspot user: {e}")
             return False
-        finally:
-            self.disconnect()
     
     def remove_hotspot_user(self, username: str) -> bool:
         """Remove user from MikroTik Hotspot"""
-        api = self.connect()
         try:
-            hotspot_user = api.get_resource('/ip/hotspot/user')
-            users = hotspot_user.get(name=username)
+            with self.connection() as api:
+                hotspot_user = api.get_resource('/ip/hotspot/user')
+                users = hotspot_user.get(name=username)
             
-            if not users:
-                logger.warning(f"User {username} not found")
-                return False
+                if not users:
+                    logger.warning(f"User {username} not found")
+                    return False
             
-            hotspot_user.remove(id=users[0]['id'])
-            logger.info(f"Removed hotspot user: {username}")
-            return True
+                hotspot_user.remove(id=users[0]['id'])
+                logger.info(f"Removed hotspot user: {username}")
+                return True
             
         except Exception as e:
             logger.error(f"Failed to remove hotspot user: {e}")
             return False
-        finally:
-            self.disconnect()
     
     def disconnect_user(self, username: str) -> bool:
         """Disconnect active user session"""
-        api = self.connect()
         try:
-            active_users = api.get_resource('/ip/hotspot/active')
-            sessions = active_users.get(user=username)
+            with self.connection() as api:
+                active_users = api.get_resource('/ip/hotspot/active')
+                sessions = active_users.get(user=username)
             
-            for session in sessions:
-                active_users.remove(id=session['id'])
+                for session in sessions:
+                    active_users.remove(id=session['id'])
             
-            logger.info(f"Disconnected user: {username}")
-            return True
+                logger.info(f"Disconnected user: {username}")
+                return True
             
         except Exception as e:
             logger.error(f"Failed to disconnect user: {e}")
             return False
-        finally:
-            self.disconnect()
     
     def get_active_users(self) -> List[Dict]:
         """Get all active hotspot users"""
-        api = self.connect()
         try:
-            active_users = api.get_resource('/ip/hotspot/active')
-            users = active_users.get()
-            return users
+            with self.connection() as api:
+                active_users = api.get_resource('/ip/hotspot/active')
+                users = active_users.get()
+                return users
         except Exception as e:
             logger.error(f"Failed to get active users: {e}")
             return []
-        finally:
-            self.disconnect()
+    
+    def get_active_sessions(self) -> List[Dict]:
+        """Get the fields of /ip/hotspot/active needed for reconciliation.
+
+        Unlike ``get_active_users`` this raises on failure, so an unreachable
+        router is never mistaken for one with nobody online.
+        """
+        with self.connection() as api:
+            active_users = api.get_resource('/ip/hotspot/active')
+            return active_users.call('print', {'.proplist': ACTIVE_SESSION_FIELDS})
     
     def create_user_profile(
         self,
@@ -182,31 +309,411 @@ class MikroTikService:
         shared_users: int = 1
     ) -> bool:
         """Create a new user profile"""
-        api = self.connect()
         try:
-            profiles = api.get_resource('/ip/hotspot/user/profile')
+            with self.connection() as api:
+                profiles = api.get_resource('/ip/hotspot/user/profile')
             
-            profile_data = {
-                'name': name,
-                'shared-users': str(shared_users)
-            }
+                profile_data = {
+                    'name': name,
+                    'shared-users': str(shared_users)
+                }
             
-            if rate_limit:
-                profile_data['rate-limit'] = rate_limit
+                if rate_limit:
+                    profile_data['rate-limit'] = rate_limit
             
-            if session_timeout:
-                profile_data['session-timeout'] = session_timeout
+                if session_timeout:
+                    profile_data['session-timeout'] = session_timeout
             
-            profiles.add(**profile_data)
-            logger.info(f"Created profile: {name}")
-            return True
+                profiles.add(**profile_data)
+                logger.info(f"Created profile: {name}")
+                return True
             
         except Exception as e:
             logger.error(f"Failed to create profile: {e}")
             return False
+
+
+    @staticmethod
+    def _hotspot_user_fields(
+        password: Optional[str] = None,
+        profile: Optional[str] = None,
+        mac_address: Optional[str] = None,
+        limit_uptime: Optional[str] = None,
+        limit_bytes_total: Optional[int] = None,
+        disabled: Optional[bool] = None
+    ) -> Dict[str, str]:
+        """Map hotspot user attributes to RouterOS field values"""
+        fields = {}
+        if password:
+            fields['password'] = password
+        if profile:
+            fields['profile'] = profile
+        if mac_address:
+            fields['mac-address'] = mac_address
+        if limit_uptime:
+            fields['limit-uptime'] = limit_uptime
+        if limit_bytes_total:
+            fields['limit-bytes-total'] = str(limit_bytes_total)
+        if disabled is not None:
+            fields['disabled'] = 'yes' if disabled else 'no'
+        return fields
+
+    @staticmethod
+    def _normalize_field(field: str, value: Any) -> Optional[str]:
+        """Bring a field value to the form _hotspot_user_fields writes.
+
+        RouterOS prints booleans as true/false and MAC addresses uppercase.
+        """
+        if value is None:
+            return None
+        value = str(value)
+        if field == 'disabled':
+            return {'true': 'yes', 'false': 'no'}.get(value.lower(), value.lower())
+        if field == 'mac-address':
+            return value.upper().replace('-', ':')
+        return value
+
+    @classmethod
+    def _changed_fields(cls, row: Dict, fields: Dict[str, str]) -> Dict[str, str]:
+        """Fields whose desired value differs from the router's ``row``"""
+        return {
+            k: v for k, v in fields.items()
+            if cls._normalize_field(k, row.get(k)) != cls._normalize_field(k, v)
+        }
+
+    @staticmethod
+    def _collect(pending: List[tuple]):
+        """Wait for pipelined replies and record each item's outcome"""
+        for promise, result in pending:
+            try:
+                promise.get()
+                result['success'] = True
+            except Exception as e:
+                result.update(action='failed', error=str(e))
+
+    @staticmethod
+    def _fail_unfinished(results: List[Dict], error: Exception):
+        for result in results:
+            if not result['success'] and result['error'] is None:
+                result.update(success=False, action='failed', error=str(error))
+
+    def _bulk_apply(self, users: List[Dict], create: bool) -> List[Dict]:
+        results = [{'username': u['username'], 'success': False, 'error': None} for u in users]
+        try:
+            with self.connection() as api:
+                hotspot_user = api.get_resource('/ip/hotspot/user')
+                existing = {row.get('name'): row for row in hotspot_user.get()}
+
+                # Send every command before reading any reply so the batch
+                # costs one round trip instead of one per user
+                pending = []
+                for user, result in zip(users, results):
+                    attrs = dict(user)
+                    username = attrs.pop('username')
+                    fields = self._hotspot_user_fields(**attrs)
+                    row = existing.get(username)
+
+                    if row is None:
+                        if not create:
+                            result.update(action='not_found', error='User not found')
+                            continue
+                        fields.setdefault('profile', 'default')
+                        result['action'] = 'added'
+                        pending.append((hotspot_user.call_async('add', {'name': username, **fields}), result))
+                        continue
+
+                    changes = self._changed_fields(row, fields)
+                    if not changes:
+                        result.update(action='unchanged', success=True)
+                        continue
+
+                    result['action'] = 'updated'
+                    pending.append((hotspot_user.call_async('set', {'id': row['id'], **changes}), result))
+
+                self._collect(pending)
+
+        except Exception as e:
+            logger.error(f"Bulk hotspot user provisioning failed: {e}")
+            self._fail_unfinished(results, e)
+
+        changed = sum(1 for r in results if r['success'] and r['action'] != 'unchanged')
+        logger.info(f"Bulk provisioned {len(users)} hotspot users ({changed} changed)")
+        return results
+
+    def bulk_upsert_hotspot_users(self, users: List[Dict]) -> List[Dict]:
+        """Add or update many hotspot users in one pass.
+
+        Each item takes the arguments of add_hotspot_user. Returns one
+        result per item with its username, action, success and error.
+        """
+        return self._bulk_apply(users, create=True)
+
+    def bulk_update_hotspot_users(self, changes: List[Dict]) -> List[Dict]:
+        """Update many existing hotspot users in one pass.
+
+        Each item takes the arguments of update_hotspot_user.
+        """
+        return self._bulk_apply(changes, create=False)
+
+    def bulk_remove_hotspot_users(self, usernames: List[str]) -> List[Dict]:
+        """Remove many hotspot users in one pass"""
+        results = [{'username': u, 'success': False, 'error': None} for u in usernames]
+        try:
+            with self.connection() as api:
+                hotspot_user = api.get_resource('/ip/hotspot/user')
+                existing = {row.get('name'): row['id'] for row in hotspot_user.get()}
+
+                pending = []
+                for username, result in zip(usernames, results):
+                    if username not in existing:
+                        result.update(action='not_found', error='User not found')
+                        continue
+                    result['action'] = 'removed'
+                    pending.append((hotspot_user.call_async('remove', {'id': existing[username]}), result))
+
+                self._collect(pending)
+
+        except Exception as e:
+            logger.error(f"Bulk hotspot user removal failed: {e}")
+            self._fail_unfinished(results, e)
+
+        return results
+
+    def bulk_disconnect_users(self, usernames: List[str]) -> List[Dict]:
+        """Disconnect the active sessions of many users in one pass"""
+        results = [{'username': u, 'success': False, 'error': None} for u in usernames]
+        try:
+            with self.connection() as api:
+                active_users = api.get_resource('/ip/hotspot/active')
+                sessions: Dict[str, List[str]] = {}
+                for row in active_users.get():
+                    sessions.setdefault(row.get('user'), []).append(row['id'])
+
+                pending = []
+                for username, result in zip(usernames, results):
+                    ids = sessions.get(username)
+                    if not ids:
+                        result.update(action='not_active', success=True)
+                        continue
+                    result['action'] = 'disconnected'
+                    for session_id in ids:
+                        pending.append((active_users.call_async('remove', {'id': session_id}), result))
+
+                self._collect(pending)
+
+        except Exception as e:
+            logger.error(f"Bulk disconnect failed: {e}")
+            self._fail_unfinished(results, e)
+
+        return results
+
+# Blocking RouterOS I/O never runs on the event loop
+_executor = ThreadPoolExecutor(
+    max_workers=settings.MIKROTIK_EXECUTOR_WORKERS,
+    thread_name_prefix="mikrotik"
+)
+
+
+class AsyncMikroTikService:
+    """Async facade over MikroTikService.
+
+    Each call runs on a bounded thread pool with a per-call timeout. A call
+    that times out while still queued is dropped; one that is already
+    running completes in the background and its result is discarded.
+    """
+
+    def __init__(self, service: MikroTikService, timeout: float = settings.MIKROTIK_CALL_TIMEOUT):
+        self.service = service
+        self.timeout = timeout
+
+    async def _run(self, func, *args, default=False, **kwargs):
+        loop = asyncio.get_running_loop()
+        labels = (self.service.host, func.__name__)
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(
+                loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs)),
+                self.timeout
+            )
+        except asyncio.TimeoutError:
+            MIKROTIK_CALL_ERRORS.labels(*labels, "timeout").inc()
+            logger.error(f"MikroTik call {func.__name__} timed out after {self.timeout}s")
+            return default
+        except Exception:
+            MIKROTIK_CALL_ERRORS.labels(*labels, "exception").inc()
+            raise
         finally:
-            self.disconnect()
+            MIKROTIK_CALL_DURATION.labels(*labels).observe(time.perf_counter() - started)
+        # The single-user calls log and return False on RouterOS errors
+        if result is False:
+            MIKROTIK_CALL_ERRORS.labels(*labels, "failed").inc()
+        return result
+
+    async def add_hotspot_user(self, *args, **kwargs) -> bool:
+        return await self._run(self.service.add_hotspot_user, *args, **kwargs)
+
+    async def update_hotspot_user(self, *args, **kwargs) -> bool:
+        return await self._run(self.service.update_hotspot_user, *args, **kwargs)
+
+    async def remove_hotspot_user(self, username: str) -> bool:
+        return await self._run(self.service.remove_hotspot_user, username)
+
+    async def disconnect_user(self, username: str) -> bool:
+        return await self._run(self.service.disconnect_user, username)
+
+    async def get_active_users(self) -> List[Dict]:
+        return await self._run(self.service.get_active_users, default=[])
+
+    async def get_active_sessions(self) -> Optional[List[Dict]]:
+        return await self._run(self.service.get_active_sessions, default=None)
+
+    async def create_user_profile(self, *args, **kwargs) -> bool:
+        return await self._run(self.service.create_user_profile, *args, **kwargs)
+
+    async def bulk_upsert_hotspot_users(self, users: List[Dict]) -> List[Dict]:
+        return await self._run(self.service.bulk_upsert_hotspot_users, users, default=[])
+
+    async def bulk_update_hotspot_users(self, changes: List[Dict]) -> List[Dict]:
+        return await self._run(self.service.bulk_update_hotspot_users, changes, default=[])
+
+    async def bulk_remove_hotspot_users(self, usernames: List[str]) -> List[Dict]:
+        return await self._run(self.service.bulk_remove_hotspot_users, usernames, default=[])
+
+    async def bulk_disconnect_users(self, usernames: List[str]) -> List[Dict]:
+        return await self._run(self.service.bulk_disconnect_users, usernames, default=[])
+
+
+class MikroTikFleet:
+    """Registry of hotspot routers keyed by NAS IP address.
+
+    Session-scoped calls go to the router the session is on via
+    ``for_nas()``. Fleet-wide calls fan out to every router concurrently,
+    so they take as long as the slowest router rather than the sum.
+    """
+
+    def __init__(self, default: AsyncMikroTikService):
+        self.default = default
+        self.routers: Dict[str, AsyncMikroTikService] = {}
+
+    def register(self, nas_ip: str, service: MikroTikService) -> AsyncMikroTikService:
+        """Register a router under the NAS IP it reports in RADIUS"""
+        router = AsyncMikroTikService(service)
+        self.routers[nas_ip] = router
+        return router
+
+    def for_nas(self, nas_ip: Optional[str]) -> AsyncMikroTikService:
+        """Get the router serving a NAS IP, falling back to the default router"""
+        router = self.routers.get(nas_ip) if nas_ip else None
+        if router is None:
+            if nas_ip and self.routers:
+                logger.warning(f"Unknown NAS {nas_ip}, using default router")
+            return self.default
+        return router
+
+    def all(self) -> Dict[str, AsyncMikroTikService]:
+        return self.routers or {self.default.service.host: self.default}
+
+    async def _fan_out(self, method: str, *args, **kwargs) -> Dict[str, Any]:
+        routers = self.all()
+        results = await asyncio.gather(
+            *(getattr(router, method)(*args, **kwargs) for router in routers.values()),
+            return_exceptions=True
+        )
+        merged = {}
+        for nas_ip, result in zip(routers, results):
+            if isinstance(result, Exception):
+                logger.error(f"MikroTik {method} failed on {nas_ip}: {result}")
+                result = None
+            merged[nas_ip] = result
+        return merged
+
+    async def get_active_users(self) -> List[Dict]:
+        """Get active hotspot users across the fleet, tagged with their NAS IP"""
+        results = await self._fan_out("get_active_users")
+        users = []
+        for nas_ip, active in results.items():
+            for user in active or []:
+                users.append({**user, "nas_ip": nas_ip})
+        return users
+
+    async def get_active_sessions(self) -> Dict[str, Optional[List[Dict]]]:
+        """Active hotspot sessions per router; None for routers that could not be read"""
+        return await self._fan_out("get_active_sessions")
+
+    async def disconnect_user(self, username: str) -> bool:
+        """Disconnect a user from whichever routers they are logged in to"""
+        results = await self._fan_out("disconnect_user", username)
+        return any(results.values())
+
+    async def add_hotspot_user(self, *args, **kwargs) -> bool:
+        results = await self._fan_out("add_hotspot_user", *args, **kwargs)
+        return all(results.values())
+
+    async def update_hotspot_user(self, *args, **kwargs) -> bool:
+        results = await self._fan_out("update_hotspot_user", *args, **kwargs)
+        return all(results.values())
+
+    async def remove_hotspot_user(self, username: str) -> bool:
+        results = await self._fan_out("remove_hotspot_user", username)
+        return all(results.values())
+
+    async def create_user_profile(self, *args, **kwargs) -> bool:
+        results = await self._fan_out("create_user_profile", *args, **kwargs)
+        return all(results.values())
+
+    async def bulk_upsert_hotspot_users(self, users: List[Dict]) -> Dict[str, List[Dict]]:
+        """Bulk add/update hotspot users on every router, results keyed by NAS IP"""
+        return await self._fan_out("bulk_upsert_hotspot_users", users)
+
+    async def bulk_update_hotspot_users(self, changes: List[Dict]) -> Dict[str, List[Dict]]:
+        return await self._fan_out("bulk_update_hotspot_users", changes)
+
+    async def bulk_remove_hotspot_users(self, usernames: List[str]) -> Dict[str, List[Dict]]:
+        return await self._fan_out("bulk_remove_hotspot_users", usernames)
+
+    async def disconnect_sessions(self, sessions: Iterable[Tuple[str, Optional[str]]]) -> int:
+        """Disconnect (username, nas_ip) pairs with one batched call per router"""
+        by_router: Dict[AsyncMikroTikService, List[str]] = {}
+        for username, nas_ip in sessions:
+            by_router.setdefault(self.for_nas(nas_ip), []).append(username)
+        if not by_router:
+            return 0
+
+        results = await asyncio.gather(
+            *(router.bulk_disconnect_users(usernames) for router, usernames in by_router.items()),
+            return_exceptions=True
+        )
+        disconnected = 0
+        for router, result in zip(by_router, results):
+            if isinstance(result, Exception):
+                logger.error(f"Bulk disconnect failed on {router.service.host}: {result}")
+                continue
+            disconnected += sum(1 for r in result if r['success'] and r['action'] == 'disconnected')
+        return disconnected
+
+    def close(self):
+        """Close pooled connections to every router"""
+        for router in {self.default, *self.routers.values()}:
+            router.service.disconnect()
+
+
+def _build_fleet() -> MikroTikFleet:
+    fleet = MikroTikFleet(async_mikrotik_service)
+    for router in settings.MIKROTIK_ROUTERS:
+        fleet.register(
+            router["nas_ip"],
+            MikroTikService(
+                host=router.get("host", router["nas_ip"]),
+                username=router.get("username"),
+                password=router.get("password"),
+                port=router.get("port"),
+                use_ssl=router.get("use_ssl")
+            )
+        )
+    return fleet
 
 
-# Singleton instance
-mikrotik_service = MikroTikService()
\ No newline at end of file
+# Singleton instances
+mikrotik_service = MikroTikService()
+async_mikrotik_service = AsyncMikroTikService(mikrotik_service)
+mikrotik_fleet = _build_fleet()
\ No newline at end of file
@@ -0,0 +1,133 @@
+import logging
+import re
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.config import settings
+from ..database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Upper bound of a range partition, as printed by pg_get_expr
+_UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+
+
+def _month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _bound(month: date) -> str:
+    return f"'{month.isoformat()} 00:00:00+00'"
+
+
+class PartitionManager:
+    """Creates and retires the monthly partitions of sessions and transactions.
+
+    Partitions for the next ``months_ahead`` months always exist, so
+    inserts never hit a missing range. With a retention set, partitions
+    entirely older than that many months are detached and dropped, which
+    removes their rows without a DELETE, dead tuples or a vacuum.
+
+    New partitions are created empty and then attached, which only takes
+    a SHARE UPDATE EXCLUSIVE lock on the parent. Each step runs in its own
+    transaction with ``lock_timeout`` so it can't queue other queries
+    behind a long-running one; a step that times out is retried on the
+    next run.
+    """
+
+    def __init__(
+        self,
+        months_ahead: int = settings.PARTITION_MONTHS_AHEAD,
+        retention: Optional[Dict[str, int]] = None,
+        lock_timeout: int = settings.PARTITION_LOCK_TIMEOUT
+    ):
+        self.months_ahead = months_ahead
+        # table -> months kept, 0 keeps everything
+        self.retention = retention if retention is not None else {
+            "sessions": settings.SESSION_RETENTION_MONTHS,
+            "transactions": settings.TRANSACTION_RETENTION_MONTHS,
+        }
+        self.lock_timeout = lock_timeout
+
+    @staticmethod
+    async def partitions(db: AsyncSession, table: str) -> List[Tuple[str, Optional[datetime]]]:
+        """(name, upper bound) of every partition of ``table``"""
+        await db.execute(text("SET LOCAL TIME ZONE 'UTC'"))
+        result = await db.execute(
+            text(
+                "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+                "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = CAST(:table AS regclass) ORDER BY c.relname"
+            ),
+            {"table": table}
+        )
+        partitions = []
+        for name, bound in result.all():
+            match = _UPPER_BOUND.search(bound or "")
+            partitions.append((name, datetime.fromisoformat(match.group(1)) if match else None))
+        return partitions
+
+    async def _locked(self, db: AsyncSession):
+        await db.execute(text(f"SET LOCAL lock_timeout = {int(self.lock_timeout)}"))
+
+    async def _create(self, table: str, month: date) -> bool:
+        name = f"{table}_p{month:%Y_%m}"
+        try:
+            async with AsyncSessionLocal() as db:
+                await self._locked(db)
+                await db.execute(text(f"CREATE TABLE IF NOT EXISTS {name} (LIKE {table} INCLUDING DEFAULTS)"))
+                await db.execute(text(
+                    f"ALTER TABLE {table} ATTACH PARTITION {name} "
+                    f"FOR VALUES FROM ({_bound(month)}) TO ({_bound(_add_months(month, 1))})"
+                ))
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"Could not create partition {name}, will retry: {e}")
+            return False
+        logger.info(f"Created partition {name}")
+        return True
+
+    async def _drop(self, table: str, name: str) -> bool:
+        try:
+            async with AsyncSessionLocal() as db:
+                await self._locked(db)
+                await db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                await db.execute(text(f"DROP TABLE {name}"))
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"Could not drop partition {name}, will retry: {e}")
+            return False
+        logger.info(f"Dropped expired partition {name}")
+        return True
+
+    async def run_once(self) -> int:
+        """Create upcoming partitions and drop expired ones; returns the number of changes"""
+        this_month = _month_start(datetime.now(timezone.utc))
+        changes = 0
+        for table, retention in self.retention.items():
+            async with AsyncSessionLocal() as db:
+                partitions = await self.partitions(db, table)
+            bounds = [bound for _, bound in partitions if bound is not None]
+            covered_until = _month_start(max(bounds)) if bounds else this_month
+
+            month = max(covered_until, this_month)
+            while month <= _add_months(this_month, self.months_ahead):
+                changes += await self._create(table, month)
+                month = _add_months(month, 1)
+
+            if retention > 0:
+                cutoff = datetime.combine(_add_months(this_month, -retention), datetime.min.time(), timezone.utc)
+                for name, bound in partitions:
+                    if bound is not None and bound <= cutoff:
+                        changes += await self._drop(table, name)
+        return changes
+
+
+# Singleton instance
+partition_manager = PartitionManager()
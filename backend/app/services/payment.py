@@ -1,9 +1,12 @@
-import requests
+import httpx
+import asyncio
 import base64
 import logging
+import time
 from datetime import datetime
 from typing import Dict, Optional
 from ..core.config import settings
+from ..core.metrics import MPESA_REQUEST_DURATION, MPESA_REQUEST_ERRORS
 
 logger = logging.getLogger(__name__)
 
@@ -28,27 +31,125 @@ class MPesaService:
             self.auth_url = "https://sandbox.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials"
             self.stk_push_url = "https://sandbox.safaricom.co.ke/mpesa/stkpush/v1/processrequest"
             self.query_url = "https://sandbox.safaricom.co.ke/mpesa/stkpushquery/v1/query"
+        
+        # Shared keep-alive HTTP client, created on first use
+        self._client: Optional[httpx.AsyncClient] = None
+        
+        # OAuth token cache
+        self._access_token: Optional[str] = None
+        self._token_expires_at = 0.0
+        # No token requests until then, after a failed one
+        self._token_retry_at = 0.0
+        self._token_lock = asyncio.Lock()
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Pooled HTTP client for Safaricom APIs"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(settings.MPESA_TIMEOUT, connect=5),
+                limits=httpx.Limits(
+                    max_connections=settings.MPESA_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.MPESA_MAX_CONNECTIONS,
+                    keepalive_expiry=60
+                )
+            )
+        return self._client
+    
+    async def close(self):
+        """Close pooled HTTP connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
     
-    def get_access_token(self) -> Optional[str]:
-        """Get OAuth access token"""
+    async def _request(self, endpoint: str, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request to Safaricom, recording its latency and failures"""
+        started = time.perf_counter()
         try:
-            auth_string = f"{self.consumer_key}:{self.consumer_secret}"
-            auth_bytes = auth_string.encode('ascii')
-            auth_base64 = base64.b64encode(auth_bytes).decode('ascii')
+            response = await self.client.request(method, url, **kwargs)
+        except Exception as e:
+            reason = "timeout" if isinstance(e, httpx.TimeoutException) else "transport"
+            MPESA_REQUEST_ERRORS.labels(endpoint, reason).inc()
+            raise
+        finally:
+            MPESA_REQUEST_DURATION.labels(endpoint).observe(time.perf_counter() - started)
+        if response.status_code >= 400:
+            MPESA_REQUEST_ERRORS.labels(endpoint, str(response.status_code)).inc()
+        return response
+    
+    def _token_is_fresh(self) -> bool:
+        return self._access_token is not None and time.monotonic() < self._token_expires_at
+    
+    def _token_backing_off(self) -> bool:
+        return time.monotonic() < self._token_retry_at
+    
+    def invalidate_access_token(self, token: str):
+        """Drop the cached token after Safaricom rejected it"""
+        # Only the first caller holding a rejected token forces a refresh
+        if self._access_token == token:
+            self._access_token = None
+            self._token_expires_at = 0.0
+    
+    async def get_access_token(self) -> Optional[str]:
+        """Get OAuth access token, cached until shortly before it expires.
+        
+        After a failed request callers get None without contacting
+        Safaricom for MPESA_TOKEN_RETRY_BACKOFF seconds, so an auth outage
+        doesn't queue every payment behind its own doomed token request.
+        """
+        if self._token_is_fresh():
+            return self._access_token
+        if self._token_backing_off():
+            return None
+        
+        # Single-flight refresh: concurrent callers wait for one request
+        async with self._token_lock:
+            if self._token_is_fresh():
+                return self._access_token
+            if self._token_backing_off():
+                return None
+            
+            try:
+                auth_string = f"{self.consumer_key}:{self.consumer_secret}"
+                auth_bytes = auth_string.encode('ascii')
+                auth_base64 = base64.b64encode(auth_bytes).decode('ascii')
+                
+                headers = {
+                    'Authorization': f'Basic {auth_base64}'
+                }
+                
+                response = await self._request("oauth", "GET", self.auth_url, headers=headers)
+                response.raise_for_status()
+                
+                data = response.json()
+                expires_in = int(data.get('expires_in', 3599))
+                self._access_token = data.get('access_token')
+                self._token_expires_at = time.monotonic() + max(
+                    0, expires_in - settings.MPESA_TOKEN_REFRESH_MARGIN
+                )
+                return self._access_token
+                
+            except Exception as e:
+                self._token_retry_at = time.monotonic() + settings.MPESA_TOKEN_RETRY_BACKOFF
+                logger.error(f"Failed to get M-Pesa access token: {e}")
+                return None
+    
+    async def _post(self, endpoint: str, url: str, payload: Dict) -> Optional[httpx.Response]:
+        """POST with a cached bearer token, refreshing it once if rejected"""
+        for attempt in range(2):
+            access_token = await self.get_access_token()
+            if not access_token:
+                return None
             
             headers = {
-                'Authorization': f'Basic {auth_base64}'
+                'Authorization': f'Bearer {access_token}',
+                'Content-Type': 'application/json'
             }
             
-            response = requests.get(self.auth_url, headers=headers)
-            response.raise_for_status()
-            
-            token = response.json().get('access_token')
-            return token
-            
-        except Exception as e:
-            logger.error(f"Failed to get M-Pesa access token: {e}")
-            return None
+            response = await self._request(endpoint, "POST", url, json=payload, headers=headers)
+            if response.status_code != 401 or attempt:
+                return response
+            self.invalidate_access_token(access_token)
     
     def generate_password(self, timestamp: str) -> str:
         """Generate password for STK push"""
@@ -56,7 +157,7 @@ class MPesaService:
         encoded = base64.b64encode(data_to_encode.encode())
         return encoded.decode('utf-8')
     
-    def stk_push(
+    async def stk_push(
         self,
         phone_number: str,
         amount: int,
@@ -73,21 +174,9 @@ class MPesaService:
         if not phone_number.startswith('254'):
             phone_number = '254' + phone_number
         
-        access_token = self.get_access_token()
-        if not access_token:
-            return {
-                'success': False,
-                'message': 'Failed to authenticate with M-Pesa'
-            }
-        
         timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
         password = self.generate_password(timestamp)
         
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'Content-Type': 'application/json'
-        }
-        
         payload = {
             'BusinessShortCode': self.shortcode,
             'Password': password,
@@ -103,12 +192,12 @@ class MPesaService:
         }
         
         try:
-            response = requests.post(
-                self.stk_push_url,
-                json=payload,
-                headers=headers,
-                timeout=30
-            )
+            response = await self._post("stk_push", self.stk_push_url, payload)
+            if response is None:
+                return {
+                    'success': False,
+                    'message': 'Failed to authenticate with M-Pesa'
+                }
             
             result = response.json()
             
@@ -135,23 +224,11 @@ class MPesaService:
                 'message': str(e)
             }
     
-    def query_transaction(self, checkout_request_id: str) -> Dict:
+    async def query_transaction(self, checkout_request_id: str) -> Dict:
         """Query STK Push transaction status"""
-        access_token = self.get_access_token()
-        if not access_token:
-            return {
-                'success': False,
-                'message': 'Failed to authenticate with M-Pesa'
-            }
-        
         timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
         password = self.generate_password(timestamp)
         
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'Content-Type': 'application/json'
-        }
-        
         payload = {
             'BusinessShortCode': self.shortcode,
             'Password': password,
@@ -160,12 +237,12 @@ class MPesaService:
         }
         
         try:
-            response = requests.post(
-                self.query_url,
-                json=payload,
-                headers=headers,
-                timeout=30
-            )
+            response = await self._post("stk_query", self.query_url, payload)
+            if response is None:
+                return {
+                    'success': False,
+                    'message': 'Failed to authenticate with M-Pesa'
+                }
             
             return response.json()
             
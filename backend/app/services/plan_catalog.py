@@ -0,0 +1,161 @@
+import asyncio
+import bisect
+import hashlib
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import select
+from ..core.config import settings
+from ..core.redis import get_redis, listen
+from ..database import AsyncSessionLocal
+from ..models.plan import Plan
+from ..schemas.plan import PlanResponse
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "plans:invalidate"
+
+# (body, etag) of a pre-serialized JSON response
+Rendered = Tuple[bytes, str]
+
+# Columns the catalog is listed by, and the key cursors encode
+SORT_KEYS = (Plan.sort_order, Plan.price, Plan.id)
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def _render(body: bytes) -> Rendered:
+    return body, _etag(body)
+
+
+class CatalogSnapshot:
+    """Immutable, pre-serialized view of every plan"""
+
+    def __init__(self, plans: List[PlanResponse]):
+        self.built_at = time.monotonic()
+        # Ordered as the catalog is listed: sort_order, then price
+        self._all = [plan.model_dump_json().encode() for plan in plans]
+        self._active = [body for plan, body in zip(plans, self._all) if plan.is_active]
+        self._all_keys = [tuple(getattr(plan, key.key) for key in SORT_KEYS) for plan in plans]
+        self._active_keys = [key for plan, key in zip(plans, self._all_keys) if plan.is_active]
+        self._by_id: Dict[int, Rendered] = {
+            plan.id: _render(body) for plan, body in zip(plans, self._all)
+        }
+        self._pages: Dict[Tuple[bool, int, int], Tuple[Rendered, Optional[Tuple]]] = {}
+
+    def page(
+        self,
+        active_only: bool,
+        skip: int,
+        limit: int,
+        after: Optional[Tuple[Any, ...]] = None
+    ) -> Tuple[Rendered, Optional[Tuple]]:
+        """Rendered page and the sort key of its last plan if more follow.
+
+        ``after`` starts the page past that sort key, so a cursor keeps its
+        place when plans are added or removed between requests.
+        """
+        keys = self._active_keys if active_only else self._all_keys
+        if after is not None:
+            skip += bisect.bisect_right(keys, after)
+        key = (active_only, skip, limit)
+        page = self._pages.get(key)
+        if page is None:
+            items = (self._active if active_only else self._all)[skip:skip + limit]
+            last = skip + limit - 1
+            page = (
+                _render(b"[" + b",".join(items) + b"]"),
+                keys[last] if limit and last + 1 < len(keys) else None
+            )
+            # Pages are cheap to rebuild; don't let odd skip/limit values grow the cache forever
+            if len(self._pages) < 256:
+                self._pages[key] = page
+        return page
+
+    def plan(self, plan_id: int) -> Optional[Rendered]:
+        return self._by_id.get(plan_id)
+
+
+class PlanCatalog:
+    """In-memory plan catalog served without touching the database.
+
+    The snapshot is rebuilt when plans change through the API, other
+    workers are told to drop theirs over Redis pub/sub, and
+    ``PLAN_CATALOG_MAX_AGE`` bounds staleness if an invalidation is missed.
+    Every invalidation bumps a generation, and a rebuild that started
+    before one doesn't install its (possibly stale) snapshot.
+    """
+
+    def __init__(self, max_age: int = settings.PLAN_CATALOG_MAX_AGE):
+        self.max_age = max_age
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self._listener: Optional[asyncio.Task] = None
+
+    def _fresh(self) -> Optional[CatalogSnapshot]:
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - snapshot.built_at < self.max_age:
+            return snapshot
+        return None
+
+    async def snapshot(self) -> CatalogSnapshot:
+        """Current snapshot, rebuilding it once if missing or too old"""
+        snapshot = self._fresh()
+        if snapshot is not None:
+            return snapshot
+        async with self._lock:
+            snapshot = self._fresh()
+            if snapshot is None:
+                snapshot = await self.refresh()
+            return snapshot
+
+    async def refresh(self) -> CatalogSnapshot:
+        """Rebuild the snapshot from the database; call with ``_lock`` held"""
+        generation = self._generation
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(Plan).order_by(Plan.sort_order, Plan.price, Plan.id))
+            plans = [PlanResponse.model_validate(plan) for plan in result.scalars().all()]
+        snapshot = CatalogSnapshot(plans)
+        if generation == self._generation:
+            self._snapshot = snapshot
+            logger.debug(f"Plan catalog rebuilt with {len(plans)} plans")
+        return snapshot
+
+    async def invalidate(self):
+        """Rebuild locally and tell the other workers to drop their snapshot"""
+        self._drop()
+        async with self._lock:
+            await self.refresh()
+        redis = get_redis()
+        if redis is not None:
+            try:
+                await redis.publish(INVALIDATION_CHANNEL, b"1")
+            except Exception as e:
+                logger.error(f"Plan catalog invalidation publish failed: {e}")
+
+    def _drop(self, data: bytes = b""):
+        self._generation += 1
+        self._snapshot = None
+
+    async def start(self):
+        """Subscribe to invalidations published by other workers"""
+        if get_redis() is not None and self._listener is None:
+            self._listener = asyncio.create_task(
+                listen(INVALIDATION_CHANNEL, self._drop, self._drop)
+            )
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+
+# Singleton instance
+plan_catalog = PlanCatalog()
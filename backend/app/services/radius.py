@@ -0,0 +1,389 @@
+import asyncio
+import hashlib
+import logging
+import socket
+import struct
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+from ..core.config import settings
+from ..database import AsyncSessionLocal
+from .session_manager import SessionManager
+from .session_reconciler import adopt_sessions
+from .usage_tracker import usage_tracker
+
+logger = logging.getLogger(__name__)
+
+# RADIUS packet codes (RFC 2866)
+ACCOUNTING_REQUEST = 4
+ACCOUNTING_RESPONSE = 5
+
+# Attribute types
+ATTR_USER_NAME = 1
+ATTR_NAS_IP_ADDRESS = 4
+ATTR_FRAMED_IP_ADDRESS = 8
+ATTR_CALLING_STATION_ID = 31
+ATTR_ACCT_STATUS_TYPE = 40
+ATTR_ACCT_INPUT_OCTETS = 42
+ATTR_ACCT_OUTPUT_OCTETS = 43
+ATTR_ACCT_SESSION_ID = 44
+ATTR_ACCT_SESSION_TIME = 46
+ATTR_ACCT_TERMINATE_CAUSE = 49
+ATTR_ACCT_INPUT_GIGAWORDS = 52
+ATTR_ACCT_OUTPUT_GIGAWORDS = 53
+
+# Acct-Status-Type values
+ACCT_START = 1
+ACCT_STOP = 2
+ACCT_INTERIM_UPDATE = 3
+
+TERMINATE_CAUSES = {
+    1: "User-Request",
+    2: "Lost-Carrier",
+    3: "Lost-Service",
+    4: "Idle-Timeout",
+    5: "Session-Timeout",
+    6: "Admin-Reset",
+    7: "Admin-Reboot",
+    8: "Port-Error",
+    9: "NAS-Error",
+    10: "NAS-Request",
+    11: "NAS-Reboot",
+    15: "Service-Unavailable",
+    16: "Callback",
+    17: "User-Error",
+    18: "Host-Request",
+}
+
+HEADER = struct.Struct("!BBH16s")
+
+SessionKey = Tuple[str, str]
+
+
+class RadiusPacketError(ValueError):
+    """Raised for malformed or unauthenticated RADIUS packets"""
+
+
+@dataclass
+class AccountingRecord:
+    """Accounting data carried by one Accounting-Request"""
+    status_type: int
+    session_id: str
+    nas_ip: str
+    username: Optional[str] = None
+    framed_ip: Optional[str] = None
+    mac_address: Optional[str] = None
+    upload_bytes: int = 0
+    download_bytes: int = 0
+    session_time: int = 0
+    terminate_cause: Optional[str] = None
+    received_at: datetime = field(default_factory=datetime.utcnow)
+
+    @property
+    def key(self) -> SessionKey:
+        return (self.nas_ip, self.session_id)
+
+
+def _parse_attributes(data: bytes) -> Dict[int, bytes]:
+    """Parse the attribute section of a RADIUS packet (last value wins)"""
+    attributes = {}
+    offset = 0
+    while offset < len(data):
+        if offset + 2 > len(data):
+            raise RadiusPacketError("Truncated attribute header")
+        attr_type, attr_len = data[offset], data[offset + 1]
+        if attr_len < 2 or offset + attr_len > len(data):
+            raise RadiusPacketError("Invalid attribute length")
+        attributes[attr_type] = data[offset + 2:offset + attr_len]
+        offset += attr_len
+    return attributes
+
+
+def _int(attributes: Dict[int, bytes], attr_type: int) -> int:
+    value = attributes.get(attr_type)
+    if value is None or len(value) != 4:
+        return 0
+    return struct.unpack("!I", value)[0]
+
+
+def _str(attributes: Dict[int, bytes], attr_type: int) -> Optional[str]:
+    value = attributes.get(attr_type)
+    if value is None:
+        return None
+    return value.decode("utf-8", errors="replace")
+
+
+def _ip(attributes: Dict[int, bytes], attr_type: int) -> Optional[str]:
+    value = attributes.get(attr_type)
+    if value is None or len(value) != 4:
+        return None
+    return socket.inet_ntoa(value)
+
+
+def parse_accounting_request(
+    packet: bytes,
+    secret: bytes,
+    source_ip: str
+) -> Tuple[int, bytes, AccountingRecord]:
+    """Validate an Accounting-Request and extract its accounting record.
+
+    Returns the packet identifier, request authenticator and the record.
+    """
+    if len(packet) < HEADER.size:
+        raise RadiusPacketError("Packet too short")
+
+    code, identifier, length, authenticator = HEADER.unpack_from(packet)
+    if code != ACCOUNTING_REQUEST:
+        raise RadiusPacketError(f"Unexpected packet code {code}")
+    if length < HEADER.size or length > len(packet):
+        raise RadiusPacketError("Invalid packet length")
+
+    packet = packet[:length]
+    attrs = packet[HEADER.size:]
+
+    # Request Authenticator = MD5(Code+ID+Length+16 zero octets+Attributes+Secret)
+    expected = hashlib.md5(packet[:4] + bytes(16) + attrs + secret).digest()
+    if expected != authenticator:
+        raise RadiusPacketError("Bad request authenticator")
+
+    attributes = _parse_attributes(attrs)
+    session_id = _str(attributes, ATTR_ACCT_SESSION_ID)
+    status_type = _int(attributes, ATTR_ACCT_STATUS_TYPE)
+    if not session_id or not status_type:
+        raise RadiusPacketError("Missing Acct-Session-Id or Acct-Status-Type")
+
+    record = AccountingRecord(
+        status_type=status_type,
+        session_id=session_id,
+        nas_ip=_ip(attributes, ATTR_NAS_IP_ADDRESS) or source_ip,
+        username=_str(attributes, ATTR_USER_NAME),
+        framed_ip=_ip(attributes, ATTR_FRAMED_IP_ADDRESS),
+        mac_address=_str(attributes, ATTR_CALLING_STATION_ID),
+        # Input octets are received from the user, i.e. upload
+        upload_bytes=(_int(attributes, ATTR_ACCT_INPUT_GIGAWORDS) << 32)
+        + _int(attributes, ATTR_ACCT_INPUT_OCTETS),
+        download_bytes=(_int(attributes, ATTR_ACCT_OUTPUT_GIGAWORDS) << 32)
+        + _int(attributes, ATTR_ACCT_OUTPUT_OCTETS),
+        session_time=_int(attributes, ATTR_ACCT_SESSION_TIME),
+        terminate_cause=TERMINATE_CAUSES.get(_int(attributes, ATTR_ACCT_TERMINATE_CAUSE)),
+    )
+    return identifier, authenticator, record
+
+
+def build_accounting_response(identifier: int, request_authenticator: bytes, secret: bytes) -> bytes:
+    """Build an Accounting-Response with no attributes"""
+    header = struct.pack("!BBH", ACCOUNTING_RESPONSE, identifier, HEADER.size)
+    authenticator = hashlib.md5(header + request_authenticator + secret).digest()
+    return header + authenticator
+
+
+class _AccountingProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server: "RadiusAccountingServer"):
+        self.server = server
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        try:
+            identifier, authenticator, record = parse_accounting_request(
+                data, self.server.secret, addr[0]
+            )
+        except RadiusPacketError as e:
+            logger.warning(f"Dropped RADIUS packet from {addr[0]}: {e}")
+            return
+
+        self.server.record(record)
+        self.transport.sendto(
+            build_accounting_response(identifier, authenticator, self.server.secret),
+            addr
+        )
+
+    def error_received(self, exc):
+        logger.error(f"RADIUS accounting socket error: {exc}")
+
+
+class RadiusAccountingServer:
+    """In-process RADIUS accounting server with batched write-behind.
+
+    Accounting-Requests are acknowledged as soon as they are recorded.
+    Interim-Updates and Stops go to the Redis usage tracker, which enforces
+    data caps in real time; starts, and everything while Redis is
+    unavailable, are coalesced per session in memory. Either way a session
+    sending many updates between flushes costs one row in the next batch,
+    and each flush is a handful of bulk statements.
+    """
+
+    def __init__(
+        self,
+        host: str = settings.RADIUS_HOST,
+        port: int = settings.RADIUS_ACCT_PORT,
+        secret: str = settings.RADIUS_SECRET,
+        flush_interval: float = settings.RADIUS_ACCT_FLUSH_INTERVAL,
+        max_tracking: int = 1000
+    ):
+        self.host = host
+        self.port = port
+        self.secret = secret.encode()
+        self.flush_interval = flush_interval
+        self.max_tracking = max_tracking
+        self.transport = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._starts: Dict[SessionKey, AccountingRecord] = {}
+        self._updates: Dict[SessionKey, AccountingRecord] = {}
+        self._stops: Dict[SessionKey, AccountingRecord] = {}
+        self._tracking: Set[asyncio.Task] = set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._starts) + len(self._updates) + len(self._stops)
+
+    def record(self, record: AccountingRecord):
+        """Record an accounting update in Redis, or buffer it in memory"""
+        if record.status_type != ACCT_START and usage_tracker.enabled:
+            if len(self._tracking) < self.max_tracking:
+                task = asyncio.get_running_loop().create_task(self._track(record))
+                self._tracking.add(task)
+                task.add_done_callback(self._tracking.discard)
+                return
+        self._buffer(record)
+
+    async def _track(self, record: AccountingRecord):
+        try:
+            exhausted = await usage_tracker.apply(record, stop=record.status_type == ACCT_STOP)
+        except Exception as e:
+            usage_tracker.mark_down(e)
+            self._buffer(record)
+            return
+        if exhausted:
+            await self._enforce([exhausted])
+
+    async def _enforce(self, user_plan_ids: List[int]):
+        """Disconnect sessions on plans that just ran out of data"""
+        try:
+            async with AsyncSessionLocal() as db:
+                await SessionManager.terminate_plan_sessions(db, user_plan_ids, "Data-Limit-Exceeded")
+        except Exception as e:
+            logger.error(f"Failed to enforce data limit on plans {user_plan_ids}: {e}")
+
+    def _buffer(self, record: AccountingRecord):
+        """Buffer an accounting record, coalescing it with earlier ones"""
+        key = record.key
+
+        if record.status_type == ACCT_START:
+            self._starts[key] = record
+        elif record.status_type == ACCT_INTERIM_UPDATE:
+            if key in self._stops:
+                return
+            previous = self._updates.get(key)
+            # Counters are cumulative; ignore reordered, older updates
+            if previous is None or record.session_time >= previous.session_time:
+                self._updates[key] = record
+        elif record.status_type == ACCT_STOP:
+            # The stop carries final counters, superseding any interim update
+            self._updates.pop(key, None)
+            self._stops[key] = record
+
+    async def start(self):
+        """Bind the accounting socket and start the flush loop"""
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(
+            lambda: _AccountingProtocol(self),
+            local_addr=(self.host, self.port),
+            reuse_port=hasattr(socket, "SO_REUSEPORT"),
+        )
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        logger.info(f"RADIUS accounting server listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        """Close the socket and flush whatever is still buffered"""
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        if self._tracking:
+            await asyncio.gather(*self._tracking, return_exceptions=True)
+        await self.flush()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"RADIUS accounting flush failed: {e}")
+
+    async def flush(self) -> int:
+        """Persist buffered accounting records and Redis counters in bulk"""
+        async with self._flush_lock:
+            count = 0
+            if self.pending:
+                # Starts first, so counters for new sessions find their rows
+                count += await self._flush_buffer()
+            if usage_tracker.enabled:
+                async with AsyncSessionLocal() as db:
+                    exhausted = await usage_tracker.flush(db)
+                if exhausted:
+                    await self._enforce(exhausted)
+            return count
+
+    async def _flush_buffer(self) -> int:
+        starts, self._starts = self._starts, {}
+        updates, self._updates = self._updates, {}
+        stops, self._stops = self._stops, {}
+
+        try:
+            async with AsyncSessionLocal() as db:
+                # Sessions that start and stop within one interval still
+                # need their row before the stop can close it
+                await SessionManager.bulk_start_sessions(db, list(starts.values()))
+                # Sessions whose start never arrived may have been recorded by the reconciler
+                await adopt_sessions(db, [
+                    (r.nas_ip, r.session_id, r.username, r.mac_address)
+                    for r in list(updates.values()) + list(stops.values())
+                ])
+                await SessionManager.bulk_update_usage(db, list(updates.values()))
+                await SessionManager.bulk_update_usage(db, list(stops.values()), stop=True)
+                exhausted = await SessionManager.refresh_plan_usage(
+                    db, list(updates.values()) + list(stops.values())
+                )
+                await db.commit()
+
+                if exhausted:
+                    await SessionManager.terminate_plan_sessions(
+                        db, exhausted, "Data-Limit-Exceeded"
+                    )
+        except Exception:
+            # Put the batch back unless newer records superseded it
+            self._requeue(starts, updates, stops)
+            raise
+
+        count = len(starts) + len(updates) + len(stops)
+        logger.debug(f"Flushed {count} RADIUS accounting records")
+        return count
+
+    def _requeue(
+        self,
+        starts: Dict[SessionKey, AccountingRecord],
+        updates: Dict[SessionKey, AccountingRecord],
+        stops: Dict[SessionKey, AccountingRecord]
+    ):
+        for key, record in starts.items():
+            self._starts.setdefault(key, record)
+        for key, record in stops.items():
+            self._stops.setdefault(key, record)
+        for key, record in updates.items():
+            if key not in self._stops:
+                self._updates.setdefault(key, record)
+
+
+# Singleton instance
+radius_accounting_server = RadiusAccountingServer()
@@ -0,0 +1,332 @@
+import logging
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+from sqlalchemy import Date, and_, cast, delete, func, or_, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.config import settings
+from ..database import AsyncSessionLocal
+from ..models.plan import UserPlan
+from ..models.rollup import UsageHourly, UsageDaily, RollupSessionMark, RollupWatermark
+from ..models.session import Session
+from ..models.transaction import Transaction, TransactionStatus, TransactionType
+
+logger = logging.getLogger(__name__)
+
+USAGE_WATERMARK = "usage"
+REVENUE_WATERMARK = "revenue"
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+METRICS = ("upload_bytes", "download_bytes", "session_seconds", "sessions", "revenue", "purchases")
+USAGE_METRICS = METRICS[:4]
+
+# (hour, user_id, plan_id, nas_ip)
+HourKey = Tuple[datetime, int, int, str]
+
+
+def _hour(ts: datetime) -> datetime:
+    return ts.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+class UsageRollup:
+    """Maintains the hourly and daily reporting rollups incrementally.
+
+    Sessions are cumulative counters, so each session's last rolled-up
+    counters are kept in ``rollup_session_marks`` and only the growth
+    since then is added to the hour in which it was reported. Revenue
+    comes from immutable completed purchases, so the hours it touches
+    are recomputed outright. Daily rows are rebuilt from the hourly rows
+    of the days touched. Every step is idempotent, which lets each run
+    re-read ``overlap`` seconds behind its watermark to pick up rows
+    committed late.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = settings.ROLLUP_BATCH_SIZE,
+        overlap: int = settings.ROLLUP_OVERLAP,
+        mark_retention_days: int = settings.ROLLUP_MARK_RETENTION_DAYS,
+        tz: str = settings.REPORT_TIMEZONE
+    ):
+        self.batch_size = batch_size
+        self.overlap = timedelta(seconds=overlap)
+        self.mark_retention = timedelta(days=mark_retention_days)
+        self.tz_name = tz
+        self.tz = ZoneInfo(tz)
+
+    @staticmethod
+    async def _get_watermark(db: AsyncSession, name: str) -> Optional[datetime]:
+        result = await db.execute(select(RollupWatermark.value).where(RollupWatermark.name == name))
+        return result.scalar_one_or_none()
+
+    @staticmethod
+    async def _set_watermark(db: AsyncSession, name: str, value: datetime):
+        stmt = insert(RollupWatermark).values(name=name, value=value)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=["name"],
+            set_={"value": stmt.excluded.value, "updated_at": func.now()}
+        ))
+
+    async def _since(self, db: AsyncSession, name: str) -> datetime:
+        watermark = await self._get_watermark(db, name)
+        return watermark - self.overlap if watermark is not None else EPOCH
+
+    async def run_once(self) -> int:
+        """Fold new usage and revenue into the rollups; returns sessions folded"""
+        until = datetime.now(timezone.utc)
+        hours: Set[datetime] = set()
+
+        async with AsyncSessionLocal() as db:
+            usage_since = await self._since(db, USAGE_WATERMARK)
+            revenue_since = await self._since(db, REVENUE_WATERMARK)
+
+            folded = await self._fold_sessions(db, usage_since, hours)
+            await self._rebuild_revenue(db, revenue_since, hours)
+            await self._rebuild_daily(db, hours)
+            await self._prune_marks(db, until)
+            await self._set_watermark(db, USAGE_WATERMARK, until)
+            await self._set_watermark(db, REVENUE_WATERMARK, until)
+            await db.commit()
+
+        if folded or hours:
+            logger.info(f"Rolled up {folded} sessions across {len(hours)} hours")
+        return folded
+
+    async def _fold_sessions(self, db: AsyncSession, since: datetime, hours: Set[datetime]) -> int:
+        """Add session counter growth since ``since`` to the hourly rollup"""
+        activity = func.coalesce(Session.updated_at, Session.created_at)
+        folded = 0
+        last_id = 0
+        while True:
+            result = await db.execute(
+                select(
+                    Session.id,
+                    Session.user_id,
+                    UserPlan.plan_id,
+                    Session.nas_ip_address,
+                    Session.upload_bytes,
+                    Session.download_bytes,
+                    Session.session_duration,
+                    activity
+                )
+                .outerjoin(UserPlan, UserPlan.id == Session.user_plan_id)
+                .where(
+                    and_(
+                        Session.id > last_id,
+                        # Only sessions that can have changed, then the exact filter
+                        or_(Session.is_active == True, Session.stopped_at > since),
+                        activity > since
+                    )
+                )
+                .order_by(Session.id)
+                .limit(self.batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            marks = {
+                session_id: (up, down, seconds)
+                for session_id, up, down, seconds in (await db.execute(
+                    select(
+                        RollupSessionMark.session_id,
+                        RollupSessionMark.upload_bytes,
+                        RollupSessionMark.download_bytes,
+                        RollupSessionMark.session_seconds
+                    ).where(RollupSessionMark.session_id.in_([row[0] for row in rows]))
+                )).all()
+            }
+
+            totals: Dict[HourKey, List[int]] = defaultdict(lambda: [0, 0, 0, 0])
+            new_marks = []
+            for session_id, user_id, plan_id, nas_ip, up, down, seconds, seen_at in rows:
+                current = (up or 0, down or 0, seconds or 0)
+                mark = marks.get(session_id)
+                if mark is None:
+                    growth, started = current, 1
+                else:
+                    growth, started = tuple(max(0, c - m) for c, m in zip(current, mark)), 0
+                    if not any(growth):
+                        continue
+                    current = tuple(max(c, m) for c, m in zip(current, mark))
+
+                bucket = _hour(seen_at)
+                entry = totals[(bucket, user_id, plan_id or 0, nas_ip or "")]
+                for i, value in enumerate(growth + (started,)):
+                    entry[i] += value
+                hours.add(bucket)
+                new_marks.append({
+                    "session_id": session_id,
+                    "upload_bytes": current[0],
+                    "download_bytes": current[1],
+                    "session_seconds": current[2],
+                })
+
+            if totals:
+                stmt = insert(UsageHourly)
+                await db.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=["bucket", "user_id", "plan_id", "nas_ip_address"],
+                        set_={m: getattr(UsageHourly, m) + stmt.excluded[m] for m in USAGE_METRICS}
+                    ),
+                    [
+                        {
+                            "bucket": bucket, "user_id": user_id, "plan_id": plan_id, "nas_ip_address": nas_ip,
+                            **dict(zip(USAGE_METRICS, values)), "revenue": 0, "purchases": 0,
+                        }
+                        for (bucket, user_id, plan_id, nas_ip), values in totals.items()
+                    ]
+                )
+                stmt = insert(RollupSessionMark)
+                await db.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=["session_id"],
+                        set_={c: stmt.excluded[c] for c in ("upload_bytes", "download_bytes", "session_seconds")}
+                    ),
+                    new_marks
+                )
+            # Marks and totals commit together, so a retry never counts twice
+            await db.commit()
+            folded += len(new_marks)
+
+            if len(rows) < self.batch_size:
+                break
+        return folded
+
+    @staticmethod
+    async def _rebuild_revenue(db: AsyncSession, since: datetime, hours: Set[datetime]):
+        """Recompute revenue for every hour with purchases completed since ``since``"""
+        bucket = func.date_trunc("hour", Transaction.completed_at, "UTC")
+        user_id = func.coalesce(Transaction.user_id, 0)
+        plan_id = func.coalesce(Transaction.plan_id, 0)
+        result = await db.execute(
+            select(bucket, user_id, plan_id, func.sum(Transaction.amount), func.count())
+            .where(
+                and_(
+                    Transaction.status == TransactionStatus.COMPLETED,
+                    Transaction.type == TransactionType.PURCHASE,
+                    # Whole hours, so the recomputed totals are complete
+                    Transaction.completed_at >= _hour(since)
+                )
+            )
+            .group_by(bucket, user_id, plan_id)
+        )
+        rows = [
+            {
+                "bucket": hour, "user_id": user, "plan_id": plan, "nas_ip_address": "",
+                "upload_bytes": 0, "download_bytes": 0, "session_seconds": 0, "sessions": 0,
+                "revenue": revenue, "purchases": purchases,
+            }
+            for hour, user, plan, revenue, purchases in result.all()
+        ]
+        if rows:
+            stmt = insert(UsageHourly)
+            await db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["bucket", "user_id", "plan_id", "nas_ip_address"],
+                    set_={"revenue": stmt.excluded.revenue, "purchases": stmt.excluded.purchases}
+                ),
+                rows
+            )
+            hours.update(_hour(row["bucket"]) for row in rows)
+
+    async def _rebuild_daily(self, db: AsyncSession, hours: Set[datetime]):
+        """Rebuild the daily rows of every day containing one of ``hours``"""
+        if not hours:
+            return
+        days = {hour.astimezone(self.tz).date() for hour in hours}
+        start = datetime.combine(min(days), time(), self.tz)
+        end = datetime.combine(max(days) + timedelta(days=1), time(), self.tz)
+
+        day = cast(func.timezone(self.tz_name, UsageHourly.bucket), Date)
+        result = await db.execute(
+            select(
+                day,
+                UsageHourly.plan_id,
+                UsageHourly.nas_ip_address,
+                *(func.sum(getattr(UsageHourly, m)) for m in METRICS)
+            )
+            .where(and_(UsageHourly.bucket >= start, UsageHourly.bucket < end))
+            .group_by(day, UsageHourly.plan_id, UsageHourly.nas_ip_address)
+        )
+        rows = [
+            {"day": d, "plan_id": plan_id, "nas_ip_address": nas_ip, **dict(zip(METRICS, values))}
+            for d, plan_id, nas_ip, *values in result.all()
+            if d in days
+        ]
+        if rows:
+            stmt = insert(UsageDaily)
+            await db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["day", "plan_id", "nas_ip_address"],
+                    set_={m: stmt.excluded[m] for m in METRICS}
+                ),
+                rows
+            )
+
+    async def _prune_marks(self, db: AsyncSession, now: datetime):
+        """Forget counters of sessions that ended long enough ago"""
+        cutoff = now - self.mark_retention
+        await db.execute(
+            delete(RollupSessionMark).where(
+                RollupSessionMark.session_id.in_(
+                    select(Session.id).where(
+                        and_(Session.stopped_at < cutoff, Session.stopped_at >= cutoff - timedelta(days=1))
+                    )
+                )
+            )
+        )
+
+
+async def usage_report(
+    db: AsyncSession,
+    start: date,
+    end: date,
+    group_by: str = "day"
+) -> List[Dict]:
+    """Daily rollup totals for ``start``..``end`` (inclusive) grouped by day, plan or NAS"""
+    dimension = {
+        "day": UsageDaily.day,
+        "plan": UsageDaily.plan_id,
+        "nas": UsageDaily.nas_ip_address,
+    }[group_by]
+    result = await db.execute(
+        select(dimension.label("key"), *(func.sum(getattr(UsageDaily, m)).label(m) for m in METRICS))
+        .where(and_(UsageDaily.day >= start, UsageDaily.day <= end))
+        .group_by(dimension)
+        .order_by(dimension)
+    )
+    return [dict(row._mapping) for row in result.all()]
+
+
+async def user_usage_report(
+    db: AsyncSession,
+    user_id: int,
+    start: date,
+    end: date,
+    tz: str = settings.REPORT_TIMEZONE
+) -> List[Dict]:
+    """One user's daily totals for ``start``..``end`` (inclusive), from the hourly rollup"""
+    zone = ZoneInfo(tz)
+    day = cast(func.timezone(tz, UsageHourly.bucket), Date)
+    result = await db.execute(
+        select(day.label("key"), *(func.sum(getattr(UsageHourly, m)).label(m) for m in METRICS))
+        .where(
+            and_(
+                UsageHourly.user_id == user_id,
+                UsageHourly.bucket >= datetime.combine(start, time(), zone),
+                UsageHourly.bucket < datetime.combine(end + timedelta(days=1), time(), zone)
+            )
+        )
+        .group_by(day)
+        .order_by(day)
+    )
+    return [dict(row._mapping) for row in result.all()]
+
+
+# Singleton instance
+usage_rollup = UsageRollup()
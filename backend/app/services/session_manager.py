@@ -1,13 +1,20 @@
 import logging
 from datetime import datetime, timedelta
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Iterable, TYPE_CHECKING
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, update
+from sqlalchemy import select, and_, or_, update, insert, bindparam, case, cast, func, tuple_, Integer
 from ..models.session import Session
 from ..models.user import User
 from ..models.plan import UserPlan
+from ..core.config import settings
 from ..core.security import generate_session_id
-from .mikrotik import mikrotik_service
+from .live_stats import live_stats
+from .mikrotik import mikrotik_fleet
+from .session_reconciler import adopt_sessions
+from .usage_tracker import usage_tracker
+
+if TYPE_CHECKING:
+    from .radius import AccountingRecord
 
 logger = logging.getLogger(__name__)
 
@@ -75,54 +82,48 @@ class SessionManager:
         session_time: int
     ) -> bool:
         """Update session usage (RADIUS accounting)"""
+        from .radius import AccountingRecord, ACCT_INTERIM_UPDATE
         
         result = await db.execute(
-            select(Session).where(
+            select(Session.nas_ip_address).where(
                 and_(
                     Session.session_id == session_id,
                     Session.is_active == True
                 )
             )
         )
-        session = result.scalar_one_or_none()
+        row = result.first()
         
-        if not session:
+        if not row:
             logger.warning(f"Session {session_id} not found")
             return False
         
-        # Update session data
-        session.upload_bytes = upload_bytes
-        session.download_bytes = download_bytes
-        session.total_bytes = upload_bytes + download_bytes
-        session.session_duration = session_time
+        record = AccountingRecord(
+            status_type=ACCT_INTERIM_UPDATE,
+            session_id=session_id,
+            nas_ip=row.nas_ip_address,
+            upload_bytes=upload_bytes,
+            download_bytes=download_bytes,
+            session_time=session_time
+        )
         
-        # Update user plan data usage
-        if session.user_plan_id:
-            bytes_to_mb = (upload_bytes + download_bytes) / (1024 * 1024)
-            
-            result = await db.execute(
-                select(UserPlan).where(UserPlan.id == session.user_plan_id)
-            )
-            user_plan = result.scalar_one_or_none()
-            
-            if user_plan:
-                user_plan.data_used_mb = int(bytes_to_mb)
-                
-                if user_plan.data_remaining_mb is not None:
-                    user_plan.data_remaining_mb = max(
-                        0,
-                        user_plan.plan.data_limit_mb - user_plan.data_used_mb
-                    )
-                    
-                    # Disconnect if data exhausted
-                    if user_plan.data_remaining_mb <= 0:
-                        await SessionManager.terminate_session(
-                            db,
-                            session_id,
-                            "Data-Limit-Exceeded"
-                        )
+        # Counters and the data cap live in Redis; Postgres catches up on flush
+        if usage_tracker.enabled:
+            try:
+                exhausted = await usage_tracker.apply(record)
+            except Exception as e:
+                usage_tracker.mark_down(e)
+            else:
+                if exhausted:
+                    await SessionManager.terminate_plan_sessions(db, [exhausted], "Data-Limit-Exceeded")
+                return True
         
+        await SessionManager.bulk_update_usage(db, [record])
+        exhausted = await SessionManager.refresh_plan_usage(db, [record])
         await db.commit()
+        
+        if exhausted:
+            await SessionManager.terminate_plan_sessions(db, exhausted, "Data-Limit-Exceeded")
         return True
     
     @staticmethod
@@ -160,7 +161,7 @@ class SessionManager:
         
         # Disconnect from MikroTik
         try:
-            mikrotik_service.disconnect_user(session.username)
+            await mikrotik_fleet.for_nas(session.nas_ip_address).disconnect_user(session.username)
         except Exception as e:
             logger.error(f"Failed to disconnect user from MikroTik: {e}")
         
@@ -168,73 +169,384 @@ class SessionManager:
         return True
     
     @staticmethod
-    async def check_expired_plans(db: AsyncSession):
-        """Check and deactivate expired plans"""
-        
-        # Get expired plans
-        result = await db.execute(
-            select(UserPlan).where(
+    async def check_expired_plans(
+        db: AsyncSession,
+        chunk_size: int = settings.PLAN_EXPIRY_CHUNK_SIZE
+    ) -> int:
+        """Deactivate expired plans in set-based chunks.
+
+        Each chunk is one transaction: claim up to ``chunk_size`` expired
+        plans with SKIP LOCKED, close their sessions, and disable users left
+        without an active plan. Router updates run after the commit, as one
+        batched call per NAS, so row locks are never held across router I/O.
+        """
+        total = 0
+        while True:
+            expired = (
+                select(UserPlan.id)
+                .where(
+                    and_(
+                        UserPlan.is_active == True,
+                        UserPlan.expires_at <= func.now()
+                    )
+                )
+                .order_by(UserPlan.id)
+                .limit(chunk_size)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            result = await db.execute(
+                update(UserPlan)
+                .where(UserPlan.id.in_(expired))
+                .values(is_active=False)
+                .returning(UserPlan.id, UserPlan.user_id)
+                .execution_options(synchronize_session=False)
+            )
+            rows = result.all()
+            if not rows:
+                break
+
+            plan_ids = [plan_id for plan_id, _ in rows]
+            user_ids = {user_id for _, user_id in rows}
+
+            # Users who still hold another plan stay enabled
+            still_active = select(UserPlan.user_id).where(
                 and_(
+                    UserPlan.user_id.in_(user_ids),
                     UserPlan.is_active == True,
-                    UserPlan.expires_at <= datetime.utcnow()
+                    or_(UserPlan.expires_at.is_(None), UserPlan.expires_at > func.now())
                 )
             )
-        )
-        expired_plans = result.scalars().all()
-        
-        for user_plan in expired_plans:
-            # Deactivate plan
-            user_plan.is_active = False
-            
-            # Get user
             result = await db.execute(
-                select(User).where(User.id == user_plan.user_id)
-            )
-            user = result.scalar_one_or_none()
-            
-            if user:
-                # Terminate all active sessions
-                result = await db.execute(
-                    select(Session).where(
-                        and_(
-                            Session.user_id == user.id,
-                            Session.is_active == True
+                select(User.id, User.username).where(
+                    and_(User.id.in_(user_ids), User.id.not_in(still_active))
+                )
+            )
+            lapsed = dict(result.all())
+
+            result = await db.execute(
+                update(Session)
+                .where(
+                    and_(
+                        Session.is_active == True,
+                        or_(
+                            Session.user_plan_id.in_(plan_ids),
+                            Session.user_id.in_(list(lapsed))
                         )
                     )
                 )
-                active_sessions = result.scalars().all()
-                
-                for session in active_sessions:
-                    await SessionManager.terminate_session(
-                        db,
-                        session.session_id,
-                        "Plan-Expired"
-                    )
-                
-                # Disable user in MikroTik
-                try:
-                    mikrotik_service.update_hotspot_user(
-                        username=user.username,
-                        disabled=True
+                .values(
+                    is_active=False,
+                    stopped_at=func.now(),
+                    termination_cause="Plan-Expired",
+                    session_duration=cast(func.extract("epoch", func.now() - Session.started_at), Integer)
+                )
+                .returning(Session.username, Session.nas_ip_address)
+                .execution_options(synchronize_session=False)
+            )
+            closed = result.all()
+            live_stats.record(db, ended=[nas_ip for _, nas_ip in closed])
+            targets = {(username, nas_ip) for username, nas_ip in closed if username}
+            await db.commit()
+
+            if lapsed:
+                await mikrotik_fleet.bulk_update_hotspot_users(
+                    [{"username": username, "disabled": True} for username in lapsed.values()]
+                )
+            await mikrotik_fleet.disconnect_sessions(targets)
+
+            total += len(rows)
+            logger.info(
+                f"Deactivated {len(rows)} expired plans, closed {len(targets)} sessions, "
+                f"disabled {len(lapsed)} users"
+            )
+            if len(rows) < chunk_size:
+                break
+
+        return total
+    
+    @staticmethod
+    async def reap_idle_sessions(
+        db: AsyncSession,
+        timeout: int = settings.INACTIVE_SESSION_TIMEOUT,
+        chunk_size: int = settings.PLAN_EXPIRY_CHUNK_SIZE
+    ) -> int:
+        """Close sessions with no accounting activity for ``timeout`` seconds.
+
+        A session's row is touched by every accounting flush, so
+        ``updated_at`` is its last activity. Closed sessions end at that
+        time and are disconnected on their router in case they are still
+        online but no longer reporting.
+        """
+        last_seen = func.coalesce(Session.updated_at, Session.started_at)
+        total = 0
+        while True:
+            idle = (
+                select(Session.id)
+                .where(
+                    and_(
+                        Session.is_active == True,
+                        last_seen < func.now() - timedelta(seconds=timeout)
                     )
-                except Exception as e:
-                    logger.error(f"Failed to disable user in MikroTik: {e}")
-            
-            logger.info(f"Deactivated expired plan for user {user_plan.user_id}")
-        
-        await db.commit()
-        return len(expired_plans)
+                )
+                .order_by(Session.id)
+                .limit(chunk_size)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            result = await db.execute(
+                update(Session)
+                .where(Session.id.in_(idle))
+                .values(
+                    is_active=False,
+                    stopped_at=last_seen,
+                    termination_cause="Idle-Timeout",
+                    session_duration=cast(func.extract("epoch", last_seen - Session.started_at), Integer)
+                )
+                .returning(Session.username, Session.nas_ip_address)
+                .execution_options(synchronize_session=False)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            live_stats.record(db, ended=[nas_ip for _, nas_ip in rows])
+            await db.commit()
+
+            await mikrotik_fleet.disconnect_sessions(
+                {(username, nas_ip) for username, nas_ip in rows if username}
+            )
+            total += len(rows)
+            logger.info(f"Closed {len(rows)} idle sessions")
+            if len(rows) < chunk_size:
+                break
+
+        return total
     
     @staticmethod
-    async def get_active_sessions_count(db: AsyncSession) -> int:
-        """Get count of active sessions"""
-        from sqlalchemy import func as sql_func
-        
+    async def bulk_start_sessions(
+        db: AsyncSession,
+        records: List["AccountingRecord"]
+    ) -> int:
+        """Insert sessions for a batch of RADIUS Accounting-Start records"""
+        if not records:
+            return 0
+
+        # Logins the reconciler already recorded get their id rather than a second row
+        await adopt_sessions(db, [(r.nas_ip, r.session_id, r.username, r.mac_address) for r in records])
+
+        # Skip retransmitted starts, and adopted sessions, we already know about
+        keys = [(r.nas_ip, r.session_id) for r in records]
         result = await db.execute(
-            select(sql_func.count(Session.id)).where(Session.is_active == True)
+            select(Session.nas_ip_address, Session.session_id).where(
+                tuple_(Session.nas_ip_address, Session.session_id).in_(keys)
+            )
         )
-        count = result.scalar()
-        return count or 0
+        existing = set(result.all())
+        records = [r for r in records if (r.nas_ip, r.session_id) not in existing]
+        if not records:
+            return 0
+
+        # Resolve users and their active plans in one round trip
+        usernames = {r.username for r in records}
+        result = await db.execute(
+            select(User.id, User.username, UserPlan.id)
+            .outerjoin(
+                UserPlan,
+                and_(
+                    UserPlan.user_id == User.id,
+                    UserPlan.is_active == True,
+                    UserPlan.expires_at > datetime.utcnow()
+                )
+            )
+            .where(User.username.in_(usernames))
+        )
+        users: Dict[str, tuple] = {}
+        for user_id, username, user_plan_id in result.all():
+            users.setdefault(username, (user_id, user_plan_id))
+
+        rows = []
+        for record in records:
+            if record.username not in users:
+                logger.warning(f"Accounting-Start for unknown user {record.username}")
+                continue
+            user_id, user_plan_id = users[record.username]
+            rows.append({
+                "session_id": record.session_id,
+                "user_id": user_id,
+                "username": record.username,
+                "nas_ip_address": record.nas_ip,
+                "ip_address": record.framed_ip,
+                "mac_address": record.mac_address,
+                "user_plan_id": user_plan_id,
+                "upload_bytes": record.upload_bytes,
+                "download_bytes": record.download_bytes,
+                "bytes_used": record.upload_bytes + record.download_bytes,
+                "session_duration": record.session_time,
+                "active": True,
+                "started_at": record.received_at,
+            })
+
+        if rows:
+            await db.execute(insert(Session.__table__), rows)
+            live_stats.record(db, started=[row["nas_ip_address"] for row in rows])
+        return len(rows)
+
+    @staticmethod
+    async def bulk_update_usage(
+        db: AsyncSession,
+        records: List["AccountingRecord"],
+        stop: bool = False
+    ) -> int:
+        """Apply a batch of Interim-Update (or Stop) counters with one executemany"""
+        if not records:
+            return 0
+
+        sessions = Session.__table__
+        values = {
+            "upload_bytes": bindparam("b_upload"),
+            "download_bytes": bindparam("b_download"),
+            "bytes_used": bindparam("b_total"),
+            "session_duration": bindparam("b_time"),
+        }
+        if stop:
+            values.update(
+                active=False,
+                ended_at=bindparam("b_at"),
+                termination_cause=bindparam("b_cause"),
+            )
+
+        stmt = (
+            update(sessions)
+            .where(
+                and_(
+                    sessions.c.session_id == bindparam("b_session_id"),
+                    sessions.c.nas_ip_address == bindparam("b_nas_ip"),
+                    sessions.c.active == True
+                )
+            )
+            .values(**values)
+        )
+        params = [
+            {
+                "b_session_id": r.session_id,
+                "b_nas_ip": r.nas_ip,
+                "b_upload": r.upload_bytes,
+                "b_download": r.download_bytes,
+                "b_total": r.upload_bytes + r.download_bytes,
+                "b_time": r.session_time,
+                "b_at": r.received_at,
+                "b_cause": r.terminate_cause,
+            }
+            for r in records
+        ]
+        if stop:
+            # executemany can't return rows; find the sessions this closes first
+            result = await db.execute(
+                select(Session.nas_ip_address).where(
+                    and_(
+                        tuple_(Session.nas_ip_address, Session.session_id).in_(
+                            [(r.nas_ip, r.session_id) for r in records]
+                        ),
+                        Session.is_active == True
+                    )
+                )
+            )
+            live_stats.record(db, ended=result.scalars().all())
+        await db.execute(stmt, params)
+        return len(params)
+
+    @staticmethod
+    async def refresh_plan_usage(
+        db: AsyncSession,
+        records: Iterable["AccountingRecord"]
+    ) -> List[int]:
+        """Recompute data usage for the plans behind a batch of sessions.
+
+        Returns the ids of data-capped plans that are now exhausted.
+        """
+        keys = list({(r.nas_ip, r.session_id) for r in records})
+        if not keys:
+            return []
+
+        result = await db.execute(
+            select(Session.user_plan_id).distinct().where(
+                and_(
+                    tuple_(Session.nas_ip_address, Session.session_id).in_(keys),
+                    Session.user_plan_id.is_not(None)
+                )
+            )
+        )
+        plan_ids = list(result.scalars().all())
+        if not plan_ids:
+            return []
+
+        used_mb = (
+            select(func.coalesce(func.sum(Session.bytes_used), 0) // (1024 * 1024))
+            .where(Session.user_plan_id == UserPlan.id)
+            .correlate(UserPlan)
+            .scalar_subquery()
+        )
+        # used + remaining is the plan's data limit, so the new remaining
+        # balance can be derived without joining the plan
+        stmt = (
+            update(UserPlan)
+            .where(UserPlan.id.in_(plan_ids))
+            .values(
+                data_used_mb=used_mb,
+                data_remaining_mb=case(
+                    (UserPlan.data_remaining_mb.is_(None), None),
+                    else_=func.greatest(
+                        0,
+                        UserPlan.data_remaining_mb + func.coalesce(UserPlan.data_used_mb, 0) - used_mb
+                    )
+                )
+            )
+            .returning(UserPlan.id, UserPlan.data_remaining_mb)
+            .execution_options(synchronize_session=False)
+        )
+        result = await db.execute(stmt)
+        return [
+            plan_id for plan_id, remaining in result.all()
+            if remaining is not None and remaining <= 0
+        ]
+
+    @staticmethod
+    async def terminate_plan_sessions(
+        db: AsyncSession,
+        user_plan_ids: List[int],
+        termination_cause: str
+    ) -> int:
+        """Terminate every active session running on the given plans"""
+        if not user_plan_ids:
+            return 0
+
+        now = datetime.utcnow()
+        result = await db.execute(
+            update(Session)
+            .where(
+                and_(
+                    Session.user_plan_id.in_(user_plan_ids),
+                    Session.is_active == True
+                )
+            )
+            .values(is_active=False, stopped_at=now, termination_cause=termination_cause)
+            .returning(Session.username, Session.nas_ip_address)
+            .execution_options(synchronize_session=False)
+        )
+        closed = result.all()
+        live_stats.record(db, ended=[nas_ip for _, nas_ip in closed])
+        targets = {(username, nas_ip) for username, nas_ip in closed if username}
+        await db.commit()
+
+        await mikrotik_fleet.disconnect_sessions(targets)
+
+        logger.info(f"Terminated {len(targets)} sessions ({termination_cause})")
+        return len(targets)
+
+    @staticmethod
+    async def get_active_sessions_count(db: AsyncSession) -> int:
+        """Get count of active sessions, from the live counters"""
+        return (await live_stats.snapshot())["active_sessions"]
 
 
 # Singleton instance
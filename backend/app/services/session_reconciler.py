@@ -0,0 +1,335 @@
+import hashlib
+import logging
+import re
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import and_, bindparam, cast, func, insert, literal, select, tuple_, update, Integer
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.config import settings
+from ..core.redis import publish_stats
+from ..database import AsyncSessionLocal
+from ..models.plan import UserPlan
+from ..models.session import Session
+from ..models.user import User, UserStatus
+from .live_stats import live_stats
+from .mikrotik import mikrotik_fleet
+
+logger = logging.getLogger(__name__)
+
+# (username, MAC address) identifies a hotspot login on one router
+SessionIdentity = Tuple[str, str]
+
+# (NAS IP, Acct-Session-Id, username, MAC address) from an accounting record
+AccountedSession = Tuple[str, str, Optional[str], Optional[str]]
+
+
+def _normalize_mac(mac: Optional[str]) -> str:
+    return (mac or "").upper().replace("-", ":")
+
+
+# RouterOS durations, e.g. "3w1d", "1h2m3s" or "450ms"
+_UPTIME_PART = re.compile(r"(\d+)(ms|[wdhms])")
+_UPTIME_UNITS = {"w": 604800, "d": 86400, "h": 3600, "m": 60, "s": 1, "ms": 0.001}
+
+
+def _parse_uptime(value: Optional[str]) -> Optional[float]:
+    """Seconds in a RouterOS duration, or None if it isn't one"""
+    if not value:
+        return None
+    parts = _UPTIME_PART.findall(value)
+    if "".join(number + unit for number, unit in parts) != value:
+        return None
+    return sum(int(number) * _UPTIME_UNITS[unit] for number, unit in parts)
+
+
+def _fingerprint(identities: List[SessionIdentity]) -> str:
+    """Order-independent digest of an active set; matches ``_db_fingerprint``"""
+    return hashlib.md5(
+        ",".join(sorted(f"{username}|{mac}" for username, mac in identities)).encode()
+    ).hexdigest()
+
+
+# Same digest computed in Postgres. COLLATE "C" sorts by byte, which for
+# UTF-8 is the code point order Python's sorted() uses.
+_identity = func.coalesce(Session.username, "").concat("|").concat(
+    func.upper(func.replace(func.coalesce(Session.mac_address, ""), "-", ":"))
+)
+_db_fingerprint = func.md5(
+    func.string_agg(_identity, aggregate_order_by(literal(","), _identity.collate("C")))
+)
+
+
+async def adopt_sessions(db: AsyncSession, sessions: List[AccountedSession]) -> int:
+    """Give reconciler-recorded rows the Acct-Session-Id RADIUS reports for them.
+
+    The reconciler records logins it finds on a router without a session
+    id, since RouterOS doesn't expose it. Accounting for a session with no
+    row of its own takes over an active row without one for the same login
+    on the same NAS, instead of a second row being started. Returns the
+    number of rows adopted.
+    """
+    sessions = [s for s in sessions if s[2]]
+    if not sessions:
+        return 0
+
+    result = await db.execute(
+        select(Session.nas_ip_address, Session.session_id).where(
+            tuple_(Session.nas_ip_address, Session.session_id).in_([(s[0], s[1]) for s in sessions])
+        )
+    )
+    existing = set(result.all())
+    sessions = [s for s in sessions if (s[0], s[1]) not in existing]
+    if not sessions:
+        return 0
+
+    result = await db.execute(
+        select(Session.id, Session.nas_ip_address, Session.username, Session.mac_address)
+        .where(
+            and_(
+                Session.session_id.is_(None),
+                Session.is_active == True,
+                Session.nas_ip_address.in_({s[0] for s in sessions}),
+                Session.username.in_({s[2] for s in sessions})
+            )
+        )
+        .order_by(Session.id)
+    )
+    orphans: Dict[Tuple[str, str, str], List[int]] = {}
+    for row_id, nas_ip, username, mac in result.all():
+        orphans.setdefault((nas_ip, username, _normalize_mac(mac)), []).append(row_id)
+
+    params = []
+    for nas_ip, session_id, username, mac in dict.fromkeys(sessions):
+        row_ids = orphans.get((nas_ip, username, _normalize_mac(mac)))
+        if row_ids:
+            params.append({"b_id": row_ids.pop(0), "b_session_id": session_id})
+    if params:
+        sessions_table = Session.__table__
+        await db.execute(
+            update(sessions_table)
+            .where(and_(sessions_table.c.id == bindparam("b_id"), sessions_table.c.session_id.is_(None)))
+            .values(session_id=bindparam("b_session_id")),
+            params
+        )
+        logger.info(f"Adopted {len(params)} reconciled sessions")
+    return len(params)
+
+
+class SessionReconciler:
+    """Corrects drift between the sessions table and the routers.
+
+    Each run reads every router's active list concurrently and compares an
+    order-independent fingerprint of it with the same fingerprint of the
+    router's active sessions computed in Postgres. Only routers whose
+    fingerprints differ are diffed row by row. Sessions the router no
+    longer has are closed; logins the database doesn't know about are
+    recorded if the user is entitled to be online and disconnected
+    otherwise. Rows and logins younger than ``grace`` are left alone, since
+    their RADIUS accounting may not have arrived yet. Corrections are
+    applied with one statement each.
+    """
+
+    def __init__(self, grace: int = settings.SESSION_RECONCILE_GRACE):
+        self.grace = grace
+        self.stats = {
+            "runs": 0,
+            "routers": 0,
+            "unreachable": 0,
+            "in_sync": 0,
+            "diffed": 0,
+            "started": 0,
+            "stopped": 0,
+            "disconnected": 0,
+            "last_run_at": None,
+            "last_run_seconds": 0.0,
+        }
+
+    async def run_once(self) -> int:
+        """Reconcile every reachable router; returns the number of corrections"""
+        started = time.monotonic()
+        fetched_at = datetime.utcnow()
+        active = await mikrotik_fleet.get_active_sessions()
+        # Without registered routers the default router serves every NAS
+        per_nas = bool(mikrotik_fleet.routers)
+
+        routers: Dict[str, List[Dict]] = {}
+        for nas_ip, entries in active.items():
+            if entries is None:
+                logger.warning(f"Skipping reconciliation of unreachable router {nas_ip}")
+                self.stats["unreachable"] += 1
+                continue
+            routers[nas_ip] = [e for e in entries if e.get("user")]
+
+        corrections = 0
+        async with AsyncSessionLocal() as db:
+            db_fingerprints = await self._db_fingerprints(db, per_nas)
+            changed = [
+                nas_ip for nas_ip, entries in routers.items()
+                if _fingerprint([(e["user"], _normalize_mac(e.get("mac-address"))) for e in entries])
+                != db_fingerprints.get(nas_ip if per_nas else None, _fingerprint([]))
+            ]
+            self.stats["in_sync"] += len(routers) - len(changed)
+            self.stats["diffed"] += len(changed)
+            if changed:
+                corrections = await self._reconcile(
+                    db, {nas_ip: routers[nas_ip] for nas_ip in changed}, per_nas, fetched_at
+                )
+
+        elapsed = time.monotonic() - started
+        self.stats.update(
+            runs=self.stats["runs"] + 1,
+            routers=len(active),
+            last_run_at=fetched_at.isoformat(),
+            last_run_seconds=elapsed,
+        )
+        await publish_stats("session_reconciliation", self.stats)
+        if changed:
+            logger.info(
+                f"Reconciled {len(changed)} of {len(routers)} routers with "
+                f"{corrections} corrections in {elapsed:.2f}s"
+            )
+        return corrections
+
+    @staticmethod
+    async def _db_fingerprints(db: AsyncSession, per_nas: bool) -> Dict[Optional[str], str]:
+        stmt = select(
+            Session.nas_ip_address if per_nas else literal(None),
+            _db_fingerprint
+        ).where(Session.is_active == True)
+        if per_nas:
+            stmt = stmt.group_by(Session.nas_ip_address)
+        result = await db.execute(stmt)
+        return {nas_ip: digest for nas_ip, digest in result.all() if digest is not None}
+
+    async def _reconcile(
+        self,
+        db: AsyncSession,
+        routers: Dict[str, List[Dict]],
+        per_nas: bool,
+        fetched_at: datetime
+    ) -> int:
+        stmt = select(
+            Session.id, Session.nas_ip_address, Session.username, Session.mac_address, Session.started_at
+        ).where(Session.is_active == True)
+        if per_nas:
+            stmt = stmt.where(Session.nas_ip_address.in_(list(routers)))
+        result = await db.execute(stmt)
+
+        known: Dict[str, Dict[SessionIdentity, List]] = {nas_ip: {} for nas_ip in routers}
+        default_nas = next(iter(routers))
+        for row in result.all():
+            nas_ip = row.nas_ip_address if per_nas else default_nas
+            identity = (row.username or "", _normalize_mac(row.mac_address))
+            known[nas_ip].setdefault(identity, []).append(row)
+
+        stop_ids: List[int] = []
+        unknown: List[Tuple[str, Dict]] = []
+        recent = fetched_at - timedelta(seconds=self.grace)
+        for nas_ip, entries in routers.items():
+            rows_by_identity = known[nas_ip]
+            online = Counter()
+            for entry in entries:
+                identity = (entry["user"], _normalize_mac(entry.get("mac-address")))
+                online[identity] += 1
+                if online[identity] > len(rows_by_identity.get(identity, ())):
+                    # Too new to be unknown; its Accounting-Start may still be on the way
+                    uptime = _parse_uptime(entry.get("uptime"))
+                    if uptime is None or uptime >= self.grace:
+                        unknown.append((nas_ip, entry))
+            for identity, rows in rows_by_identity.items():
+                # Keep the newest rows for logins still online; close the rest
+                rows.sort(key=lambda r: r.started_at.replace(tzinfo=None) if r.started_at else recent, reverse=True)
+                for row in rows[online[identity]:]:
+                    # Too new to be missing; the router list may predate the login
+                    if row.started_at is not None and row.started_at.replace(tzinfo=None) < recent:
+                        stop_ids.append(row.id)
+
+        if stop_ids:
+            result = await db.execute(
+                update(Session)
+                .where(and_(Session.id.in_(stop_ids), Session.is_active == True))
+                .values(
+                    is_active=False,
+                    stopped_at=func.now(),
+                    termination_cause="Lost-Service",
+                    session_duration=cast(func.extract("epoch", func.now() - Session.started_at), Integer)
+                )
+                .returning(Session.nas_ip_address)
+                .execution_options(synchronize_session=False)
+            )
+            live_stats.record(db, ended=result.scalars().all())
+
+        starts, disconnects = await self._resolve_unknown(db, unknown)
+        if starts:
+            await db.execute(insert(Session.__table__), starts)
+            live_stats.record(db, started=[row["nas_ip_address"] for row in starts])
+        await db.commit()
+
+        if disconnects:
+            await mikrotik_fleet.disconnect_sessions(disconnects)
+
+        self.stats["stopped"] += len(stop_ids)
+        self.stats["started"] += len(starts)
+        self.stats["disconnected"] += len(disconnects)
+        return len(stop_ids) + len(starts) + len(disconnects)
+
+    @staticmethod
+    async def _resolve_unknown(
+        db: AsyncSession,
+        unknown: List[Tuple[str, Dict]]
+    ) -> Tuple[List[Dict], List[Tuple[str, str]]]:
+        """Split logins missing from the database into rows to insert and users to disconnect"""
+        if not unknown:
+            return [], []
+
+        usernames = {entry["user"] for _, entry in unknown}
+        result = await db.execute(
+            select(User.id, User.username, UserPlan.id)
+            .join(
+                UserPlan,
+                and_(
+                    UserPlan.user_id == User.id,
+                    UserPlan.is_active == True,
+                    UserPlan.expires_at > datetime.utcnow()
+                )
+            )
+            .where(and_(User.username.in_(usernames), User.status == UserStatus.ACTIVE))
+        )
+        entitled: Dict[str, Tuple[int, int]] = {}
+        for user_id, username, user_plan_id in result.all():
+            entitled.setdefault(username, (user_id, user_plan_id))
+
+        starts, disconnects = [], []
+        now = datetime.utcnow()
+        for nas_ip, entry in unknown:
+            username = entry["user"]
+            if username not in entitled:
+                disconnects.append((username, nas_ip))
+                continue
+            user_id, user_plan_id = entitled[username]
+            upload = int(entry.get("bytes-in") or 0)
+            download = int(entry.get("bytes-out") or 0)
+            uptime = _parse_uptime(entry.get("uptime")) or 0
+            starts.append({
+                # RouterOS doesn't expose the Acct-Session-Id; accounting adopts the row
+                "session_id": None,
+                "user_id": user_id,
+                "username": username,
+                "nas_ip_address": nas_ip,
+                "ip_address": entry.get("address"),
+                "mac_address": entry.get("mac-address"),
+                "user_plan_id": user_plan_id,
+                "upload_bytes": upload,
+                "download_bytes": download,
+                "bytes_used": upload + download,
+                "active": True,
+                "started_at": now - timedelta(seconds=uptime),
+            })
+        return starts, disconnects
+
+
+# Singleton instance
+session_reconciler = SessionReconciler()
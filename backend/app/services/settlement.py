@@ -0,0 +1,428 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, and_, bindparam, func
+from ..core.config import settings
+from ..core.redis import publish_stats
+from ..database import AsyncSessionLocal
+from ..models.user import User
+from ..models.plan import Plan, UserPlan
+from ..models.transaction import Transaction, TransactionStatus, TransactionType, PaymentMethod
+from .live_stats import live_stats
+from .mikrotik import mikrotik_fleet
+from .payment import mpesa_service
+
+logger = logging.getLogger(__name__)
+
+
+def _build_user_plan(user: User, plan: Plan, transaction_id: Optional[int]) -> UserPlan:
+    # Calculate expiry
+    expires_at = None
+    if plan.validity_days:
+        expires_at = datetime.utcnow() + timedelta(days=plan.validity_days)
+    elif plan.validity_hours:
+        expires_at = datetime.utcnow() + timedelta(hours=plan.validity_hours)
+
+    return UserPlan(
+        user_id=user.id,
+        plan_id=plan.id,
+        is_active=True,
+        activated_at=datetime.utcnow(),
+        expires_at=expires_at,
+        data_remaining_mb=plan.data_limit_mb,
+        transaction_id=transaction_id
+    )
+
+
+async def activate_user_plan(
+    db: AsyncSession,
+    user: User,
+    plan: Plan,
+    transaction_id: Optional[int]
+) -> UserPlan:
+    """Create the user's plan, commit, then provision them on the routers.
+
+    Commits everything pending on ``db`` together with the plan.
+    """
+    user_plans = await activate_user_plans(db, [(user, plan, transaction_id)])
+    return user_plans[0]
+
+
+async def activate_user_plans(
+    db: AsyncSession,
+    activations: List[Tuple[User, Plan, Optional[int]]]
+) -> List[UserPlan]:
+    """Activate many plans with one commit and one bulk router sync.
+
+    Router I/O runs after the commit so no row locks are held across it.
+    Returning users usually still exist on the routers (disabled once
+    their last plan expired), so they are upserted and re-enabled rather
+    than added.
+    """
+    user_plans = [_build_user_plan(user, plan, txn_id) for user, plan, txn_id in activations]
+    db.add_all(user_plans)
+    await db.commit()
+
+    hotspot_users = {
+        user.username: {
+            'username': user.username,
+            'password': user.username,
+            'profile': plan.mikrotik_profile,
+            'mac_address': user.mac_address,
+            'disabled': False,
+        }
+        for user, plan, _ in activations
+        if plan.mikrotik_profile
+    }
+    if hotspot_users:
+        await mikrotik_fleet.bulk_upsert_hotspot_users(list(hotspot_users.values()))
+
+    return user_plans
+
+
+def _callback_metadata(callback: Dict) -> Dict:
+    items = (callback.get('CallbackMetadata') or {}).get('Item') or []
+    return {item.get('Name'): item.get('Value') for item in items}
+
+
+class SettlementQueue:
+    """Buffers M-Pesa STK callbacks and settles them in batches.
+
+    The callback endpoint only enqueues, so Safaricom's connection is never
+    held open for database or router work. Settlement claims transactions
+    with a conditional UPDATE on status, which makes duplicate callbacks
+    and provider retries no-ops. Anything lost here (e.g. on a crash) is
+    picked up again by reconciliation against query_transaction.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = settings.MPESA_SETTLEMENT_BATCH_SIZE,
+        max_wait: float = settings.MPESA_SETTLEMENT_MAX_WAIT,
+        max_pending: int = settings.MPESA_SETTLEMENT_QUEUE_SIZE
+    ):
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_task: Optional[asyncio.Task] = None
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+        return self._queue
+
+    def submit(self, callback: Dict) -> bool:
+        """Enqueue an stkCallback body; False when the queue is full"""
+        try:
+            self.queue.put_nowait(callback)
+            return True
+        except asyncio.QueueFull:
+            logger.warning("M-Pesa settlement queue is full")
+            return False
+
+    async def start(self):
+        self._worker_task = asyncio.create_task(self._worker())
+
+    async def stop(self):
+        """Stop the worker and settle whatever is still queued"""
+        if self._worker_task:
+            self._worker_task.cancel()
+            try:
+                await self._worker_task
+            except asyncio.CancelledError:
+                pass
+            self._worker_task = None
+
+        batch = []
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        if batch:
+            await self.settle(batch)
+
+    async def _next_batch(self) -> List[Dict]:
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _worker(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self.settle(batch)
+            except Exception as e:
+                logger.error(f"Failed to settle {len(batch)} M-Pesa callbacks: {e}")
+
+    async def settle(self, callbacks: List[Dict]) -> int:
+        """Settle a batch of stkCallback bodies; returns plans activated"""
+        # Deduplicate on CheckoutRequestID, provider retries carry the same result
+        completed: Dict[str, Dict] = {}
+        failed = set()
+        for callback in callbacks:
+            checkout_id = callback.get('CheckoutRequestID')
+            if not checkout_id:
+                continue
+            if str(callback.get('ResultCode')) == '0':
+                completed[checkout_id] = _callback_metadata(callback)
+                failed.discard(checkout_id)
+            elif checkout_id not in completed:
+                failed.add(checkout_id)
+
+        async with AsyncSessionLocal() as db:
+            return await self.apply_results(db, completed, failed)
+
+    @staticmethod
+    async def apply_results(
+        db: AsyncSession,
+        completed: Dict[str, Dict],
+        failed: Set[str]
+    ) -> int:
+        """Complete or fail pending transactions by provider reference.
+
+        ``completed`` maps provider references to callback metadata.
+        Only PENDING transactions are touched, so settling the same
+        reference twice has no effect.
+        """
+        claimed = []
+        now = datetime.utcnow()
+
+        if completed:
+            result = await db.execute(
+                update(Transaction)
+                .where(
+                    and_(
+                        Transaction.provider_ref.in_(list(completed)),
+                        Transaction.status == TransactionStatus.PENDING
+                    )
+                )
+                .values(status=TransactionStatus.COMPLETED, completed_at=now)
+                .returning(
+                    Transaction.id, Transaction.user_id, Transaction.plan_id, Transaction.provider_ref,
+                    Transaction.type, Transaction.amount
+                )
+                .execution_options(synchronize_session=False)
+            )
+            claimed = result.all()
+            live_stats.record(
+                db,
+                pending=-len(claimed),
+                completed=[(row.plan_id, row.amount) for row in claimed if row.type == TransactionType.PURCHASE]
+            )
+
+            receipts = [
+                {'b_id': row.id, 'b_receipt': str(completed[row.provider_ref].get('MpesaReceiptNumber'))}
+                for row in claimed
+                if completed[row.provider_ref].get('MpesaReceiptNumber')
+            ]
+            if receipts:
+                transactions = Transaction.__table__
+                await db.execute(
+                    update(transactions)
+                    .where(transactions.c.id == bindparam('b_id'))
+                    .values(provider_receipt=bindparam('b_receipt')),
+                    receipts
+                )
+
+        if failed:
+            result = await db.execute(
+                update(Transaction)
+                .where(
+                    and_(
+                        Transaction.provider_ref.in_(list(failed)),
+                        Transaction.status == TransactionStatus.PENDING
+                    )
+                )
+                .values(status=TransactionStatus.FAILED)
+                .returning(Transaction.id)
+                .execution_options(synchronize_session=False)
+            )
+            live_stats.record(db, pending=-len(result.all()))
+
+        activations = []
+        claimed = [row for row in claimed if row.user_id and row.plan_id]
+        if claimed:
+            result = await db.execute(select(User).where(User.id.in_({row.user_id for row in claimed})))
+            users = {user.id: user for user in result.scalars().all()}
+            result = await db.execute(select(Plan).where(Plan.id.in_({row.plan_id for row in claimed})))
+            plans = {plan.id: plan for plan in result.scalars().all()}
+
+            activations = [
+                (users[row.user_id], plans[row.plan_id], row.id)
+                for row in claimed
+                if row.user_id in users and row.plan_id in plans
+            ]
+
+        # Commits the status changes together with the new user plans
+        await activate_user_plans(db, activations)
+
+        logger.info(
+            f"Settled M-Pesa payments: {len(activations)} activated, {len(failed)} failed"
+        )
+        return len(activations)
+
+
+class _RateBudget:
+    """Spaces calls so no more than ``rate`` start per second"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class PaymentReconciler:
+    """Settles stale pending M-Pesa transactions by querying their status.
+
+    Callbacks can be lost, so pending transactions older than ``min_age``
+    are queried in parallel (bounded by ``concurrency`` and a ``rate``
+    budget in queries per second) and settled in bulk through the same
+    idempotent path as callbacks. Only a definitive non-zero ``ResultCode``
+    fails a payment; transport and auth errors leave it pending for the
+    next run. Transactions still unresolved after ``max_age`` are no longer
+    queried and are counted in ``needs_review`` for manual follow-up, since
+    the customer may well have paid. ``run_once`` is driven by the
+    scheduler, so only one worker queries the provider at a time; its
+    stats are published to Redis for the other workers to serve.
+    """
+
+    def __init__(
+        self,
+        interval: float = settings.MPESA_RECONCILE_INTERVAL,
+        min_age: int = settings.MPESA_RECONCILE_MIN_AGE,
+        max_age: int = settings.MPESA_RECONCILE_MAX_AGE,
+        batch_size: int = settings.MPESA_RECONCILE_BATCH_SIZE,
+        concurrency: int = settings.MPESA_RECONCILE_CONCURRENCY,
+        rate: float = settings.MPESA_RECONCILE_RATE
+    ):
+        self.interval = interval
+        self.min_age = min_age
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.rate = rate
+        self.stats = {
+            "runs": 0,
+            "queried": 0,
+            "completed": 0,
+            "failed": 0,
+            "unresolved": 0,
+            "errors": 0,
+            "needs_review": 0,
+            "last_run_at": None,
+            "last_run_seconds": 0.0,
+            "queries_per_second": 0.0,
+            "lag_seconds": 0.0,
+        }
+
+    async def _query(self, checkout_id: str, semaphore: asyncio.Semaphore, budget: _RateBudget) -> Dict:
+        async with semaphore:
+            await budget.acquire()
+            return await mpesa_service.query_transaction(checkout_id)
+
+    async def run_once(self) -> int:
+        """Query one batch of stale pending transactions and settle them"""
+        started = time.monotonic()
+        now = datetime.utcnow()
+        expire_before = now - timedelta(seconds=self.max_age)
+        unsettled = and_(
+            Transaction.payment_method == PaymentMethod.MPESA,
+            Transaction.status == TransactionStatus.PENDING,
+            Transaction.provider_ref.is_not(None)
+        )
+
+        async with AsyncSessionLocal() as db:
+            needs_review = (await db.execute(
+                select(func.count()).select_from(Transaction)
+                .where(unsettled, Transaction.created_at < expire_before)
+            )).scalar_one()
+            if needs_review and needs_review != self.stats["needs_review"]:
+                logger.warning(f"{needs_review} M-Pesa payments unresolved after {self.max_age}s need manual review")
+            self.stats["needs_review"] = needs_review
+
+            result = await db.execute(
+                select(Transaction.provider_ref, Transaction.created_at)
+                .where(
+                    unsettled,
+                    Transaction.created_at >= expire_before,
+                    Transaction.created_at <= now - timedelta(seconds=self.min_age)
+                )
+                .order_by(Transaction.created_at)
+                .limit(self.batch_size)
+            )
+            pending = result.all()
+            if not pending:
+                self.stats["lag_seconds"] = 0.0
+                await publish_stats("payment_reconciliation", self.stats)
+                return 0
+
+            oldest = pending[0].created_at.replace(tzinfo=None)
+            self.stats["lag_seconds"] = (now - oldest).total_seconds()
+
+            semaphore = asyncio.Semaphore(self.concurrency)
+            budget = _RateBudget(self.rate)
+            responses = await asyncio.gather(
+                *(self._query(ref, semaphore, budget) for ref, _ in pending),
+                return_exceptions=True
+            )
+
+            completed: Dict[str, Dict] = {}
+            failed: Set[str] = set()
+            for (ref, _), response in zip(pending, responses):
+                if isinstance(response, Exception) or response.get("success") is False:
+                    # Transport or auth failure says nothing about the payment
+                    self.stats["errors"] += 1
+                    continue
+                result_code = response.get("ResultCode")
+                if result_code is None:
+                    # No final answer yet (e.g. "being processed")
+                    continue
+                if str(result_code) == "0":
+                    completed[ref] = {}
+                else:
+                    failed.add(ref)
+
+            await SettlementQueue.apply_results(db, completed, failed)
+
+        elapsed = time.monotonic() - started
+        unresolved = len(pending) - len(completed) - len(failed)
+        self.stats.update(
+            runs=self.stats["runs"] + 1,
+            queried=self.stats["queried"] + len(pending),
+            completed=self.stats["completed"] + len(completed),
+            failed=self.stats["failed"] + len(failed),
+            unresolved=unresolved,
+            last_run_at=now.isoformat(),
+            last_run_seconds=elapsed,
+            queries_per_second=len(pending) / elapsed if elapsed else 0.0,
+        )
+        await publish_stats("payment_reconciliation", self.stats)
+        logger.info(
+            f"Reconciled {len(pending)} pending M-Pesa payments: "
+            f"{len(completed)} completed, {len(failed)} failed, {unresolved} unresolved"
+        )
+        return len(pending)
+
+
+# Singleton instances
+settlement_queue = SettlementQueue()
+payment_reconciler = PaymentReconciler()
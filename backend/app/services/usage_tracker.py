@@ -0,0 +1,400 @@
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+from sqlalchemy import BigInteger, DateTime, Integer, String, and_, bindparam, column, func, select, tuple_, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.config import settings
+from ..core.redis import get_redis
+from ..models.plan import UserPlan
+from ..models.session import Session
+from .live_stats import live_stats
+from .session_reconciler import adopt_sessions
+
+if TYPE_CHECKING:
+    from .radius import AccountingRecord
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+DIRTY_SESSIONS = "usage:dirty:s"
+DIRTY_PLANS = "usage:dirty:p"
+
+# Drop a session's counters after this many flushes without a matching row
+MAX_FLUSH_MISSES = 5
+
+# Record cumulative session counters and charge the delta to the session's
+# plan. Returns {status, plan}: status -1 means the session is not yet bound
+# to a plan, 1 means this update exhausted the plan.
+APPLY_SCRIPT = """
+local key = KEYS[1]
+if redis.call('HGET', key, 'stopped') == '1' then
+  return {0, 0}
+end
+local stop = ARGV[4] == '1'
+local session_time = tonumber(ARGV[3])
+-- Counters are cumulative; ignore reordered, older interim updates
+if not stop and session_time < tonumber(redis.call('HGET', key, 'time') or '-1') then
+  return {0, 0}
+end
+local total = tonumber(ARGV[1]) + tonumber(ARGV[2])
+local delta = total - tonumber(redis.call('HGET', key, 'total') or '0')
+if delta < 0 then
+  delta = 0
+end
+redis.call('HSET', key, 'up', ARGV[1], 'down', ARGV[2], 'total', total, 'time', session_time)
+if ARGV[9] ~= '' then
+  -- Who the session belongs to, for adopting a row the reconciler recorded
+  redis.call('HSET', key, 'user', ARGV[9], 'mac', ARGV[10])
+end
+if stop then
+  redis.call('HSET', key, 'stopped', '1', 'ended_at', ARGV[5], 'cause', ARGV[6])
+end
+redis.call('EXPIRE', key, ARGV[8])
+redis.call('SADD', KEYS[2], ARGV[7])
+
+local plan = redis.call('HGET', key, 'plan')
+if not plan then
+  return {-1, 0}
+end
+if plan == '0' then
+  return {0, 0}
+end
+local plan_key = 'usage:p:' .. plan
+if redis.call('EXISTS', plan_key) == 0 then
+  -- Plan counters were evicted; the flusher reseeds them and rebinds
+  redis.call('HDEL', key, 'plan')
+  return {-1, 0}
+end
+local used = redis.call('HINCRBY', plan_key, 'used', delta)
+redis.call('EXPIRE', plan_key, ARGV[8])
+redis.call('SADD', KEYS[3], plan)
+local limit = tonumber(redis.call('HGET', plan_key, 'limit'))
+if limit >= 0 and used >= limit and redis.call('HSETNX', plan_key, 'exhausted', '1') == 1 then
+  return {1, tonumber(plan)}
+end
+return {0, tonumber(plan)}
+"""
+
+# Attach a session to its plan, seeding the plan's counters from Postgres
+# if Redis has none, and charge the bytes not yet persisted.
+BIND_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 or redis.call('HEXISTS', KEYS[1], 'plan') == 1 then
+  return {0, 0}
+end
+redis.call('HSET', KEYS[1], 'plan', ARGV[1])
+if ARGV[1] == '0' then
+  return {0, 0}
+end
+if redis.call('EXISTS', KEYS[2]) == 0 then
+  redis.call('HSET', KEYS[2], 'limit', ARGV[2], 'used', ARGV[3])
+end
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+local delta = tonumber(redis.call('HGET', KEYS[1], 'total') or '0') - tonumber(ARGV[4])
+if delta < 0 then
+  delta = 0
+end
+local used = redis.call('HINCRBY', KEYS[2], 'used', delta)
+redis.call('SADD', KEYS[3], ARGV[1])
+local limit = tonumber(redis.call('HGET', KEYS[2], 'limit'))
+if limit >= 0 and used >= limit and redis.call('HSETNX', KEYS[2], 'exhausted', '1') == 1 then
+  return {1, tonumber(ARGV[1])}
+end
+return {0, tonumber(ARGV[1])}
+"""
+
+
+def _session_key(member: str) -> str:
+    return f"usage:s:{member}"
+
+
+def _plan_key(plan_id: int) -> str:
+    return f"usage:p:{plan_id}"
+
+
+def _member(nas_ip: str, session_id: str) -> str:
+    # NAS IPs never contain '|', so the first one separates the parts
+    return f"{nas_ip}|{session_id}"
+
+
+class UsageTracker:
+    """Write-behind usage accounting in Redis.
+
+    Each Interim-Update or Stop is one atomic script call that stores the
+    session's cumulative counters and charges the byte delta to its plan,
+    reporting the moment a data cap is reached. Touched sessions and plans
+    go into dirty sets, and ``flush`` persists them in bulk, so Postgres
+    writes scale with the flush interval rather than the packet rate.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = settings.RADIUS_ACCT_FLUSH_BATCH_SIZE,
+        ttl: int = settings.RADIUS_ACCT_COUNTER_TTL,
+        retry_interval: float = settings.RATE_LIMIT_REDIS_RETRY_INTERVAL
+    ):
+        self.batch_size = batch_size
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self._down_until = 0.0
+        self._apply = None
+        self._bind = None
+        self._script_client = None
+
+    @property
+    def enabled(self) -> bool:
+        return (
+            settings.RADIUS_ACCT_REDIS_COUNTERS
+            and get_redis() is not None
+            and time.monotonic() >= self._down_until
+        )
+
+    def mark_down(self, error: Exception):
+        """Stop using Redis for a while after an error"""
+        logger.warning(f"Usage counters falling back to in-memory buffering: {error}")
+        self._down_until = time.monotonic() + self.retry_interval
+
+    def _scripts(self, redis):
+        if self._script_client is not redis:
+            self._apply = redis.register_script(APPLY_SCRIPT)
+            self._bind = redis.register_script(BIND_SCRIPT)
+            self._script_client = redis
+
+    async def apply(self, record: "AccountingRecord", stop: bool = False) -> Optional[int]:
+        """Record an accounting update; returns the plan id if it just ran out of data"""
+        redis = get_redis()
+        self._scripts(redis)
+        member = _member(record.nas_ip, record.session_id)
+        status, plan_id = await self._apply(
+            keys=[_session_key(member), DIRTY_SESSIONS, DIRTY_PLANS],
+            args=[
+                record.upload_bytes,
+                record.download_bytes,
+                record.session_time,
+                1 if stop else 0,
+                record.received_at.isoformat(),
+                record.terminate_cause or "",
+                member,
+                self.ttl,
+                record.username or "",
+                record.mac_address or "",
+            ]
+        )
+        return plan_id if status == 1 else None
+
+    async def flush(self, db: AsyncSession) -> List[int]:
+        """Persist dirty session and plan counters.
+
+        Returns plans found exhausted while binding sessions to them.
+        """
+        redis = get_redis()
+        self._scripts(redis)
+        exhausted: List[int] = []
+
+        while True:
+            members = [m.decode() for m in await redis.spop(DIRTY_SESSIONS, self.batch_size) or []]
+            if not members:
+                break
+            try:
+                exhausted += await self._flush_sessions(db, redis, members)
+            except Exception:
+                await redis.sadd(DIRTY_SESSIONS, *members)
+                raise
+            if len(members) < self.batch_size:
+                break
+
+        while True:
+            plan_ids = [int(p) for p in await redis.spop(DIRTY_PLANS, self.batch_size) or []]
+            if not plan_ids:
+                break
+            try:
+                await self._flush_plans(db, redis, plan_ids)
+            except Exception:
+                await redis.sadd(DIRTY_PLANS, *plan_ids)
+                raise
+            if len(plan_ids) < self.batch_size:
+                break
+
+        return exhausted
+
+    async def _flush_sessions(self, db: AsyncSession, redis, members: List[str]) -> List[int]:
+        pipe = redis.pipeline(transaction=False)
+        for member in members:
+            pipe.hgetall(_session_key(member))
+        snapshots: Dict[str, Dict[str, str]] = {}
+        for member, data in zip(members, await pipe.execute()):
+            if data:
+                snapshots[member] = {k.decode(): v.decode() for k, v in data.items()}
+
+        # Bind before writing, so bytes already in Postgres are not charged twice
+        unbound = [m for m, snapshot in snapshots.items() if "plan" not in snapshot]
+        if unbound:
+            # A session whose start never arrived may have been recorded by the reconciler
+            await adopt_sessions(db, [
+                (*m.split("|", 1), snapshots[m].get("user"), snapshots[m].get("mac")) for m in unbound
+            ])
+        exhausted = await self._bind_sessions(db, redis, unbound) if unbound else []
+
+        updates = [m for m, snapshot in snapshots.items() if snapshot.get("stopped") != "1"]
+        stops = [m for m, snapshot in snapshots.items() if snapshot.get("stopped") == "1"]
+        matched = set()
+        for chunk, stop in ((updates, False), (stops, True)):
+            if chunk:
+                matched |= await self._write_sessions(db, [(m, snapshots[m]) for m in chunk], stop)
+        await db.commit()
+
+        # Rows that don't exist yet, e.g. a start still buffered on another worker
+        missing = [m for m in snapshots if m not in matched]
+        if missing:
+            pipe = redis.pipeline(transaction=False)
+            for member in missing:
+                pipe.hincrby(_session_key(member), "misses", 1)
+            misses = await pipe.execute()
+            retry = [m for m, count in zip(missing, misses) if count < MAX_FLUSH_MISSES]
+            if retry:
+                await redis.sadd(DIRTY_SESSIONS, *retry)
+            if len(retry) < len(missing):
+                logger.warning(f"Dropped usage for {len(missing) - len(retry)} unknown sessions")
+
+        return exhausted
+
+    async def _bind_sessions(self, db: AsyncSession, redis, members: List[str]) -> List[int]:
+        keys = [tuple(m.split("|", 1)) for m in members]
+        result = await db.execute(
+            select(Session.nas_ip_address, Session.session_id, Session.user_plan_id, Session.bytes_used)
+            .where(tuple_(Session.nas_ip_address, Session.session_id).in_(keys))
+        )
+        sessions = {_member(nas_ip, sid): (plan_id, bytes_used or 0) for nas_ip, sid, plan_id, bytes_used in result.all()}
+        plan_ids = {plan_id for plan_id, _ in sessions.values() if plan_id}
+
+        seeds: Dict[int, Tuple[int, int]] = {}
+        if plan_ids:
+            persisted = (
+                select(func.coalesce(func.sum(Session.bytes_used), 0))
+                .where(Session.user_plan_id == UserPlan.id)
+                .correlate(UserPlan)
+                .scalar_subquery()
+            )
+            result = await db.execute(
+                select(UserPlan.id, UserPlan.data_remaining_mb, UserPlan.data_used_mb, persisted)
+                .where(UserPlan.id.in_(plan_ids))
+            )
+            for plan_id, remaining_mb, used_mb, used_bytes in result.all():
+                # used + remaining is the plan's data limit; NULL remaining means uncapped
+                limit = -1 if remaining_mb is None else (remaining_mb + (used_mb or 0)) * MB
+                seeds[plan_id] = (limit, int(used_bytes))
+
+        exhausted = []
+        for member, (plan_id, bytes_used) in sessions.items():
+            plan_id = plan_id if plan_id in seeds else 0
+            limit, used = seeds.get(plan_id, (-1, 0))
+            status, _ = await self._bind(
+                keys=[_session_key(member), _plan_key(plan_id), DIRTY_PLANS],
+                args=[plan_id, limit, used, bytes_used, self.ttl]
+            )
+            if status == 1:
+                exhausted.append(plan_id)
+        return exhausted
+
+    @staticmethod
+    async def _write_sessions(db: AsyncSession, snapshots: List[Tuple[str, Dict[str, str]]], stop: bool) -> set:
+        sessions = Session.__table__
+        rows = []
+        for member, snapshot in snapshots:
+            nas_ip, session_id = member.split("|", 1)
+            row = (
+                session_id,
+                nas_ip,
+                int(snapshot.get("up", 0)),
+                int(snapshot.get("down", 0)),
+                int(snapshot.get("total", 0)),
+                int(snapshot.get("time", 0)),
+            )
+            if stop:
+                row += (datetime.fromisoformat(snapshot["ended_at"]), snapshot.get("cause") or None)
+            rows.append(row)
+
+        columns = [
+            column("session_id", String),
+            column("nas_ip", String),
+            column("upload", BigInteger),
+            column("download", BigInteger),
+            column("total", BigInteger),
+            column("duration", Integer),
+        ]
+        if stop:
+            columns += [column("ended_at", DateTime(timezone=True)), column("cause", String)]
+        batch = values(*columns, name="batch").data(rows)
+
+        changes = {
+            "upload_bytes": batch.c.upload,
+            "download_bytes": batch.c.download,
+            "bytes_used": batch.c.total,
+            "session_duration": batch.c.duration,
+        }
+        if stop:
+            # Sessions closed by an expiry sweep keep their original end
+            changes.update(
+                active=False,
+                ended_at=func.coalesce(sessions.c.ended_at, batch.c.ended_at),
+                termination_cause=func.coalesce(sessions.c.termination_cause, batch.c.cause),
+            )
+
+        conditions = [
+            sessions.c.session_id == batch.c.session_id,
+            sessions.c.nas_ip_address == batch.c.nas_ip
+        ]
+        returning = [sessions.c.nas_ip_address, sessions.c.session_id]
+        if stop:
+            # Self-join to see which sessions were still active before this update
+            previous = sessions.alias("previous")
+            conditions.append(previous.c.id == sessions.c.id)
+            returning.append(previous.c.active)
+
+        result = await db.execute(
+            update(sessions)
+            .where(and_(*conditions))
+            .values(**changes)
+            .returning(*returning)
+        )
+        rows = result.all()
+        if stop:
+            live_stats.record(db, ended=[row[0] for row in rows if row[2]])
+        return {_member(row[0], row[1]) for row in rows}
+
+    @staticmethod
+    async def _flush_plans(db: AsyncSession, redis, plan_ids: List[int]):
+        pipe = redis.pipeline(transaction=False)
+        for plan_id in plan_ids:
+            pipe.hmget(_plan_key(plan_id), "limit", "used")
+        capped, uncapped = [], []
+        for plan_id, (limit, used) in zip(plan_ids, await pipe.execute()):
+            if used is None:
+                continue
+            limit, used_mb = int(limit), int(used) // MB
+            if limit < 0:
+                uncapped.append({"b_id": plan_id, "b_used": used_mb})
+            else:
+                capped.append({"b_id": plan_id, "b_used": used_mb, "b_remaining": max(0, limit // MB - used_mb)})
+
+        user_plans = UserPlan.__table__
+        if capped:
+            await db.execute(
+                update(user_plans)
+                .where(user_plans.c.id == bindparam("b_id"))
+                .values(data_used_mb=bindparam("b_used"), data_remaining_mb=bindparam("b_remaining")),
+                capped
+            )
+        if uncapped:
+            await db.execute(
+                update(user_plans)
+                .where(user_plans.c.id == bindparam("b_id"))
+                .values(data_used_mb=bindparam("b_used")),
+                uncapped
+            )
+        await db.commit()
+
+
+# Singleton instance
+usage_tracker = UsageTracker()
@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Set, Tuple
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session as OrmSession
+from ..core.config import settings
+from ..core.redis import get_redis, listen
+from ..database import AsyncSessionLocal
+from ..models.user import User
+from ..schemas.auth import CurrentUser
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "auth:user:invalidate"
+
+# Columns get_current_user needs; changes to any of them invalidate the cache
+CACHED_FIELDS = ("username", "role", "status")
+
+# Store a freshly loaded user only if no invalidation bumped its generation
+# since the load started; otherwise a stale row could outlive the change.
+STORE_SCRIPT = """
+local generation = redis.call('GET', KEYS[2]) or ''
+if generation ~= ARGV[1] then
+  return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+class UserCache:
+    """Two-tier cache of authenticated users.
+
+    Lookups hit a per-process LRU first, then Redis, and only fall back to
+    the database on a miss in both. Role, status and username changes made
+    through the ORM invalidate both tiers on commit, and other processes
+    drop their local copy through Redis pub/sub.
+
+    Invalidations bump a generation (per user in Redis, per process
+    locally). A miss stores what it loaded only if the generation is the
+    one it saw before reading the database, so a load racing a status
+    change can't put the old row back.
+    """
+
+    def __init__(
+        self,
+        ttl: int = settings.AUTH_CACHE_TTL,
+        local_ttl: int = settings.AUTH_CACHE_LOCAL_TTL,
+        max_entries: int = settings.AUTH_CACHE_MAX_ENTRIES
+    ):
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.max_entries = max_entries
+        self._local: OrderedDict[int, Tuple[float, CurrentUser]] = OrderedDict()
+        # Bumped by every local eviction
+        self._generation = 0
+        self._store = None
+        self._script_client = None
+        self._listener: Optional[asyncio.Task] = None
+        self._pending: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"auth:user:{user_id}"
+
+    @staticmethod
+    def _generation_key(user_id: int) -> str:
+        return f"auth:user:{user_id}:generation"
+
+    def _script(self, redis):
+        if self._script_client is not redis:
+            self._store = redis.register_script(STORE_SCRIPT)
+            self._script_client = redis
+        return self._store
+
+    async def get(self, user_id: int) -> Optional[CurrentUser]:
+        """Return the cached principal for ``user_id``, loading it on a miss"""
+        entry = self._local.get(user_id)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._local.move_to_end(user_id)
+                return entry[1]
+            del self._local[user_id]
+
+        local_generation = self._generation
+        generation = None
+        redis = get_redis()
+        if redis is not None:
+            try:
+                cached, generation = await redis.mget(self._key(user_id), self._generation_key(user_id))
+                if cached is not None:
+                    user = CurrentUser.model_validate_json(cached)
+                    self._store_local(user, local_generation)
+                    return user
+            except Exception as e:
+                logger.warning(f"User cache Redis lookup failed: {e}")
+                redis = None
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(User.id, User.username, User.role, User.status).where(User.id == user_id)
+            )
+            row = result.one_or_none()
+        if row is None:
+            return None
+
+        user = CurrentUser.model_validate(row)
+        self._store_local(user, local_generation)
+        if redis is not None:
+            try:
+                await self._script(redis)(
+                    keys=[self._key(user_id), self._generation_key(user_id)],
+                    args=[generation or b"", user.model_dump_json(), self.ttl]
+                )
+            except Exception as e:
+                logger.warning(f"User cache Redis store failed: {e}")
+        return user
+
+    def _store_local(self, user: CurrentUser, generation: int):
+        if generation != self._generation:
+            # Something was evicted while this user was loading
+            return
+        self._local[user.id] = (time.monotonic() + self.local_ttl, user)
+        self._local.move_to_end(user.id)
+        if len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    def drop_local(self, user_ids: Iterable[int]):
+        """Evict users from this process only"""
+        self._generation += 1
+        for user_id in user_ids:
+            self._local.pop(user_id, None)
+
+    def _drop_all_local(self):
+        # Invalidations published while disconnected are lost
+        self._generation += 1
+        self._local.clear()
+
+    async def invalidate(self, user_ids: Iterable[int]):
+        """Evict users from every tier and every process"""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        self.drop_local(user_ids)
+
+        redis = get_redis()
+        if redis is None:
+            return
+        try:
+            pipe = redis.pipeline(transaction=True)
+            for user_id in user_ids:
+                pipe.incr(self._generation_key(user_id))
+                # Outlives any load that could have read the old generation
+                pipe.expire(self._generation_key(user_id), 2 * self.ttl)
+            pipe.delete(*(self._key(user_id) for user_id in user_ids))
+            await pipe.execute()
+            await redis.publish(INVALIDATION_CHANNEL, ",".join(str(user_id) for user_id in user_ids))
+        except Exception as e:
+            logger.error(f"User cache invalidation failed for {user_ids}: {e}")
+
+    def schedule_invalidation(self, user_ids: Set[int]):
+        """Invalidate from synchronous code running on the event loop"""
+        self.drop_local(user_ids)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(self.invalidate(user_ids))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def start(self):
+        """Subscribe to invalidations published by other processes"""
+        if get_redis() is not None and self._listener is None:
+            self._listener = asyncio.create_task(
+                listen(INVALIDATION_CHANNEL, self._on_invalidation, self._drop_all_local)
+            )
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    def _on_invalidation(self, data: bytes):
+        self.drop_local(int(user_id) for user_id in data.split(b","))
+
+
+# Singleton instance
+user_cache = UserCache()
+
+
+@event.listens_for(OrmSession, "after_flush")
+def _collect_changed_users(session, flush_context):
+    changed = session.info.setdefault("invalidated_user_ids", set())
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            state = inspect(obj)
+            if any(state.attrs[name].history.has_changes() for name in CACHED_FIELDS):
+                changed.add(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            changed.add(obj.id)
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _invalidate_changed_users(session):
+    changed = session.info.pop("invalidated_user_ids", None)
+    if changed:
+        user_cache.schedule_invalidation(changed)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _discard_changed_users(session):
+    session.info.pop("invalidated_user_ids", None)
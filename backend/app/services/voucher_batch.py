@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import List, Optional, Set
+from sqlalchemy import Integer, String, column, literal, select, table, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.config import settings
+from ..core.redis import get_redis
+from ..core.security import generate_voucher_codes
+from ..database import AsyncSessionLocal
+from ..models.voucher import Voucher, VoucherStatus
+from .voucher_redemption import issued_vouchers
+
+logger = logging.getLogger(__name__)
+
+STAGING_TABLE = "voucher_code_staging"
+
+# Give up if this many chunks in a row insert nothing new
+MAX_EMPTY_CHUNKS = 5
+
+_staging = table(STAGING_TABLE, column("code", String))
+
+
+@dataclass
+class VoucherBatchJob:
+    """Progress of one batch generation"""
+    batch_id: str
+    plan_id: int
+    quantity: int
+    created_by_user_id: Optional[int] = None
+    expires_at: Optional[datetime] = None
+    status: str = "pending"  # pending, running, completed, failed
+    generated: int = 0
+    collisions: int = 0
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+    @property
+    def progress(self) -> float:
+        return round(self.generated / self.quantity, 4) if self.quantity else 1.0
+
+
+class VoucherBatchGenerator:
+    """Generates voucher batches in the background.
+
+    Codes are generated in chunks, deduplicated in memory, COPY'd into a
+    temporary staging table and moved into ``vouchers`` with
+    ``INSERT ... ON CONFLICT DO NOTHING``. Codes that collide with
+    existing vouchers are simply regenerated in the next chunk. Each chunk
+    commits, so progress is visible and a failure keeps what was written.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = settings.VOUCHER_BATCH_CHUNK_SIZE,
+        code_length: int = settings.VOUCHER_CODE_LENGTH,
+        max_jobs: int = 100
+    ):
+        self.chunk_size = chunk_size
+        self.code_length = code_length
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, VoucherBatchJob]" = OrderedDict()
+        self._tasks: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def _key(batch_id: str) -> str:
+        return f"voucher_batch:{batch_id}"
+
+    def submit(
+        self,
+        plan_id: int,
+        quantity: int,
+        expires_at: Optional[datetime] = None,
+        created_by_user_id: Optional[int] = None
+    ) -> VoucherBatchJob:
+        """Start generating a batch and return its job immediately"""
+        job = VoucherBatchJob(
+            batch_id=uuid.uuid4().hex,
+            plan_id=plan_id,
+            quantity=quantity,
+            created_by_user_id=created_by_user_id,
+            expires_at=expires_at
+        )
+        self._jobs[job.batch_id] = job
+        while len(self._jobs) > self.max_jobs:
+            self._jobs.popitem(last=False)
+
+        task = asyncio.create_task(self.generate(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def get(self, batch_id: str) -> Optional[VoucherBatchJob]:
+        """Look up a job started by this or another worker"""
+        job = self._jobs.get(batch_id)
+        if job is not None:
+            return job
+
+        redis = get_redis()
+        if redis is None:
+            return None
+        try:
+            data = await redis.hgetall(self._key(batch_id))
+        except Exception as e:
+            logger.warning(f"Voucher batch lookup failed: {e}")
+            return None
+        if not data:
+            return None
+
+        values = {k.decode(): v.decode() for k, v in data.items()}
+        return VoucherBatchJob(
+            batch_id=batch_id,
+            plan_id=int(values["plan_id"]),
+            quantity=int(values["quantity"]),
+            status=values["status"],
+            generated=int(values["generated"]),
+            collisions=int(values["collisions"]),
+            error=values.get("error") or None,
+            created_at=datetime.fromisoformat(values["created_at"]),
+            finished_at=datetime.fromisoformat(values["finished_at"]) if values.get("finished_at") else None
+        )
+
+    async def _publish(self, job: VoucherBatchJob):
+        """Share progress with the other workers"""
+        redis = get_redis()
+        if redis is None:
+            return
+        mapping = {
+            k: (v.isoformat() if isinstance(v, datetime) else "" if v is None else str(v))
+            for k, v in asdict(job).items()
+        }
+        try:
+            await redis.hset(self._key(job.batch_id), mapping=mapping)
+            await redis.expire(self._key(job.batch_id), 86400)
+        except Exception as e:
+            logger.warning(f"Voucher batch progress publish failed: {e}")
+
+    async def generate(self, job: VoucherBatchJob):
+        """Generate all codes for ``job``"""
+        job.status = "running"
+        await self._publish(job)
+        seen: Set[str] = set()
+        empty_chunks = 0
+
+        try:
+            async with AsyncSessionLocal() as db:
+                while job.generated < job.quantity:
+                    wanted = min(self.chunk_size, job.quantity - job.generated)
+                    codes: List[str] = []
+                    for code in generate_voucher_codes(wanted, self.code_length):
+                        if code in seen:
+                            job.collisions += 1
+                        else:
+                            seen.add(code)
+                            codes.append(code)
+
+                    inserted = await self._insert_chunk(db, job, codes)
+                    await db.commit()
+                    await issued_vouchers.add(inserted)
+
+                    job.generated += len(inserted)
+                    job.collisions += len(codes) - len(inserted)
+                    empty_chunks = empty_chunks + 1 if not inserted else 0
+                    if empty_chunks >= MAX_EMPTY_CHUNKS:
+                        raise RuntimeError("Voucher code space exhausted")
+                    await self._publish(job)
+
+            job.status = "completed"
+            logger.info(f"Voucher batch {job.batch_id}: {job.generated} codes, {job.collisions} collisions")
+        except asyncio.CancelledError:
+            job.status = "failed"
+            job.error = "Cancelled during shutdown"
+            raise
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logger.error(f"Voucher batch {job.batch_id} failed after {job.generated} codes: {e}")
+        finally:
+            job.finished_at = datetime.utcnow()
+            await self._publish(job)
+
+    @staticmethod
+    async def _insert_chunk(db: AsyncSession, job: VoucherBatchJob, codes: List[str]) -> List[str]:
+        """Insert codes, returning those that did not collide with existing vouchers"""
+        if not codes:
+            return []
+
+        # Starts the transaction, so the COPY below joins it and the
+        # staging rows vanish on commit
+        await db.execute(text(
+            f"CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (code varchar(50)) ON COMMIT DELETE ROWS"
+        ))
+        connection = await db.connection()
+        raw = await connection.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            STAGING_TABLE, records=[(code,) for code in codes], columns=["code"]
+        )
+
+        vouchers = Voucher.__table__
+        stmt = insert(vouchers).from_select(
+            ["code", "plan_id", "status", "batch_id", "expires_at", "created_by_user_id"],
+            select(
+                _staging.c.code,
+                literal(job.plan_id, Integer),
+                literal(VoucherStatus.ACTIVE, vouchers.c.status.type),
+                literal(job.batch_id, vouchers.c.batch_id.type),
+                literal(job.expires_at, vouchers.c.expires_at.type),
+                literal(job.created_by_user_id, Integer),
+            )
+        ).on_conflict_do_nothing(index_elements=["code"]).returning(vouchers.c.code)
+        result = await db.execute(stmt)
+        return list(result.scalars())
+
+    async def stop(self):
+        """Cancel unfinished batches; chunks already committed are kept"""
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+# Singleton instance
+voucher_batch_generator = VoucherBatchGenerator()
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import re
+import time
+from datetime import datetime
+from typing import Iterable, Optional
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.bloom import BloomFilter
+from ..core.config import settings
+from ..core.redis import get_redis
+from ..core.security import generate_transaction_ref
+from ..database import AsyncSessionLocal
+from ..models.plan import Plan, UserPlan
+from ..models.transaction import Transaction, TransactionType, TransactionStatus, PaymentMethod
+from ..models.user import User
+from ..models.voucher import Voucher, VoucherStatus
+from .settlement import activate_user_plan
+
+logger = logging.getLogger(__name__)
+
+_NON_CODE_CHARS = re.compile(r"[^A-Z0-9]")
+
+
+def normalize_voucher_code(code: str) -> str:
+    """Canonical XXXX-XXXX-XXXX form of a code as typed by a user"""
+    raw = _NON_CODE_CHARS.sub("", code.upper())
+    return '-'.join([raw[i:i+4] for i in range(0, len(raw), 4)])
+
+
+class IssuedVoucherFilter:
+    """Bloom filter of every issued voucher code.
+
+    Lets redemption reject guessed codes without touching Postgres. New
+    batches are added as they are generated, and a periodic sync picks up
+    codes from the vouchers table by id. Until the first full sync has
+    completed every code is treated as possibly valid.
+
+    Redis may evict the bitmap on its own, so a sync also sets a marker bit
+    past the end of the filter. A bitmap without it (evicted, or recreated
+    by ``add`` since) counts as never synced and is rebuilt in full.
+    """
+
+    def __init__(
+        self,
+        capacity: int = settings.VOUCHER_FILTER_CAPACITY,
+        error_rate: float = settings.VOUCHER_FILTER_ERROR_RATE,
+        sync_interval: int = settings.VOUCHER_FILTER_SYNC_INTERVAL,
+        sync_overlap: int = settings.VOUCHER_BATCH_CHUNK_SIZE
+    ):
+        self.bloom = BloomFilter("vouchers", capacity, error_rate)
+        self.sync_interval = sync_interval
+        self.sync_overlap = sync_overlap
+        self._watermark_key = f"{self.bloom.key}:watermark"
+        self._synced_bit = self.bloom.size
+        self._local_watermark: Optional[int] = None
+        self._recent_until = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _get_watermark(self) -> Optional[int]:
+        """Highest voucher id in the filter, or None if it needs a full sync"""
+        redis = get_redis()
+        if redis is not None:
+            pipe = redis.pipeline(transaction=False)
+            pipe.get(self._watermark_key)
+            pipe.getbit(self.bloom.key, self._synced_bit)
+            value, synced = await pipe.execute()
+            if value is None:
+                return None
+            if not synced:
+                logger.warning("Voucher filter bitmap is missing; rebuilding it")
+                return None
+            return int(value)
+        return self._local_watermark
+
+    async def _set_watermark(self, value: int):
+        redis = get_redis()
+        if redis is not None:
+            pipe = redis.pipeline(transaction=True)
+            pipe.setbit(self.bloom.key, self._synced_bit, 1)
+            pipe.set(self._watermark_key, value)
+            await pipe.execute()
+        else:
+            self._local_watermark = value
+
+    async def add(self, codes: Iterable[str]):
+        """Add freshly issued codes"""
+        try:
+            await self.bloom.add_many(codes)
+        except Exception as e:
+            # The next sync adds them; until then lookups for them may miss
+            logger.error(f"Failed to add vouchers to the filter: {e}")
+
+    async def might_exist(self, code: str) -> bool:
+        """False only if ``code`` was definitely never issued"""
+        try:
+            if await self._get_watermark() is None:
+                return True
+            return await self.bloom.might_contain(code)
+        except Exception as e:
+            logger.warning(f"Voucher filter lookup failed: {e}")
+            return True
+
+    async def sync(self) -> int:
+        """Add codes issued since the last sync"""
+        previous = watermark = await self._get_watermark() or 0
+        start = watermark
+        # Ids are allocated before commit, so concurrent batches can make a
+        # lower id visible after a higher one. Rescan a window while new
+        # vouchers keep appearing.
+        if time.monotonic() < self._recent_until:
+            start = max(0, watermark - self.sync_overlap)
+
+        added = 0
+        async with AsyncSessionLocal() as db:
+            rows = await db.stream(
+                select(Voucher.id, Voucher.code)
+                .where(Voucher.id > start)
+                .order_by(Voucher.id)
+                .execution_options(yield_per=10000)
+            )
+            async for partition in rows.partitions():
+                await self.bloom.add_many(code for _, code in partition)
+                added += len(partition)
+                watermark = max(watermark, partition[-1][0])
+
+        await self._set_watermark(watermark)
+        if watermark > previous:
+            self._recent_until = time.monotonic() + 60
+        return added
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Voucher filter sync failed: {e}")
+            await asyncio.sleep(self.sync_interval)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+async def redeem_voucher(db: AsyncSession, user: User, code: str) -> Optional[UserPlan]:
+    """Claim a voucher for ``user`` and activate its plan.
+
+    The claim is a single conditional UPDATE, so concurrent attempts on the
+    same code resolve to exactly one winner. Returns None when the code is
+    unknown, used, disabled or expired. A successful claim is committed
+    before the user is provisioned on the routers, so the voucher row
+    isn't locked during router I/O.
+    """
+    code = normalize_voucher_code(code)
+    if not await issued_vouchers.might_exist(code):
+        return None
+
+    result = await db.execute(
+        update(Voucher)
+        .where(
+            Voucher.code == code,
+            Voucher.status == VoucherStatus.ACTIVE,
+            or_(Voucher.expires_at.is_(None), Voucher.expires_at > func.now())
+        )
+        .values(status=VoucherStatus.USED, used_by_user_id=user.id, used_at=func.now())
+        .returning(Voucher.id, Voucher.plan_id)
+        .execution_options(synchronize_session=False)
+    )
+    claimed = result.one_or_none()
+    if claimed is None:
+        return None
+
+    plan = await db.get(Plan, claimed.plan_id)
+    transaction = Transaction(
+        reference=generate_transaction_ref(),
+        user_id=user.id,
+        type=TransactionType.PURCHASE,
+        payment_method=PaymentMethod.VOUCHER,
+        status=TransactionStatus.COMPLETED,
+        amount=plan.price,
+        plan_id=plan.id,
+        description=f"Voucher redemption of {plan.name}",
+        completed_at=datetime.utcnow()
+    )
+    db.add(transaction)
+    await db.flush()
+
+    return await activate_user_plan(db, user, plan, transaction.id)
+
+
+# Singleton instance
+issued_vouchers = IssuedVoucherFilter()
@@ -0,0 +1,89 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, List, Optional, Sequence, Tuple
+from fastapi import HTTPException, Query, status
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.config import settings
+
+
+def _dump(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _load(value: Any, python_type: type) -> Any:
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is Decimal:
+        return Decimal(value)
+    if isinstance(value, python_type) and not isinstance(value, bool):
+        return value
+    raise ValueError(f"expected {python_type.__name__}")
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Opaque cursor for a position in a keyset ordering"""
+    raw = json.dumps([_dump(value) for value in values], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, keys: Sequence) -> Tuple:
+    """Sort key values of ``cursor``, typed like ``keys``; 400 if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError("wrong number of values")
+        return tuple(_load(value, key.type.python_type) for value, key in zip(values, keys))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, ArithmeticError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def page_size(
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX)
+) -> int:
+    """Page size query parameter shared by the list endpoints"""
+    return limit
+
+
+async def paginate(
+    db: AsyncSession,
+    stmt: Select,
+    keys: Sequence,
+    cursor: Optional[str],
+    limit: int,
+    descending: bool = True
+) -> Tuple[List[Any], Optional[str]]:
+    """Run one page of ``stmt`` ordered by ``keys``; returns (rows, next cursor).
+
+    ``keys`` must be non-null columns ending in a unique one (normally
+    ``(created_at, id)``) and should be covered by an index that also
+    leads with any equality filters on ``stmt``. The page starts strictly
+    after the cursor's position with a row comparison instead of an
+    OFFSET, so every page costs the same and rows inserted while a client
+    is paging never shift later pages.
+    """
+    if cursor:
+        position = tuple_(*keys)
+        after = decode_cursor(cursor, keys)
+        stmt = stmt.where(position < after if descending else position > after)
+    stmt = stmt.order_by(*(key.desc() if descending else key.asc() for key in keys))
+
+    # One extra row tells whether another page follows
+    result = await db.execute(stmt.limit(limit + 1))
+    rows = list(result.scalars().all())
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, key.key) for key in keys])
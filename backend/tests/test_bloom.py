@@ -0,0 +1,58 @@
+import math
+from unittest.mock import patch
+
+import pytest
+
+from app.core import bloom
+from app.core.bloom import BloomFilter
+
+
+@pytest.mark.parametrize("capacity, error_rate", [(1000, 0.001), (100000, 0.01), (1_000_000, 0.0001)])
+def test_sizing_matches_formula(capacity, error_rate):
+    f = BloomFilter("test", capacity, error_rate)
+    bits = -capacity * math.log(error_rate) / math.log(2) ** 2
+    assert f.size == int(bits)
+    assert f.hashes == round(bits / capacity * math.log(2))
+    # Optimal sizing gives the requested error rate at capacity
+    assert (1 - math.exp(-f.hashes * capacity / f.size)) ** f.hashes == pytest.approx(error_rate, rel=0.1)
+
+
+def test_sizing_lower_bounds():
+    f = BloomFilter("test", 1, 0.5)
+    assert f.size == 8
+    assert f.hashes >= 1
+
+
+def test_offsets_are_stable_and_in_range():
+    f = BloomFilter("test", 1000)
+    offsets = f._offsets("ABCD-1234")
+    assert offsets == BloomFilter("other", 1000)._offsets("ABCD-1234")
+    assert len(offsets) == f.hashes
+    assert all(0 <= offset < f.size for offset in offsets)
+
+
+async def test_local_filter_has_no_false_negatives():
+    f = BloomFilter("test", 1000, 0.01)
+    added = [f"code-{i}" for i in range(1000)]
+
+    await f.add_many(added)
+    assert all([await f.might_contain(item) for item in added])
+    # 1% target; allow for variance
+    assert sum([await f.might_contain(f"other-{i}") for i in range(10000)]) < 300
+
+
+async def test_redis_filter_matches_local(redis):
+    added = [f"code-{i}" for i in range(500)]
+    shared = BloomFilter("test", 1000, 0.01)
+    await shared.add_many(added)
+    assert await redis.exists("bloom:test")
+
+    # Another worker's filter reads the same bitmap
+    other = BloomFilter("test", 1000, 0.01)
+    assert all([await other.might_contain(item) for item in added])
+    with patch.object(bloom, "get_redis", lambda: None):
+        local = BloomFilter("test", 1000, 0.01)
+        await local.add_many(added)
+        probes = [f"other-{i}" for i in range(2000)]
+        expected = [await local.might_contain(item) for item in probes]
+    assert [await other.might_contain(item) for item in probes] == expected
@@ -0,0 +1,97 @@
+import asyncio
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from app.models.session import Session
+from app.models.transaction import Transaction, TransactionStatus, TransactionType
+from app.models.user import User
+from app.services import live_stats as live_stats_module
+from app.services.live_stats import LiveStats
+
+
+@pytest.fixture
+async def database(sessions, monkeypatch):
+    """A user with one active session on 10.0.0.1; returns the session factory"""
+    monkeypatch.setattr(live_stats_module, "AsyncSessionLocal", sessions)
+    async with sessions() as db:
+        user = User(email="alice@example.com", username="alice", hashed_password="x")
+        db.add(user)
+        await db.flush()
+        db.add(Session(user_id=user.id, nas_ip_address="10.0.0.1", active=True))
+        await db.commit()
+    return sessions
+
+
+async def _start_session(sessions, nas_ip="10.0.0.2"):
+    async with sessions() as db:
+        db.add(Session(user_id=1, nas_ip_address=nas_ip, active=True))
+        await db.commit()
+
+
+async def test_without_redis_the_first_request_corrects_once(database, monkeypatch):
+    stats = LiveStats(max_age=60)
+    corrections = []
+    correct = stats.correct
+
+    async def counted():
+        corrections.append(1)
+        return await correct()
+
+    monkeypatch.setattr(stats, "correct", counted)
+    snapshots = await asyncio.gather(*(stats.snapshot() for _ in range(5)))
+
+    assert len(corrections) == 1
+    assert all(snapshot["active_sessions"] == 1 for snapshot in snapshots)
+    assert snapshots[0]["corrected_at"] is not None
+
+
+async def test_without_redis_a_stale_snapshot_is_refreshed(database):
+    stats = LiveStats(max_age=60)
+    first = await stats.snapshot()
+    await _start_session(database)
+
+    # Fresh enough; served as is
+    assert (await stats.snapshot())["active_sessions"] == 1
+
+    stats.max_age = 0
+    stale = await stats.snapshot()
+    # The stale copy is served while one refresh runs in the background
+    assert stale is first
+    await stats.stop()
+    refreshed = await stats.snapshot()
+    assert refreshed["active_sessions"] == 2
+    assert refreshed["online_by_nas"] == {"10.0.0.1": 1, "10.0.0.2": 1}
+    assert refreshed["corrected_at"] >= first["corrected_at"]
+    await stats.stop()
+
+
+async def test_counters_follow_commits_in_redis(redis, database, monkeypatch):
+    stats = LiveStats()
+    monkeypatch.setattr(live_stats_module, "live_stats", stats)
+    assert await stats.correct() == 0
+
+    await _start_session(database)
+    async with database() as db:
+        db.add(Transaction(
+            user_id=1, plan_id=3, amount=Decimal("50"), type=TransactionType.PURCHASE,
+            status=TransactionStatus.COMPLETED, completed_at=datetime.now(stats.tz)
+        ))
+        await db.commit()
+    await stats.stop()
+
+    snapshot = await stats.snapshot()
+    assert snapshot["online_by_nas"] == {"10.0.0.1": 1, "10.0.0.2": 1}
+    assert (snapshot["today"]["purchases"], snapshot["today"]["revenue"]) == (1, Decimal("50"))
+    assert snapshot["today"]["by_plan"] == [{"plan_id": 3, "purchases": 1, "revenue": Decimal("50")}]
+
+
+async def test_correction_repairs_drift(redis, database):
+    stats = LiveStats()
+    await stats.correct()
+    await redis.hincrby("stats:sessions", "10.0.0.1", 4)
+
+    assert (await stats.snapshot())["active_sessions"] == 5
+    assert await stats.correct() == 4
+    assert (await stats.snapshot())["active_sessions"] == 1
@@ -0,0 +1,38 @@
+import pytest
+
+from app.services.mikrotik import MikroTikService
+
+
+@pytest.mark.parametrize("field, value, expected", [
+    ("disabled", "true", "yes"),
+    ("disabled", "false", "no"),
+    ("disabled", "Yes", "yes"),
+    ("disabled", "no", "no"),
+    ("mac-address", "aa-bb-cc-dd-ee-ff", "AA:BB:CC:DD:EE:FF"),
+    ("mac-address", "aa:bb:cc:dd:ee:ff", "AA:BB:CC:DD:EE:FF"),
+    ("profile", "Gold", "Gold"),
+    ("limit-bytes-total", 1024, "1024"),
+    ("profile", None, None),
+])
+def test_normalize_field(field, value, expected):
+    assert MikroTikService._normalize_field(field, value) == expected
+
+
+def test_unchanged_user_has_no_changes():
+    row = {"name": "alice", "password": "pw", "profile": "Gold", "disabled": "false", "mac-address": "AA:BB:CC:DD:EE:FF"}
+    fields = {"password": "pw", "profile": "Gold", "disabled": "no", "mac-address": "aa-bb-cc-dd-ee-ff"}
+    assert MikroTikService._changed_fields(row, fields) == {}
+
+
+def test_changed_fields_keep_desired_values():
+    row = {"password": "pw", "profile": "Gold", "disabled": "true"}
+    fields = {"password": "pw", "profile": "Silver", "disabled": "no", "limit-bytes-total": "1024"}
+    assert MikroTikService._changed_fields(row, fields) == {
+        "profile": "Silver",
+        "disabled": "no",
+        "limit-bytes-total": "1024",
+    }
+
+
+def test_values_are_case_sensitive_outside_normalized_fields():
+    assert MikroTikService._changed_fields({"profile": "gold"}, {"profile": "Gold"}) == {"profile": "Gold"}
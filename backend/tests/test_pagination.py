@@ -0,0 +1,49 @@
+import base64
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+from fastapi import HTTPException
+
+from app.models.transaction import Transaction
+from app.utils.pagination import decode_cursor, encode_cursor
+
+KEYS = (Transaction.created_at, Transaction.id)
+
+
+def test_cursor_round_trip():
+    values = (datetime(2026, 10, 18, 8, 41, 0, 54544, tzinfo=timezone.utc), 42)
+    assert decode_cursor(encode_cursor(values), KEYS) == values
+
+
+def test_cursor_round_trip_decimal():
+    keys = (Transaction.amount, Transaction.id)
+    assert decode_cursor(encode_cursor((Decimal("10.50"), 7)), keys) == (Decimal("10.50"), 7)
+
+
+def test_cursor_is_url_safe_without_padding():
+    cursor = encode_cursor((datetime(2026, 1, 1), 1))
+    assert "=" not in cursor
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_")
+
+
+def _raw(payload: bytes) -> str:
+    return base64.urlsafe_b64encode(payload).rstrip(b"=").decode()
+
+
+@pytest.mark.parametrize("cursor", [
+    "!!!",
+    _raw(b"\xff\xfe"),
+    _raw(b"not json"),
+    _raw(b'{"created_at": 1}'),
+    _raw(b'["2026-10-18T08:41:00"]'),
+    _raw(b'["2026-10-18T08:41:00", 1, 2]'),
+    _raw(b'["yesterday", 1]'),
+    _raw(b'["2026-10-18T08:41:00", "1"]'),
+    _raw(b'["2026-10-18T08:41:00", true]'),
+    _raw(b'[null, 1]'),
+])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor, KEYS)
+    assert exc.value.status_code == 400
@@ -0,0 +1,48 @@
+from datetime import date, datetime, timezone
+
+import pytest
+
+from app.services.partitions import _UPPER_BOUND, _add_months, _bound
+
+
+@pytest.mark.parametrize("month, months, expected", [
+    (date(2026, 10, 1), 0, date(2026, 10, 1)),
+    (date(2026, 10, 1), 1, date(2026, 11, 1)),
+    (date(2026, 11, 1), 1, date(2026, 12, 1)),
+    (date(2026, 12, 1), 1, date(2027, 1, 1)),
+    (date(2026, 10, 1), 15, date(2028, 1, 1)),
+    (date(2026, 1, 1), -1, date(2025, 12, 1)),
+    (date(2026, 10, 1), -22, date(2024, 12, 1)),
+])
+def test_add_months(month, months, expected):
+    assert _add_months(month, months) == expected
+
+
+def test_bound_is_utc_midnight():
+    assert _bound(date(2026, 12, 1)) == "'2026-12-01 00:00:00+00'"
+
+
+@pytest.mark.parametrize("bound, expected", [
+    (
+        "FOR VALUES FROM ('2026-10-01 00:00:00+00') TO ('2026-11-01 00:00:00+00')",
+        datetime(2026, 11, 1, tzinfo=timezone.utc),
+    ),
+    (
+        "FOR VALUES FROM (MINVALUE) TO ('2026-11-01 00:00:00+00')",
+        datetime(2026, 11, 1, tzinfo=timezone.utc),
+    ),
+])
+def test_upper_bound(bound, expected):
+    match = _UPPER_BOUND.search(bound)
+    assert datetime.fromisoformat(match.group(1)) == expected
+
+
+@pytest.mark.parametrize("bound", ["DEFAULT", "FOR VALUES FROM ('2026-10-01 00:00:00+00') TO (MAXVALUE)", ""])
+def test_upper_bound_unbounded(bound):
+    assert _UPPER_BOUND.search(bound) is None
+
+
+def test_bound_round_trips_through_upper_bound():
+    month = _add_months(date(2026, 12, 1), 1)
+    match = _UPPER_BOUND.search(f"FOR VALUES FROM ('2026-12-01 00:00:00+00') TO ({_bound(month)})")
+    assert datetime.fromisoformat(match.group(1)) == datetime(2027, 1, 1, tzinfo=timezone.utc)
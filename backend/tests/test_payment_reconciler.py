@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest.mock import AsyncMock
+
+import httpx
+import pytest
+from sqlalchemy import select
+
+from app.core.redis import published_stats
+from app.models.plan import Plan
+from app.models.transaction import PaymentMethod, Transaction, TransactionStatus, TransactionType
+from app.models.user import User
+from app.services import settlement
+from app.services.settlement import PaymentReconciler
+
+RESPONSES = {
+    "ws_CO_paid": {"ResultCode": "0", "ResultDesc": "The service request is processed successfully."},
+    "ws_CO_cancelled": {"ResultCode": "1032", "ResultDesc": "Request cancelled by user"},
+    "ws_CO_processing": {"errorCode": "500.001.1001", "errorMessage": "The transaction is being processed"},
+    "ws_CO_auth": {"success": False, "error": "Invalid Access Token"},
+    "ws_CO_timeout": httpx.ConnectTimeout("timed out"),
+}
+
+
+@pytest.fixture
+async def pending(sessions, monkeypatch):
+    """A pending M-Pesa purchase per canned response, plus one too old to query"""
+    monkeypatch.setattr(settlement, "AsyncSessionLocal", sessions)
+    monkeypatch.setattr(settlement.mikrotik_fleet, "bulk_upsert_hotspot_users", AsyncMock(return_value={}))
+
+    async def query_transaction(checkout_id):
+        response = RESPONSES[checkout_id]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(settlement.mpesa_service, "query_transaction", query_transaction)
+
+    now = datetime.utcnow()
+    async with sessions() as db:
+        user = User(email="alice@example.com", username="alice", hashed_password="x")
+        plan = Plan(name="Daily", price=Decimal("50"), duration_days=1)
+        db.add_all([user, plan])
+        await db.flush()
+        refs = [(ref, now - timedelta(minutes=10)) for ref in RESPONSES]
+        refs.append(("ws_CO_stale", now - timedelta(days=2)))
+        db.add_all([
+            Transaction(
+                user_id=user.id, plan_id=plan.id, amount=plan.price, reference=ref,
+                type=TransactionType.PURCHASE, status=TransactionStatus.PENDING,
+                payment_method=PaymentMethod.MPESA, provider_ref=ref, created_at=created_at
+            )
+            for ref, created_at in refs
+        ])
+        await db.commit()
+    return sessions
+
+
+async def _statuses(sessions):
+    async with sessions() as db:
+        result = await db.execute(select(Transaction.provider_ref, Transaction.status))
+        return dict(result.all())
+
+
+def _reconciler():
+    return PaymentReconciler(min_age=120, max_age=86400, concurrency=4, rate=1000)
+
+
+async def test_only_definitive_results_settle(pending):
+    reconciler = _reconciler()
+    assert await reconciler.run_once() == 5
+
+    assert await _statuses(pending) == {
+        "ws_CO_paid": TransactionStatus.COMPLETED,
+        "ws_CO_cancelled": TransactionStatus.FAILED,
+        "ws_CO_processing": TransactionStatus.PENDING,
+        "ws_CO_auth": TransactionStatus.PENDING,
+        "ws_CO_timeout": TransactionStatus.PENDING,
+        "ws_CO_stale": TransactionStatus.PENDING,
+    }
+    stats = reconciler.stats
+    assert (stats["completed"], stats["failed"], stats["unresolved"], stats["errors"]) == (1, 1, 3, 2)
+    assert stats["needs_review"] == 1
+
+    # The unresolved ones are queried again next run
+    assert await reconciler.run_once() == 3
+
+
+async def test_stats_are_shared_with_other_workers(pending, redis):
+    assert await published_stats("payment_reconciliation") is None
+    leader = _reconciler()
+    await leader.run_once()
+
+    shared = await published_stats("payment_reconciliation")
+    assert shared["runs"] == 1
+    assert shared["completed"] == 1
+    assert shared["needs_review"] == 1
+    assert shared["last_run_at"] == leader.stats["last_run_at"]
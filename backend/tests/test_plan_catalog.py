@@ -0,0 +1,96 @@
+from decimal import Decimal
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import select
+
+from app.api.v1 import plans
+from app.models.plan import Plan
+from app.services import plan_catalog as plan_catalog_module
+from app.services.plan_catalog import PlanCatalog
+
+
+@pytest.fixture
+async def catalog(sessions, monkeypatch):
+    """A fresh catalog over Daily, Weekly and an inactive Legacy plan"""
+    monkeypatch.setattr(plan_catalog_module, "AsyncSessionLocal", sessions)
+    async with sessions() as db:
+        db.add_all([
+            Plan(name="Daily", price=Decimal("50"), duration_days=1, mikrotik_profile="daily", sort_order=1),
+            Plan(name="Weekly", price=Decimal("300"), duration_days=7, mikrotik_profile="weekly", sort_order=2),
+            Plan(name="Legacy", price=Decimal("20"), duration_days=1, mikrotik_profile="legacy", is_active=False),
+        ])
+        await db.commit()
+    catalog = PlanCatalog()
+    monkeypatch.setattr(plans, "plan_catalog", catalog)
+    return catalog
+
+
+@pytest.fixture
+async def client(catalog):
+    app = FastAPI()
+    app.include_router(plans.router)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def _rename(sessions, name, new_name):
+    async with sessions() as db:
+        plan = (await db.execute(select(Plan).where(Plan.name == name))).scalar_one()
+        plan.name = new_name
+        await db.commit()
+
+
+async def test_catalog_carries_an_etag(client):
+    response = await client.get("/plans/")
+    assert response.status_code == 200
+    assert [plan["name"] for plan in response.json()] == ["Daily", "Weekly"]
+    assert response.headers["etag"].startswith('"')
+    assert response.headers["cache-control"] == "no-cache"
+
+    again = await client.get("/plans/")
+    assert again.headers["etag"] == response.headers["etag"]
+    assert (await client.get("/plans/?active_only=false")).headers["etag"] != response.headers["etag"]
+
+
+@pytest.mark.parametrize("if_none_match", ["{etag}", 'W/"other", {etag}', "*"])
+async def test_current_copy_is_not_modified(client, if_none_match):
+    etag = (await client.get("/plans/")).headers["etag"]
+
+    response = await client.get("/plans/", headers={"If-None-Match": if_none_match.format(etag=etag)})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+
+async def test_single_plan_is_not_modified(client):
+    first = (await client.get("/plans/")).json()[0]
+    response = await client.get(f"/plans/{first['id']}")
+    assert response.json()["name"] == "Daily"
+
+    again = await client.get(f"/plans/{first['id']}", headers={"If-None-Match": response.headers["etag"]})
+    assert again.status_code == 304
+    assert (await client.get("/plans/999")).status_code == 404
+
+
+async def test_changed_catalog_is_served_again(client, catalog, sessions):
+    etag = (await client.get("/plans/")).headers["etag"]
+
+    await _rename(sessions, "Daily", "Daily Plus")
+    await catalog.invalidate()
+
+    response = await client.get("/plans/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()[0]["name"] == "Daily Plus"
+
+
+async def test_next_page_cursor(client):
+    response = await client.get("/plans/?limit=1")
+    assert [plan["name"] for plan in response.json()] == ["Daily"]
+
+    cursor = response.headers["x-next-cursor"]
+    response = await client.get(f"/plans/?limit=1&cursor={cursor}")
+    assert [plan["name"] for plan in response.json()] == ["Weekly"]
+    assert "x-next-cursor" not in response.headers
@@ -0,0 +1,98 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.core import rate_limit
+from app.core.rate_limit import SlidingWindowRateLimiter
+
+
+class Clock:
+    """Stands in for the time module, starting at the beginning of a window"""
+
+    def __init__(self, now: float = 6000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def limiter(redis_or_local, clock):
+    """A limiter counting in Redis, or in process memory without Redis"""
+    return SlidingWindowRateLimiter(window=60)
+
+
+async def _hits(limiter, key, limit, count):
+    return [await limiter.hit(key, limit) for _ in range(count)]
+
+
+async def test_limit_within_a_window(limiter):
+    results = await _hits(limiter, "ip:10.0.0.1", 5, 7)
+
+    assert [r.allowed for r in results] == [True] * 5 + [False] * 2
+    assert [r.remaining for r in results[:5]] == [4, 3, 2, 1, 0]
+    assert results[-1].retry_after == 60
+    # Other keys have their own budget
+    assert (await limiter.hit("ip:10.0.0.2", 5)).allowed
+
+
+async def test_previous_window_is_weighted_by_overlap(limiter, clock):
+    await _hits(limiter, "k", 10, 10)
+
+    # A quarter into the next window, 75% of the previous 10 still count
+    clock.now += 75
+    results = await _hits(limiter, "k", 10, 4)
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert results[-1].retry_after == 45
+
+    # Two windows on, nothing carries over
+    clock.now += 120
+    assert all(r.allowed for r in await _hits(limiter, "k", 10, 10))
+
+
+async def test_limit_is_shared_by_workers(redis, clock):
+    workers = [SlidingWindowRateLimiter(window=60) for _ in range(3)]
+    results = await asyncio.gather(*(
+        workers[i % 3].hit("user:7:global", 10) for i in range(30)
+    ))
+    assert sum(r.allowed for r in results) == 10
+
+
+async def test_concurrent_hits_never_exceed_the_limit(redis, clock):
+    limiter = SlidingWindowRateLimiter(window=60)
+    results = await asyncio.gather(*(limiter.hit("ip:10.0.0.1", 25) for _ in range(200)))
+    assert sum(r.allowed for r in results) == 25
+    assert int(await redis.get("rl:{ip:10.0.0.1}:100")) == 25
+
+
+async def test_redis_keys_expire_after_two_windows(redis, clock):
+    await SlidingWindowRateLimiter(window=60).hit("ip:10.0.0.1", 5)
+    assert 0 < await redis.ttl("rl:{ip:10.0.0.1}:100") <= 120
+
+
+async def test_falls_back_to_local_counters_while_redis_is_down(redis, clock):
+    limiter = SlidingWindowRateLimiter(window=60, redis_retry_interval=5)
+    await _hits(limiter, "k", 3, 1)
+
+    broken = AsyncMock(side_effect=ConnectionError("Redis is down"))
+    with patch.object(limiter, "_hit_redis", broken):
+        results = await _hits(limiter, "k", 3, 4)
+    assert [r.allowed for r in results] == [True, True, True, False]
+    # Redis isn't retried until the retry interval has passed
+    assert broken.await_count == 1
+
+    # Back on Redis, which only saw the first hit
+    clock.now += 5
+    result = await limiter.hit("k", 3)
+    assert result.allowed and result.remaining == 1
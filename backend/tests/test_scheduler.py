@@ -0,0 +1,159 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.core import scheduler as scheduler_module
+from app.core.scheduler import Scheduler
+
+
+class FakeConnection:
+    """Grants every advisory lock"""
+
+    async def scalar(self, statement, params=None):
+        return True
+
+    async def execute(self, statement, params=None):
+        pass
+
+    async def invalidate(self):
+        pass
+
+
+class FakeEngine:
+    """Stands in for the database engine; the first ``failures`` connections fail"""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+
+    @asynccontextmanager
+    async def connect(self):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionRefusedError("database is down")
+        yield FakeConnection()
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = FakeEngine()
+    monkeypatch.setattr(scheduler_module, "engine", engine)
+    return engine
+
+
+async def _wait_for(condition, timeout=2.0):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not met")
+
+
+async def test_failing_lock_acquisition_does_not_end_the_loop(engine):
+    engine.failures = 2
+    calls = []
+
+    async def job_func():
+        calls.append(1)
+
+    scheduler = Scheduler(jitter=0)
+    job = scheduler.add("sync", job_func, interval=0.01)
+    await scheduler.start()
+    try:
+        await _wait_for(lambda: job.runs >= 2)
+    finally:
+        await scheduler.stop()
+
+    assert job.failures == 2
+    assert len(calls) == job.runs
+
+
+async def test_failing_job_is_counted(engine):
+    async def job_func():
+        raise ValueError("boom")
+
+    scheduler = Scheduler(jitter=0)
+    job = scheduler.add("sync", job_func, interval=60)
+    await scheduler.run(job)
+    await scheduler.run(job)
+
+    assert (job.runs, job.failures, job.last_error) == (2, 2, "boom")
+
+
+async def test_one_worker_runs_a_job(redis, engine):
+    calls = []
+
+    async def job_func():
+        calls.append(1)
+
+    workers = [Scheduler(jitter=0) for _ in range(3)]
+    jobs = [worker.add("sync", job_func, interval=60) for worker in workers]
+    for _ in range(2):
+        for worker, job in zip(workers, jobs):
+            await worker.run(job)
+
+    assert len(calls) == 2
+    assert [job.leader for job in jobs] == [True, False, False]
+    assert await redis.get("scheduler:lock:sync") == workers[0].worker_id.encode()
+
+    # Stopping hands the job over
+    await workers[0].stop()
+    await workers[1].run(jobs[1])
+    assert jobs[1].leader and len(calls) == 3
+
+
+async def test_heartbeat_renews_the_lock_during_a_long_run(redis, engine):
+    async def job_func():
+        await asyncio.sleep(0.3)
+        return "done"
+
+    scheduler = Scheduler(jitter=0)
+    # 100ms lock, renewed every ~33ms
+    job = scheduler.add("sync", job_func, interval=0.05)
+    await scheduler.run(job)
+
+    assert (job.runs, job.failures, job.last_result) == (1, 0, "done")
+    assert await redis.get("scheduler:lock:sync") == scheduler.worker_id.encode()
+
+
+async def test_lost_lock_cancels_the_run(redis, engine):
+    finished = []
+
+    async def job_func():
+        await redis.set("scheduler:lock:sync", "other-worker")
+        await asyncio.sleep(1)
+        finished.append(1)
+
+    scheduler = Scheduler(jitter=0)
+    job = scheduler.add("sync", job_func, interval=0.05)
+    await scheduler.run(job)
+
+    assert not finished
+    assert (job.runs, job.failures, job.last_error) == (1, 1, "lock lost")
+
+
+async def test_stats_are_shared_by_the_leader(redis, engine):
+    async def job_func():
+        return 42
+
+    leader, follower = Scheduler(jitter=0), Scheduler(jitter=0)
+    leader.add("sync", job_func, interval=60)
+    follower.add("sync", job_func, interval=60)
+    await leader.run(leader.jobs[0])
+    await follower.run(follower.jobs[0])
+
+    (job,) = (await follower.shared_stats())["jobs"]
+    assert (job["worker_id"], job["runs"], job["last_result"], job["leader"]) == (leader.worker_id, 1, 42, True)
+    assert follower.stats()["jobs"][0]["skipped"] == 1
+
+
+async def test_stats_without_redis_are_this_workers(engine):
+    async def job_func():
+        return 42
+
+    scheduler = Scheduler(jitter=0)
+    scheduler.add("sync", job_func, interval=60)
+    await scheduler.run(scheduler.jobs[0])
+
+    (job,) = (await scheduler.shared_stats())["jobs"]
+    assert (job["worker_id"], job["runs"]) == (scheduler.worker_id, 1)
@@ -0,0 +1,147 @@
+import hashlib
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from app.core.redis import published_stats
+from app.models.plan import Plan, UserPlan
+from app.models.session import Session
+from app.models.user import User
+from app.services import session_reconciler as session_reconciler_module
+from app.services.radius import ACCT_START, AccountingRecord
+from app.services.session_manager import SessionManager
+from app.services.session_reconciler import (
+    SessionReconciler, _db_fingerprint, _fingerprint, _normalize_mac, _parse_uptime, adopt_sessions
+)
+
+
+def test_fingerprint_is_order_independent():
+    identities = [("bob", "AA:BB:CC:DD:EE:01"), ("alice", "AA:BB:CC:DD:EE:02"), ("alice", "")]
+    assert _fingerprint(identities) == _fingerprint(list(reversed(identities)))
+
+
+def test_fingerprint_of_nothing_matches_empty_digest():
+    assert _fingerprint([]) == hashlib.md5(b"").hexdigest()
+
+
+def test_fingerprint_sorts_like_collate_c():
+    # COLLATE "C" orders UTF-8 by byte, which is the code point order
+    # sorted() uses; a linguistic collation would interleave cases and accents
+    identities = [("émile", ""), ("Zed", ""), ("zed", ""), ("éa", ""), ("user_1", ""), ("user-1", "")]
+    by_bytes = sorted(f"{username}|{mac}" for username, mac in identities)
+    assert by_bytes == sorted(by_bytes, key=lambda s: s.encode("utf-8"))
+    assert _fingerprint(identities) == hashlib.md5(",".join(by_bytes).encode()).hexdigest()
+
+
+def test_db_fingerprint_orders_by_c_collation():
+    sql = str(_db_fingerprint.compile(dialect=postgresql.dialect()))
+    assert 'COLLATE "C"' in sql
+    assert "string_agg" in sql
+    assert "upper(replace(" in sql
+
+
+@pytest.mark.parametrize("mac, expected", [
+    ("aa-bb-cc-dd-ee-ff", "AA:BB:CC:DD:EE:FF"),
+    ("AA:BB:CC:DD:EE:FF", "AA:BB:CC:DD:EE:FF"),
+    (None, ""),
+])
+def test_normalize_mac(mac, expected):
+    assert _normalize_mac(mac) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("45s", 45),
+    ("1h2m3s", 3723),
+    ("3w1d", 1900800),
+    ("1m500ms", 60.5),
+    ("", None),
+    (None, None),
+    ("5", None),
+    ("1h bogus", None),
+])
+def test_parse_uptime(value, expected):
+    assert _parse_uptime(value) == expected
+
+
+@pytest.fixture
+async def alice(sessions):
+    """An entitled user with a session the reconciler found on 10.0.0.1; returns the user id"""
+    async with sessions() as db:
+        user = User(email="alice@example.com", username="alice", hashed_password="x")
+        plan = Plan(name="Daily", price=Decimal("50"), duration_days=1)
+        db.add_all([user, plan])
+        await db.flush()
+        user_plan = UserPlan(user_id=user.id, plan_id=plan.id, end_date=datetime.utcnow() + timedelta(days=1))
+        db.add(user_plan)
+        await db.flush()
+        starts, disconnects = await SessionReconciler._resolve_unknown(db, [
+            ("10.0.0.1", {"id": "*1A", "user": "alice", "mac-address": "AA:BB:CC:DD:EE:01", "uptime": "5m"}),
+            ("10.0.0.1", {"id": "*1B", "user": "mallory", "mac-address": "AA:BB:CC:DD:EE:02", "uptime": "5m"}),
+        ])
+        assert disconnects == [("mallory", "10.0.0.1")]
+        await db.execute(Session.__table__.insert(), starts)
+        await db.commit()
+        return user.id
+
+
+async def _sessions(sessions):
+    async with sessions() as db:
+        result = await db.execute(select(Session.session_id, Session.nas_ip_address, Session.active).order_by(Session.id))
+        return result.all()
+
+
+def _start(session_id, nas_ip="10.0.0.1", mac="aa-bb-cc-dd-ee-01"):
+    return AccountingRecord(
+        status_type=ACCT_START, session_id=session_id, nas_ip=nas_ip,
+        username="alice", mac_address=mac, received_at=datetime.utcnow()
+    )
+
+
+async def test_reconciled_logins_have_no_session_id(alice, sessions):
+    assert await _sessions(sessions) == [(None, "10.0.0.1", True)]
+
+
+async def test_accounting_start_adopts_the_reconciled_row(alice, sessions):
+    async with sessions() as db:
+        await SessionManager.bulk_start_sessions(db, [_start("81000001")])
+        await db.commit()
+    assert await _sessions(sessions) == [("81000001", "10.0.0.1", True)]
+
+    # A second login, and one on another NAS, get rows of their own
+    async with sessions() as db:
+        await SessionManager.bulk_start_sessions(db, [_start("81000002"), _start("81000003", nas_ip="10.0.0.2")])
+        await db.commit()
+    assert [row[:2] for row in await _sessions(sessions)] == [
+        ("81000001", "10.0.0.1"), ("81000002", "10.0.0.1"), ("81000003", "10.0.0.2")
+    ]
+
+
+async def test_interim_adopts_only_a_matching_login(alice, sessions):
+    async with sessions() as db:
+        assert await adopt_sessions(db, [
+            ("10.0.0.1", "81000001", "alice", "AA:BB:CC:DD:EE:99"),
+            ("10.0.0.2", "81000002", "alice", "AA:BB:CC:DD:EE:01"),
+            ("10.0.0.1", "81000003", None, None),
+        ]) == 0
+        assert await adopt_sessions(db, [("10.0.0.1", "81000004", "alice", "aa:bb:cc:dd:ee:01")]) == 1
+        # Already adopted; a retransmission changes nothing
+        assert await adopt_sessions(db, [("10.0.0.1", "81000004", "alice", "aa:bb:cc:dd:ee:01")]) == 0
+        await db.commit()
+    assert await _sessions(sessions) == [("81000004", "10.0.0.1", True)]
+
+
+async def test_stats_are_published(redis, sessions, monkeypatch):
+    monkeypatch.setattr(session_reconciler_module, "AsyncSessionLocal", sessions)
+    monkeypatch.setattr(session_reconciler_module.mikrotik_fleet, "get_active_sessions", AsyncMock(return_value={
+        "10.0.0.1": [], "10.0.0.2": None,
+    }))
+    monkeypatch.setattr(SessionReconciler, "_db_fingerprints", AsyncMock(return_value={}))
+    reconciler = SessionReconciler()
+    assert await reconciler.run_once() == 0
+
+    published = await published_stats("session_reconciliation")
+    assert (published["runs"], published["routers"], published["unreachable"], published["in_sync"]) == (1, 2, 1, 1)
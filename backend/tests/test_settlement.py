@@ -0,0 +1,123 @@
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy import func, select
+
+from app.models.plan import Plan, UserPlan
+from app.models.transaction import PaymentMethod, Transaction, TransactionStatus, TransactionType
+from app.models.user import User
+from app.services import settlement
+from app.services.settlement import SettlementQueue
+
+
+def _callback(checkout_id, result_code=0, receipt="RCP1"):
+    callback = {"CheckoutRequestID": checkout_id, "ResultCode": result_code}
+    if result_code == 0:
+        callback["CallbackMetadata"] = {"Item": [{"Name": "MpesaReceiptNumber", "Value": receipt}]}
+    return callback
+
+
+@pytest.fixture
+def routers(monkeypatch):
+    upsert = AsyncMock(return_value={})
+    monkeypatch.setattr(settlement.mikrotik_fleet, "bulk_upsert_hotspot_users", upsert)
+    return upsert
+
+
+@pytest.fixture
+async def pending(sessions, monkeypatch):
+    """Two pending M-Pesa purchases, ws_CO_1 and ws_CO_2, by the same user"""
+    monkeypatch.setattr(settlement, "AsyncSessionLocal", sessions)
+    async with sessions() as db:
+        user = User(email="alice@example.com", username="alice", hashed_password="x")
+        plan = Plan(name="Daily", price=Decimal("50"), duration_days=1, mikrotik_profile="daily")
+        db.add_all([user, plan])
+        await db.flush()
+        db.add_all([
+            Transaction(
+                user_id=user.id, plan_id=plan.id, amount=plan.price, reference=f"REF{i}",
+                type=TransactionType.PURCHASE, status=TransactionStatus.PENDING,
+                payment_method=PaymentMethod.MPESA, provider_ref=f"ws_CO_{i}"
+            )
+            for i in (1, 2)
+        ])
+        await db.commit()
+    return sessions
+
+
+async def _statuses(sessions):
+    async with sessions() as db:
+        result = await db.execute(select(Transaction.provider_ref, Transaction.status, Transaction.provider_receipt))
+        return {ref: (status, receipt) for ref, status, receipt in result.all()}
+
+
+async def _user_plans(sessions):
+    async with sessions() as db:
+        return (await db.execute(select(func.count()).select_from(UserPlan))).scalar_one()
+
+
+async def test_batch_dedupes_retries_and_success_wins(monkeypatch):
+    apply_results = AsyncMock(return_value=0)
+    monkeypatch.setattr(SettlementQueue, "apply_results", apply_results)
+    monkeypatch.setattr(settlement, "AsyncSessionLocal", MagicMock())
+
+    await SettlementQueue().settle([
+        _callback("a"), _callback("a"),
+        _callback("b", 1032), _callback("b"),
+        _callback("c"), _callback("c", 1),
+        _callback("d", 1037), _callback("d", 1037),
+        {"ResultCode": 0},
+    ])
+
+    _, completed, failed = apply_results.await_args.args
+    assert set(completed) == {"a", "b", "c"}
+    assert failed == {"d"}
+
+
+async def test_settling_twice_activates_once(pending, routers):
+    queue = SettlementQueue()
+    assert await queue.settle([_callback("ws_CO_1")]) == 1
+    assert await queue.settle([_callback("ws_CO_1", receipt="OTHER")]) == 0
+
+    statuses = await _statuses(pending)
+    assert statuses["ws_CO_1"] == (TransactionStatus.COMPLETED, "RCP1")
+    assert statuses["ws_CO_2"] == (TransactionStatus.PENDING, None)
+    assert await _user_plans(pending) == 1
+    routers.assert_awaited_once()
+    (provisioned,) = routers.await_args.args
+    assert provisioned == [{
+        "username": "alice", "password": "alice", "profile": "daily", "mac_address": None, "disabled": False,
+    }]
+
+
+async def test_late_failure_does_not_undo_completion(pending, routers):
+    queue = SettlementQueue()
+    await queue.settle([_callback("ws_CO_1")])
+    assert await queue.settle([_callback("ws_CO_1", 1032), _callback("ws_CO_2", 1032)]) == 0
+
+    statuses = await _statuses(pending)
+    assert statuses["ws_CO_1"][0] == TransactionStatus.COMPLETED
+    assert statuses["ws_CO_2"][0] == TransactionStatus.FAILED
+    assert await _user_plans(pending) == 1
+
+
+async def test_unknown_references_are_ignored(pending, routers):
+    assert await SettlementQueue().settle([_callback("ws_CO_missing"), _callback("ws_CO_other", 1)]) == 0
+    assert {status for status, _ in (await _statuses(pending)).values()} == {TransactionStatus.PENDING}
+    routers.assert_not_awaited()
+
+
+async def test_queued_callbacks_are_settled_on_stop(pending, routers):
+    queue = SettlementQueue(max_wait=0.01)
+    await queue.start()
+    assert queue.submit(_callback("ws_CO_1"))
+    assert queue.submit(_callback("ws_CO_1"))
+    await queue.stop()
+    queue.submit(_callback("ws_CO_2"))
+    await queue.stop()
+
+    statuses = await _statuses(pending)
+    assert statuses["ws_CO_1"][0] == TransactionStatus.COMPLETED
+    assert statuses["ws_CO_2"][0] == TransactionStatus.COMPLETED
+    assert await _user_plans(pending) == 2
@@ -0,0 +1,126 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from app.models.plan import Plan, UserPlan
+from app.models.session import Session
+from app.models.user import User
+from app.services.radius import AccountingRecord
+from app.services.usage_tracker import DIRTY_PLANS, DIRTY_SESSIONS, MB, UsageTracker
+
+MEMBER = "10.0.0.1|81000001"
+
+
+def _update(upload, download, session_time, session_id="81000001", cause=None):
+    return AccountingRecord(
+        status_type=3, session_id=session_id, nas_ip="10.0.0.1", username="alice", mac_address="AA:BB:CC:DD:EE:01",
+        upload_bytes=upload, download_bytes=download, session_time=session_time,
+        terminate_cause=cause, received_at=datetime(2026, 10, 18, 12, 0)
+    )
+
+
+@pytest.fixture
+def tracker(redis):
+    return UsageTracker(batch_size=100, ttl=3600)
+
+
+async def _bind(tracker, redis, plan_id, limit, used, persisted=0):
+    tracker._scripts(redis)
+    return await tracker._bind(
+        keys=[f"usage:s:{MEMBER}", f"usage:p:{plan_id}", DIRTY_PLANS],
+        args=[plan_id, limit, used, persisted, tracker.ttl]
+    )
+
+
+async def test_unbound_session_keeps_cumulative_counters(tracker, redis):
+    assert await tracker.apply(_update(100, 200, 60)) is None
+    assert await tracker.apply(_update(300, 700, 120)) is None
+
+    session = await redis.hgetall(f"usage:s:{MEMBER}")
+    assert {k: session[k] for k in (b"up", b"down", b"total", b"time")} == {
+        b"up": b"300", b"down": b"700", b"total": b"1000", b"time": b"120"
+    }
+    # Kept for adopting a row the reconciler recorded
+    assert (session[b"user"], session[b"mac"]) == (b"alice", b"AA:BB:CC:DD:EE:01")
+    assert await redis.smembers(DIRTY_SESSIONS) == {MEMBER.encode()}
+    assert 0 < await redis.ttl(f"usage:s:{MEMBER}") <= 3600
+
+
+async def test_bind_charges_bytes_not_yet_persisted(tracker, redis):
+    await tracker.apply(_update(0, 1000, 60))
+    # The plan had 5000 bytes used, 400 of them by this session already in Postgres
+    assert await _bind(tracker, redis, 7, 10000, 5000, persisted=400) == [0, 7]
+    assert await redis.hmget("usage:p:7", "limit", "used") == [b"10000", b"5600"]
+
+    # Binding again is a no-op
+    assert await _bind(tracker, redis, 7, 10000, 0) == [0, 0]
+    assert await redis.hget("usage:p:7", "used") == b"5600"
+
+
+async def test_updates_charge_deltas_and_report_exhaustion_once(tracker, redis):
+    await tracker.apply(_update(0, 1000, 60))
+    await _bind(tracker, redis, 7, 5000, 1000)
+
+    assert await tracker.apply(_update(0, 3000, 120)) is None
+    assert await redis.hget("usage:p:7", "used") == b"4000"
+    assert await tracker.apply(_update(0, 4000, 180)) == 7
+    assert await tracker.apply(_update(0, 6000, 240)) is None
+    assert await redis.hget("usage:p:7", "used") == b"7000"
+    assert await redis.smembers(DIRTY_PLANS) == {b"7"}
+
+
+async def test_reordered_interim_is_ignored(tracker, redis):
+    await tracker.apply(_update(0, 1000, 60))
+    await _bind(tracker, redis, 7, -1, 0)
+    await tracker.apply(_update(0, 3000, 120))
+    await tracker.apply(_update(0, 2000, 90))
+
+    assert await redis.hget(f"usage:s:{MEMBER}", "total") == b"3000"
+    assert await redis.hget("usage:p:7", "used") == b"3000"
+
+
+async def test_nothing_counts_after_stop(tracker, redis):
+    await tracker.apply(_update(0, 1000, 60))
+    await tracker.apply(_update(0, 1500, 90, cause="User-Request"), stop=True)
+    await tracker.apply(_update(0, 9000, 600))
+
+    session = await redis.hgetall(f"usage:s:{MEMBER}")
+    assert (session[b"total"], session[b"stopped"], session[b"cause"]) == (b"1500", b"1", b"User-Request")
+
+
+async def test_evicted_plan_counters_unbind_the_session(tracker, redis):
+    await tracker.apply(_update(0, 1000, 60))
+    await _bind(tracker, redis, 7, 5000, 0)
+    await redis.delete("usage:p:7")
+
+    assert await tracker.apply(_update(0, 2000, 120)) is None
+    assert not await redis.hexists(f"usage:s:{MEMBER}", "plan")
+    assert not await redis.exists("usage:p:7")
+
+
+async def test_bind_seeds_plan_counters_from_postgres(tracker, redis, sessions):
+    async with sessions() as db:
+        user = User(email="alice@example.com", username="alice", hashed_password="x")
+        plan = Plan(name="1GB", price=Decimal("100"), duration_days=1, data_limit_mb=1024)
+        db.add_all([user, plan])
+        await db.flush()
+        user_plan = UserPlan(user_id=user.id, plan_id=plan.id, data_used_mb=1000, data_remaining_mb=24)
+        db.add(user_plan)
+        await db.flush()
+        db.add_all([
+            # An earlier session on the same plan, and this one as last flushed
+            Session(user_id=user.id, session_id="80000009", nas_ip_address="10.0.0.1",
+                    user_plan_id=user_plan.id, bytes_used=990 * MB, active=False),
+            Session(user_id=user.id, session_id="81000001", nas_ip_address="10.0.0.1",
+                    user_plan_id=user_plan.id, bytes_used=10 * MB),
+        ])
+        await db.commit()
+
+    await tracker.apply(_update(0, 40 * MB, 60))
+    async with sessions() as db:
+        assert await tracker._bind_sessions(db, redis, [MEMBER]) == [user_plan.id]
+
+    limit, used = await redis.hmget(f"usage:p:{user_plan.id}", "limit", "used")
+    assert (int(limit), int(used)) == (1024 * MB, 1030 * MB)
+    assert await redis.hget(f"usage:s:{MEMBER}", "plan") == str(user_plan.id).encode()
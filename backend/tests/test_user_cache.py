@@ -0,0 +1,109 @@
+import asyncio
+from contextlib import asynccontextmanager
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import select
+
+from app.models.user import User, UserStatus
+from app.services import user_cache as user_cache_module
+from app.services.user_cache import UserCache, user_cache
+
+
+@pytest.fixture
+async def alice(sessions, monkeypatch):
+    """A user in the database every UserCache loads from; returns their id"""
+    monkeypatch.setattr(user_cache_module, "AsyncSessionLocal", sessions)
+    async with sessions() as db:
+        user = User(email="alice@example.com", username="alice", hashed_password="x")
+        db.add(user)
+        await db.commit()
+        return user.id
+
+
+async def _set_status(sessions, user_id, status):
+    async with sessions() as db:
+        user = (await db.execute(select(User).where(User.id == user_id))).scalar_one()
+        user.status = status
+        await db.commit()
+
+
+async def test_miss_loads_from_the_database(alice):
+    user = await UserCache().get(alice)
+    assert (user.id, user.username, user.status) == (alice, "alice", UserStatus.ACTIVE)
+    assert await UserCache().get(alice + 1) is None
+
+
+async def test_other_workers_are_served_from_redis(redis, alice, monkeypatch):
+    await UserCache().get(alice)
+    assert await redis.exists(f"auth:user:{alice}")
+
+    monkeypatch.setattr(user_cache_module, "AsyncSessionLocal", MagicMock(side_effect=AssertionError("queried")))
+    assert (await UserCache().get(alice)).username == "alice"
+
+
+async def test_invalidation_reaches_every_tier(redis, alice, sessions):
+    first, second = UserCache(), UserCache()
+    await first.get(alice)
+    await second.get(alice)
+
+    await _set_status(sessions, alice, UserStatus.SUSPENDED)
+    await first.invalidate([alice])
+
+    assert not await redis.exists(f"auth:user:{alice}")
+    # Loads that read the generation before this can no longer store
+    assert await redis.get(f"auth:user:{alice}:generation") is not None
+    assert (await first.get(alice)).status == UserStatus.SUSPENDED
+    # Without the pub/sub listener the other process keeps its local copy
+    assert (await second.get(alice)).status == UserStatus.ACTIVE
+    second.drop_local([alice])
+    assert (await second.get(alice)).status == UserStatus.SUSPENDED
+
+
+async def test_invalidations_are_broadcast(redis, alice, sessions):
+    writer, reader = UserCache(), UserCache()
+    await reader.get(alice)
+    await reader.start()
+    try:
+        # Let the listener subscribe before anything is published
+        await asyncio.sleep(0.05)
+        await _set_status(sessions, alice, UserStatus.SUSPENDED)
+        await writer.invalidate([alice])
+        for _ in range(50):
+            if alice not in reader._local:
+                break
+            await asyncio.sleep(0.02)
+        assert (await reader.get(alice)).status == UserStatus.SUSPENDED
+    finally:
+        await reader.stop()
+
+
+async def test_load_racing_an_invalidation_is_not_stored(redis, alice, sessions, monkeypatch):
+    cache = UserCache()
+
+    @asynccontextmanager
+    async def racing_session():
+        # Another request invalidates after this load read the generation
+        await cache.invalidate([alice])
+        async with sessions() as db:
+            yield db
+
+    monkeypatch.setattr(user_cache_module, "AsyncSessionLocal", racing_session)
+    assert (await cache.get(alice)).username == "alice"
+
+    # What it read under the old generation was kept out of both tiers
+    assert not await redis.exists(f"auth:user:{alice}")
+    assert alice not in cache._local
+
+
+async def test_committed_status_change_invalidates(redis, alice, sessions):
+    await user_cache.get(alice)
+    assert alice in user_cache._local
+
+    await _set_status(sessions, alice, UserStatus.SUSPENDED)
+    assert alice not in user_cache._local
+    # The Redis half runs as a task; stop() waits for it
+    await user_cache.stop()
+    assert not await redis.exists(f"auth:user:{alice}")
+    assert (await user_cache.get(alice)).status == UserStatus.SUSPENDED
+    user_cache.drop_local([alice])
@@ -0,0 +1,94 @@
+import asyncio
+from decimal import Decimal
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import func, select
+
+from app.models.plan import Plan, UserPlan
+from app.models.user import User
+from app.models.voucher import Voucher, VoucherStatus
+from app.services import settlement, voucher_redemption
+from app.services.voucher_redemption import IssuedVoucherFilter, normalize_voucher_code, redeem_voucher
+
+CODES = ["AAAA-BBBB-CCCC", "DDDD-EEEE-FFFF", "GGGG-HHHH-JJJJ"]
+
+
+@pytest.fixture
+async def vouchers(sessions, monkeypatch):
+    """Issued CODES for a Daily plan; returns the session factory"""
+    monkeypatch.setattr(voucher_redemption, "AsyncSessionLocal", sessions)
+    async with sessions() as db:
+        plan = Plan(name="Daily", price=Decimal("50"), duration_days=1, mikrotik_profile="daily")
+        db.add(plan)
+        await db.flush()
+        db.add_all([Voucher(code=code, plan_id=plan.id) for code in CODES])
+        await db.commit()
+    return sessions
+
+
+@pytest.fixture
+def issued(monkeypatch):
+    issued = IssuedVoucherFilter(capacity=1000, error_rate=0.001)
+    monkeypatch.setattr(voucher_redemption, "issued_vouchers", issued)
+    return issued
+
+
+def test_normalize_voucher_code():
+    assert normalize_voucher_code(" aaaa bbbb-cccc ") == "AAAA-BBBB-CCCC"
+
+
+async def test_filter_rejects_codes_only_after_a_sync(redis_or_local, vouchers, issued):
+    assert await issued.might_exist("ZZZZ-ZZZZ-ZZZZ")
+
+    assert await issued.sync() == len(CODES)
+    assert all([await issued.might_exist(code) for code in CODES])
+    assert not await issued.might_exist("ZZZZ-ZZZZ-ZZZZ")
+
+
+async def test_evicted_bitmap_is_rebuilt(redis, vouchers, issued):
+    await issued.sync()
+    await redis.delete("bloom:vouchers")
+    # A batch issued before the next sync recreates the bitmap without the old codes
+    await issued.add(["KKKK-LLLL-MMMM"])
+
+    assert all([await issued.might_exist(code) for code in CODES])
+    assert await issued.might_exist("ZZZZ-ZZZZ-ZZZZ")
+
+    assert await issued.sync() == len(CODES)
+    assert all([await issued.might_exist(code) for code in CODES + ["KKKK-LLLL-MMMM"]])
+    assert not await issued.might_exist("ZZZZ-ZZZZ-ZZZZ")
+
+
+async def test_concurrent_redemptions_have_one_winner(redis, vouchers, issued, monkeypatch):
+    routers = AsyncMock(return_value={})
+    monkeypatch.setattr(settlement.mikrotik_fleet, "bulk_upsert_hotspot_users", routers)
+    async with vouchers() as db:
+        db.add_all([
+            User(email=f"user{i}@example.com", username=f"user{i}", hashed_password="x")
+            for i in range(5)
+        ])
+        await db.commit()
+        users = (await db.execute(select(User))).scalars().all()
+    await issued.sync()
+
+    async def redeem(user):
+        async with vouchers() as db:
+            return await redeem_voucher(db, user, CODES[0].lower())
+
+    results = await asyncio.gather(*(redeem(user) for user in users))
+    winners = [user for user, plan in zip(users, results) if plan is not None]
+    assert len(winners) == 1
+
+    async with vouchers() as db:
+        voucher = (await db.execute(select(Voucher).where(Voucher.code == CODES[0]))).scalar_one()
+        assert (voucher.status, voucher.used_by_user_id) == (VoucherStatus.USED, winners[0].id)
+        assert (await db.execute(select(func.count()).select_from(UserPlan))).scalar_one() == 1
+    routers.assert_awaited_once()
+
+
+async def test_unissued_code_is_rejected_without_a_query(vouchers, issued):
+    await issued.sync()
+    db = AsyncMock()
+    assert await redeem_voucher(db, User(id=1, username="alice"), "ZZZZ-ZZZZ-ZZZZ") is None
+    db.execute.assert_not_awaited()